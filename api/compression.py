@@ -0,0 +1,172 @@
+"""Сжатие ответов: выбор кодирования по Accept-Encoding, gzip, zstd и brotli."""
+import logging
+import zlib
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional
+
+from configs.config import ResponseConfig
+from services import metrics
+
+try:
+    import zstandard
+except ImportError:  # zstd доступен только при установленном zstandard
+    zstandard = None
+
+try:
+    import brotli
+except ImportError:  # br доступен только при установленном brotli
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+RATIO_BUCKETS = (0.05, 0.1, 0.15, 0.2, 0.3, 0.5, 0.7, 0.9, 1.0)
+
+COMPRESSION_RATIO = metrics.registry.register(metrics.Histogram(
+    "ad_compression_ratio", "Отношение размера сжатого тела ответа к исходному", ("encoding",), RATIO_BUCKETS))
+COMPRESSION_BYTES = metrics.registry.register(metrics.Counter(
+    "ad_compression_bytes_total", "Объем тел ответов до (in) и после (out) сжатия", ("encoding", "stage")))
+COMPRESSION_DURATION = metrics.registry.register(metrics.Histogram(
+    "ad_compression_duration_seconds", "Время сжатия тела ответа", ("encoding",)))
+
+
+class StreamCompressor(ABC):
+    '''Сжатие тела ответа частями'''
+
+    @abstractmethod
+    def compress(self, data: bytes) -> bytes:
+        '''Добавление данных; возвращает уже сжатую часть (может быть пустой)'''
+
+    @abstractmethod
+    def flush(self) -> bytes:
+        '''Сжатые данные всего переданного, поток продолжается'''
+
+    @abstractmethod
+    def finish(self) -> bytes:
+        '''Завершение потока'''
+
+
+class _GzipCompressor(StreamCompressor):
+    def __init__(self, level: int):
+        self._obj = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._obj.compress(data)
+
+    def flush(self) -> bytes:
+        return self._obj.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._obj.flush(zlib.Z_FINISH)
+
+
+class _ZstdCompressor(StreamCompressor):
+    def __init__(self, level: int):
+        self._obj = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._obj.compress(data)
+
+    def flush(self) -> bytes:
+        return self._obj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        return self._obj.flush(zstandard.COMPRESSOBJ_FLUSH_FINISH)
+
+
+class _BrotliCompressor(StreamCompressor):
+    def __init__(self, level: int):
+        self._obj = brotli.Compressor(quality=level)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._obj.process(data)
+
+    def flush(self) -> bytes:
+        return self._obj.flush()
+
+    def finish(self) -> bytes:
+        return self._obj.finish()
+
+
+# Кодирование -> (класс сжатия, библиотека доступна)
+_CODECS = {
+    'zstd': (_ZstdCompressor, zstandard is not None),
+    'br': (_BrotliCompressor, brotli is not None),
+    'gzip': (_GzipCompressor, True),
+}
+
+
+class Codec:
+    '''Кодирование Content-Encoding с уровнем сжатия'''
+
+    def __init__(self, name: str, level: int):
+        self.name = name
+        self.level = level
+
+    def compressor(self) -> StreamCompressor:
+        return _CODECS[self.name][0](self.level)
+
+    def compress(self, data: bytes) -> bytes:
+        compressor = self.compressor()
+        return compressor.compress(data) + compressor.finish()
+
+
+def available_codecs(encodings: List[str], levels: Dict[str, int]) -> List[Codec]:
+    '''Кодирования из настроек в порядке предпочтения; без установленной библиотеки пропускаются'''
+    codecs = []
+    for name in encodings:
+        if name not in _CODECS:
+            logger.warning(f"Неизвестное кодирование сжатия {name}")
+        elif not _CODECS[name][1]:
+            logger.info(f"Сжатие {name} недоступно: библиотека не установлена")
+        else:
+            codecs.append(Codec(name, levels[name]))
+    return codecs
+
+
+def configured_codecs(config: ResponseConfig) -> List[Codec]:
+    '''Кодирования и уровни сжатия из раздела Response'''
+    return available_codecs(config.compression or [],
+                            {'gzip': config.gzip_level, 'zstd': config.zstd_level, 'br': config.brotli_quality})
+
+
+def _accepted(accept_encoding: str) -> Dict[str, float]:
+    '''Кодирования из Accept-Encoding с весами q'''
+    accepted = {}
+    for item in accept_encoding.split(','):
+        name, _, params = item.strip().partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[name] = quality
+    return accepted
+
+
+def negotiate(accept_encoding: str, codecs: List[Codec]) -> Optional[Codec]:
+    '''
+    Кодирование с наибольшим весом у клиента; при равных весах - первое
+    в порядке настроек. None, если клиент не принимает ни одно из них.
+    '''
+    accepted = _accepted(accept_encoding)
+    default = accepted.get('*', 0.0)
+    best, best_quality = None, 0.0
+    for codec in codecs:
+        quality = accepted.get(codec.name, default)
+        if quality > best_quality:
+            best, best_quality = codec, quality
+    return best
+
+
+def record(encoding: str, size_in: int, size_out: int, duration: float) -> None:
+    if size_in:
+        COMPRESSION_RATIO.observe(size_out / size_in, encoding=encoding)
+    COMPRESSION_BYTES.inc(size_in, encoding=encoding, stage='in')
+    COMPRESSION_BYTES.inc(size_out, encoding=encoding, stage='out')
+    COMPRESSION_DURATION.observe(duration, encoding=encoding)
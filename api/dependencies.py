@@ -12,14 +12,12 @@ def validate_api_key(
     x_api_key: Annotated[str, Header(..., alias=API_KEY_HEADER)]
 ) -> str:
     """Валидация API ключа из заголовка запроса."""
-    # TODO Доработать получение ключей
-    valid_api_keys = Settings.get_api_key_header()
     if not x_api_key:
         raise HTTPException(
             status_code=401,
             detail="Требуется API ключ для доступа"
         )
-    if x_api_key != valid_api_keys:
+    if not Settings.check_api_key(x_api_key):
         logger.warning(f"Не корректный API key")
         raise HTTPException(status_code=401, detail="Не корректный API key")
     return x_api_key
\ No newline at end of file
@@ -0,0 +1,186 @@
+"""ASGI middleware сервиса."""
+import re
+import time
+import uuid
+from typing import Callable, List, Optional
+
+from fastapi.concurrency import run_in_threadpool
+
+from api.compression import Codec, StreamCompressor, configured_codecs, negotiate, record
+from configs.config import ResponseConfig
+from configs.logging_config import request_id
+
+REQUEST_ID_HEADER = "X-Request-ID"
+_HEADER_NAME = REQUEST_ID_HEADER.lower().encode("latin-1")
+# Принимаются только короткие идентификаторы из безопасных символов
+_VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+
+
+class RequestIdMiddleware:
+    '''
+    Идентификатор запроса из заголовка X-Request-ID или новый UUID.
+    Значение доступно в configs.logging_config.request_id (попадает в
+    журнал, в том числе из потоков ldap_executor) и возвращается в
+    заголовке ответа.
+    '''
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        current = ''
+        for name, value in scope.get("headers", []):
+            if name == _HEADER_NAME:
+                current = value.decode("latin-1")
+                break
+        if not _VALID_REQUEST_ID.match(current):
+            current = uuid.uuid4().hex
+        token = request_id.set(current)
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((_HEADER_NAME, current.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            request_id.reset(token)
+
+
+# Типы содержимого, которые имеет смысл сжимать
+_COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+_ACCEPT_ENCODING = b"accept-encoding"
+_CONTENT_TYPE = b"content-type"
+_CONTENT_ENCODING = b"content-encoding"
+_CONTENT_LENGTH = b"content-length"
+_VARY = b"vary"
+
+
+class CompressionMiddleware:
+    '''
+    Сжатие ответов по Accept-Encoding кодированиями из раздела Response
+    (COMPRESSION, в порядке предпочтения). Тела меньше COMPRESSION_MIN_SIZE
+    отправляются как есть. Тело, отданное одним сообщением, сжимается
+    целиком; потоковый ответ сжимается по частям со сбросом буфера после
+    каждой, чтобы клиент получал части сразу. Части от
+    COMPRESSION_OFFLOAD_SIZE байт сжимаются в пуле потоков, чтобы не
+    задерживать цикл событий. Vary: Accept-Encoding добавляется ко всем
+    ответам сжимаемых типов, в том числе отправленным без сжатия, чтобы
+    общий кэш не отдал клиенту тело не в том кодировании.
+    '''
+
+    def __init__(self, app, config: ResponseConfig):
+        self.app = app
+        self.config = config
+        self._codecs: Optional[List[Codec]] = None
+
+    @property
+    def codecs(self) -> List[Codec]:
+        # Настройки загружаются при запуске приложения, кодирования выбираются при первом запросе
+        if self._codecs is None:
+            self._codecs = configured_codecs(self.config)
+        return self._codecs
+
+    async def _run(self, func: Callable[[bytes], bytes], data: bytes) -> bytes:
+        if len(data) >= self.config.compression_offload_size:
+            return await run_in_threadpool(func, data)
+        return func(data)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.codecs:
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding = ''
+        for name, value in scope.get("headers", []):
+            if name == _ACCEPT_ENCODING:
+                accept_encoding = value.decode("latin-1")
+                break
+        codec = negotiate(accept_encoding, self.codecs)
+
+        start: Optional[dict] = None
+        compressor: Optional[StreamCompressor] = None
+        passthrough = False
+        size_in = size_out = 0
+        duration = 0.0
+
+        async def compressed_start(length: Optional[int]) -> None:
+            headers = [(name, value) for name, value in start.get("headers", [])
+                       if name != _CONTENT_LENGTH]
+            headers.append((_CONTENT_ENCODING, codec.name.encode("latin-1")))
+            if length is not None:
+                headers.append((_CONTENT_LENGTH, str(length).encode("latin-1")))
+            await send({**start, "headers": headers})
+
+        def compress_part(data: bytes) -> bytes:
+            return compressor.compress(data) + compressor.flush()
+
+        def compress_last(data: bytes) -> bytes:
+            return compressor.compress(data) + compressor.finish()
+
+        async def send_compressed(message):
+            nonlocal start, compressor, passthrough, size_in, size_out, duration
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if passthrough or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if compressor is None:
+                compressible = self._compressible(start)
+                if compressible:
+                    start = {**start, "headers": self._vary(start.get("headers", []))}
+                if (codec is None or not compressible
+                        or (not more_body and len(body) < self.config.compression_min_size)):
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+                compressor = codec.compressor()
+                if not more_body:
+                    started = time.perf_counter()
+                    compressed = await self._run(compress_last, body)
+                    record(codec.name, len(body), len(compressed), time.perf_counter() - started)
+                    await compressed_start(len(compressed))
+                    await send({"type": "http.response.body", "body": compressed})
+                    return
+                await compressed_start(None)
+
+            started = time.perf_counter()
+            compressed = await self._run(compress_part if more_body else compress_last, body)
+            duration += time.perf_counter() - started
+            size_in += len(body)
+            size_out += len(compressed)
+            if not more_body:
+                record(codec.name, size_in, size_out, duration)
+            await send({"type": "http.response.body", "body": compressed, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
+
+    @staticmethod
+    def _vary(headers: list) -> list:
+        '''Заголовки с Vary: Accept-Encoding, если его еще нет'''
+        for name, value in headers:
+            if name == _VARY and b"accept-encoding" in value.lower():
+                return list(headers)
+        return [*headers, (_VARY, b"Accept-Encoding")]
+
+    @staticmethod
+    def _compressible(start: dict) -> bool:
+        content_type = ''
+        for name, value in start.get("headers", []):
+            if name == _CONTENT_ENCODING:
+                return False
+            if name == _CONTENT_TYPE:
+                content_type = value.decode("latin-1").lower()
+        return content_type.startswith(_COMPRESSIBLE_TYPES)
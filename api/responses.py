@@ -0,0 +1,142 @@
+"""Ответы API с быстрой сериализацией JSON."""
+import asyncio
+import base64
+import time
+from datetime import date, datetime
+from operator import itemgetter
+from typing import Any, AsyncIterator, Iterable, List, Optional
+from uuid import UUID
+
+from fastapi.responses import Response, StreamingResponse
+from pydantic_core import to_json
+
+from services import metrics
+
+try:
+    import orjson
+except ImportError:  # orjson не входит в обязательные зависимости
+    orjson = None
+
+JSON_MEDIA_TYPE = "application/json"
+
+
+def _default(value: Any) -> Any:
+    '''Значения, которые не являются типами JSON'''
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, bytes):
+        return base64.b64encode(value).decode('ascii')
+    raise TypeError(f"Тип {type(value).__name__} не сериализуется в JSON")
+
+
+def dumps(content: Any) -> bytes:
+    '''
+    Компактный JSON в UTF-8 без экранирования не-ASCII символов,
+    совпадает с BaseResponse.model_dump_json() для ответов сервиса.
+    '''
+    if orjson is not None:
+        return orjson.dumps(content, default=_default)
+    # Кодировщик pydantic без построения модели и валидации
+    return to_json(content, bytes_mode='base64', fallback=_default)
+
+
+class JSONBytesResponse(Response):
+    '''
+    Ответ без повторной валидации pydantic: данные LDAP уже приведены
+    к типам JSON в ADManager и сериализуются напрямую.
+    '''
+    media_type = JSON_MEDIA_TYPE
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def envelope(data: dict, error_text: Optional[str] = None) -> dict:
+    '''Структура BaseResponse'''
+    return {"data": data, "errorText": error_text}
+
+
+def column_rows(items: list, columns: List[str]) -> list:
+    '''Строки значений объектов в порядке columns; отсутствующие атрибуты - None'''
+    if len(columns) > 1:
+        try:
+            # Атрибуты есть у всех объектов (пользователи, группы с описанием)
+            return list(map(itemgetter(*columns), items))
+        except KeyError:
+            pass
+    return [list(map(item.get, columns)) for item in items]
+
+
+def columnar(items: list, columns: List[str]) -> dict:
+    '''Список объектов в формате columns: имена атрибутов один раз и строки значений'''
+    return {"columns": columns, "rows": column_rows(items, columns)}
+
+
+class ClosingStreamingResponse(StreamingResponse):
+    '''
+    Потоковый ответ, закрывающий генератор тела и при отключении клиента.
+    Starlette прерывает чтение тела без aclose, и блок finally генератора
+    (освобождение ресурсов) выполнился бы только при сборке мусора.
+    '''
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            if hasattr(self.body_iterator, 'aclose'):
+                await asyncio.shield(self.body_iterator.aclose())
+
+
+class StreamingArrayResponse(StreamingResponse):
+    '''
+    Ответ вида {"data": {"<key>": [...]}, "errorText": null}, массив
+    которого кодируется и отправляется частями по chunk_size элементов.
+    Тело ответа целиком в памяти не строится, первые байты уходят клиенту
+    до кодирования всего массива. Результат совпадает с JSONBytesResponse.
+    С columns массив выдается в формате columns, строки формируются по частям.
+    '''
+
+    def __init__(self, key: str, items: list, chunk_size: int = 1000, method: str = "unknown",
+                 domain: str = "", columns: Optional[List[str]] = None,
+                 status_code: int = 200, headers: Optional[dict] = None):
+        self.item_count = len(items)
+        super().__init__(self._body(key, items, chunk_size, method, domain, columns),
+                         status_code=status_code, headers=headers, media_type=JSON_MEDIA_TYPE)
+
+    @staticmethod
+    def _chunks(items: list, chunk_size: int) -> Iterable[list]:
+        for start in range(0, len(items), chunk_size):
+            yield items[start:start + chunk_size]
+
+    async def _body(self, key: str, items: list, chunk_size: int, method: str,
+                    domain: str, columns: Optional[List[str]]) -> AsyncIterator[bytes]:
+        encoding = 0.0
+        size = 0
+        if columns is None:
+            head, end = b'{"data":{' + dumps(key) + b':[', b']},"errorText":null}'
+        else:
+            head = b'{"data":{' + dumps(key) + b':{"columns":' + dumps(columns) + b',"rows":['
+            end = b']}},"errorText":null}'
+        first = True
+        for chunk in self._chunks(items, chunk_size):
+            started = time.perf_counter()
+            if columns is not None:
+                chunk = column_rows(chunk, columns)
+            # Массив кодируется целиком и без скобок: одна операция на часть
+            encoded = dumps(chunk)[1:-1]
+            encoding += time.perf_counter() - started
+            if not first:
+                encoded = b',' + encoded
+            elif head:
+                encoded = head + encoded
+                head = b''
+            first = False
+            size += len(encoded)
+            yield encoded
+        tail = head + end
+        size += len(tail)
+        yield tail
+        metrics.PHASE_DURATION.observe(encoding, phase='serialize', method=method, domain=domain)
+        metrics.RESPONSE_BYTES.observe(size, method=method)
@@ -0,0 +1,36 @@
+"""Роутер для управления кэшем чтения."""
+from typing import Annotated
+from fastapi import APIRouter, Depends
+from fastapi.concurrency import run_in_threadpool
+from schemas.response import BaseResponse
+from api.dependencies import validate_api_key
+from services.cache import read_cache
+from services.worker_stats import worker_stats
+
+router = APIRouter(prefix="/cache", tags=["cache"])
+
+@router.get(
+    "/stats",
+    response_model=BaseResponse,
+    summary="Статистика кэша",
+    description="Количество записей, попаданий, промахов и сбросов кэша чтения; "
+                "при запуске через serve.py - также статистика кэша и пулов каждого воркера"
+)
+async def cache_stats(_: Annotated[str, Depends(validate_api_key)]) -> BaseResponse:
+
+    # Файловый кэш и статистика воркеров читаются с диска, не в цикле событий
+    data = {"cache": await run_in_threadpool(read_cache.stats)}
+    if worker_stats.enabled:
+        data["workers"] = await run_in_threadpool(worker_stats.collect)
+    return BaseResponse(data=data)
+
+@router.delete(
+    "",
+    response_model=BaseResponse,
+    summary="Очистка кэша",
+    description="Удаление всех записей кэша чтения"
+)
+async def cache_clear(_: Annotated[str, Depends(validate_api_key)]) -> BaseResponse:
+
+    await run_in_threadpool(read_cache.clear)
+    return BaseResponse(data={"cache": await run_in_threadpool(read_cache.stats)})
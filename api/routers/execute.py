@@ -1,28 +1,140 @@
 from fastapi import APIRouter, Depends
-from typing import Annotated
-from schemas.response import BaseResponse
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel, ValidationError as PydanticValidationError
+from typing import Annotated, Any, AsyncIterator, Callable, Iterator, Optional, Union
+from collections import defaultdict
+from dataclasses import dataclass
+from functools import partial
+from itertools import groupby
+import asyncio
+import json
+from schemas.response import BaseResponse, RESULT_MODELS
+from api.responses import ClosingStreamingResponse, JSONBytesResponse, StreamingArrayResponse, columnar, dumps, envelope
 from api.dependencies import validate_api_key
-from api.errors import BadRequestError, APIError
+from api.errors import BadRequestError, APIError, format_pydantic_error
+from configs.config import Settings
 import logging
+import threading
+import time
 
+from services import metrics
+
+from services.executor import ldap_executor
+from services.single_flight import single_flight, request_key
 from services.ad_manager import (
     read_groups, 
+    iter_group_pages,
     read_user_certificates,
+    read_certificates_bulk,
     read_group_users,
-    create_group)
+    sync_objects,
+    create_group,
+    create_groups,
+    execute_batch,
+    SearchOptions,
+    GROUP_ATTRIBUTES,
+    USER_ATTRIBUTES)
 from schemas.request import (
     BaseRequest,
+    BatchRequest,
     APIMethod,
+    MembershipMode,
+    ResponseFormat,
     GetGroupsByOUParams,
     GetUsersByGroupParams,
     CreateGroupParams,
-    GetUserCertificatesParams
+    CreateGroupsParams,
+    GetUserCertificatesParams,
+    GetUsersCertificatesParams,
+    SyncParams,
+    encode_continuation_cookie,
+    encode_watermark
 )
 
 router = APIRouter(prefix="/execute", tags=["execute"])
 
 logger = logging.getLogger(__name__)
 
+def _ndjson_line(data: dict) -> bytes:
+    return dumps(data) + b"\n"
+
+async def stream_group_pages(params: GetGroupsByOUParams) -> StreamingResponse:
+    '''
+    Потоковая выдача групп в формате NDJSON: строка на страницу вида
+    {"groups": [...], "cookie": "..."}. Cookie последней полученной строки
+    позволяет продолжить чтение после обрыва, у последней страницы он null.
+    Cookie хранит смещение: продолжение повторяет поиск с начала и пропускает
+    уже выданные группы, поэтому стоит O(смещения), а при изменении OU между
+    запросами группы могут быть пропущены или повторены.
+    Соединение пула удерживается, пока клиент читает ответ, и возвращается
+    в пул и при отключении клиента.
+    '''
+    pages: Iterator = iter_group_pages(server=params.domain,
+                                       base_ou=params.ou_dn,
+                                       page_size=params.page_size,
+                                       offset=params.offset(),
+                                       attributes=_attribute_names(params.attributes),
+                                       dn_only=params.dn_only,
+                                       options=_search_options(params))
+    
+    # Генератор не может закрываться, пока в другом потоке читается страница
+    lock = threading.Lock()
+
+    def advance() -> Optional[tuple]:
+        with lock:
+            return next(pages, None)
+
+    def close() -> None:
+        with lock:
+            pages.close()
+
+    # Первая страница читается до отправки заголовков, чтобы ошибка вернулась кодом 500
+    first = await ldap_executor.run(params.domain, advance)
+    if first is None or not first[0]:
+        await ldap_executor.run(params.domain, close)
+        details = first[1] if first else 'Нет данных'
+        raise APIError(message=f'Ошибка LDAP {details}',status_code=500)
+    columns = _columns(params, GROUP_ATTRIBUTES)
+
+    async def body() -> AsyncIterator[bytes]:
+        page = first
+        try:
+            while page is not None:
+                result, details, next_offset = page
+                if not result:
+                    logger.error(f"Ошибка LDAP при потоковом чтении групп: {details}")
+                    yield _ndjson_line({"errorText": f"Ошибка LDAP {details}"})
+                    break
+                cookie = encode_continuation_cookie(next_offset) if next_offset is not None else None
+                groups = columnar(details, columns) if columns is not None else details
+                yield _ndjson_line({"groups": groups, "cookie": cookie})
+                page = await ldap_executor.run(params.domain, advance)
+        finally:
+            # При отключении клиента задача отменена: закрытие выполняется
+            # под защитой от отмены, иначе соединение вернется в пул только при сборке мусора
+            await asyncio.shield(ldap_executor.run(params.domain, close))
+
+    return ClosingStreamingResponse(body(), media_type="application/x-ndjson")
+
+def _attribute_names(attributes: Optional[list]) -> Optional[list[str]]:
+    return [attribute.value for attribute in attributes] if attributes else None
+
+def _columns(params: Union[GetGroupsByOUParams, GetUsersByGroupParams], default: list) -> Optional[list[str]]:
+    '''Атрибуты ответа в формате columns, None для формата rows'''
+    if params.format != ResponseFormat.COLUMNS:
+        return None
+    if params.dn_only or getattr(params, 'membership', None) == MembershipMode.MEMBER_RANGE:
+        return ['distinguishedName']
+    return _attribute_names(params.attributes) or list(default)
+
+def _search_options(params: Union[GetGroupsByOUParams, GetUsersByGroupParams]) -> SearchOptions:
+    '''Фильтры и сортировка, выполняемые контроллером домена'''
+    return SearchOptions(name_prefix=params.name_prefix,
+                         modified_since=params.modified_since,
+                         enabled_only=getattr(params, 'enabled_only', False),
+                         sort_by=params.sort_by.value if params.sort_by else None,
+                         sort_descending=params.sort_descending)
+
 def validate_and_extract_params(request: BaseRequest) -> tuple[APIMethod, dict]:
     '''Валидация и извлечение параметров запроса.'''
     method = request.method
@@ -30,11 +142,108 @@ def validate_and_extract_params(request: BaseRequest) -> tuple[APIMethod, dict]:
     
     return method, parameters
 
+@dataclass
+class Operation:
+    '''Подготовленная AD операция: вызов принимает необязательный connection'''
+    domain: str
+    data_response: str
+    call: Callable[..., tuple[bool, Any]]
+    params: BaseModel
+    is_write: bool = False
+    # Атрибуты списка в формате columns
+    columns: Optional[list[str]] = None
+
+def _sync(**kwargs) -> tuple[bool, Any]:
+    result, details = sync_objects(**kwargs)
+    if result:
+        details['watermark'] = encode_watermark(details['watermark'])
+    return result, details
+
+def build_operation(method: APIMethod, parameters: dict) -> Operation:
+    '''Валидация параметров метода и подготовка вызова AD операции.'''
+     # Обработка в зависимости от метода
+    if method == APIMethod.GET_GROUPS_BY_OU:
+        params = GetGroupsByOUParams(**parameters)
+        call = partial(read_groups,
+                       server=params.domain, 
+                       base_ou=params.ou_dn,
+                       page_size=params.page_size,
+                       offset=params.offset(),
+                       attributes=_attribute_names(params.attributes),
+                       dn_only=params.dn_only,
+                       options=_search_options(params))
+        return Operation(params.domain, 'groups', call, params,
+                         columns=_columns(params, GROUP_ATTRIBUTES))
+
+    elif method == APIMethod.GET_USERS_BY_GROUP:
+        params = GetUsersByGroupParams(**parameters)
+        call = partial(read_group_users,
+                       server=params.domain, 
+                       base_ou=params.ou_dn, 
+                       group_dn=params.group_dn,
+                       membership=params.membership.value,
+                       attributes=_attribute_names(params.attributes),
+                       dn_only=params.dn_only,
+                       options=_search_options(params))
+        return Operation(params.domain, 'users', call, params,
+                         columns=_columns(params, USER_ATTRIBUTES))
+        
+    elif method == APIMethod.CREATE_GROUP:
+        params = CreateGroupParams(**parameters)
+        call = partial(create_group,
+                       server=params.domain, 
+                       base_ou=params.ou_dn, 
+                       group_name=params.cn,
+                       description=params.description)
+        return Operation(params.domain, 'create_group', call, params, is_write=True)
+
+    elif method == APIMethod.CREATE_GROUPS:
+        params = CreateGroupsParams(**parameters)
+        call = partial(create_groups,
+                       server=params.domain, 
+                       base_ou=params.ou_dn, 
+                       groups=[group.model_dump() for group in params.groups],
+                       if_missing=params.if_missing,
+                       window=Settings.executor.bulk_window)
+        return Operation(params.domain, 'create_groups', call, params, is_write=True)
+    
+    elif method == APIMethod.GET_USER_CERTIFICATES:
+        params = GetUserCertificatesParams(**parameters)
+        call = partial(read_user_certificates,
+                       server=params.domain, 
+                       base_ou=params.ou_dn, 
+                       user_object_id=params.user_guid)  
+        return Operation(params.domain, 'certificates', call, params)
+
+    elif method == APIMethod.GET_USERS_CERTIFICATES:
+        params = GetUsersCertificatesParams(**parameters)
+        call = partial(read_certificates_bulk,
+                       server=params.domain, 
+                       base_ou=params.ou_dn, 
+                       user_guids=params.user_guids,
+                       sam_account_names=params.sam_account_names,
+                       with_metadata=params.with_metadata,
+                       window=Settings.executor.bulk_window)
+        return Operation(params.domain, 'users_certificates', call, params)
+
+    elif method in (APIMethod.SYNC_GROUPS, APIMethod.SYNC_USERS):
+        params = SyncParams(**parameters)
+        call = partial(_sync,
+                       server=params.domain, 
+                       base_ou=params.ou_dn, 
+                       object_type='groups' if method == APIMethod.SYNC_GROUPS else 'users',
+                       watermark=params.decoded_watermark())
+        return Operation(params.domain, 'sync', call, params)
+
+    raise BadRequestError(message=f'Метод {method} не поддерживается')
+
 @router.post(
     "",
     response_model=BaseResponse,
     summary="Выполнение AD операции",
-    description="Единый эндпоинт для выполнения всех операций с Active Directory"
+    description="Единый эндпоинт для выполнения всех операций с Active Directory. "
+                "При включенном кэше чтения (Cache.ENABLED) списки групп и участников могут "
+                "не отражать изменения, сделанные не через сервис, до Cache.TTL секунд"
 )
 
 async def execute_operation(
@@ -45,39 +254,193 @@ async def execute_operation(
 
     method, parameters = validate_and_extract_params(request)
     logger.info(f"Запрос метод:{method} параметры {parameters}")
-     # Обработка в зависимости от метода
-    if method == APIMethod.GET_GROUPS_BY_OU:
-        params = GetGroupsByOUParams(**parameters)
-        result, details = read_groups(server=params.domain, base_ou=params.ou_dn)
-        data_response = 'groups'
-
-    elif method == APIMethod.GET_USERS_BY_GROUP:
-        params = GetUsersByGroupParams(**parameters)
-        result, details = read_group_users(
-                                        server=params.domain, 
-                                        base_ou=params.ou_dn, 
-                                        group_dn=params.group_dn)
-        data_response = 'users'  
-        
-    elif method == APIMethod.CREATE_GROUP:
-        params = CreateGroupParams(**parameters)
-        result, details = create_group(
-                                        server=params.domain, 
-                                        base_ou=params.ou_dn, 
-                                        group_name=params.cn,
-                                        description=params.description)
-        data_response = 'create_group'         
     
-    elif method == APIMethod.GET_USER_CERTIFICATES:
-        params = GetUserCertificatesParams(**parameters)
-        result, details = read_user_certificates(
-                                        server=params.domain, 
-                                        base_ou=params.ou_dn, 
-                                        user_object_id=params.user_guid)  
-        data_response = 'certificates'
-
-    if result == True:
-        # TODO исправить структуру groups
-        return BaseResponse(data={f"{data_response}": details})
-    else:
-        raise APIError(message=f'Ошибка LDAP {details}',status_code=500)
\ No newline at end of file
+    operation = build_operation(method, parameters)
+    metrics.current_method.set(method.value)
+    if isinstance(operation.params, GetGroupsByOUParams) and operation.params.stream:
+        return await stream_group_pages(operation.params)
+
+    started = time.perf_counter()
+    metrics.REQUESTS_IN_FLIGHT.inc(method=method.value)
+    try:
+        result, details = await run_operation(method, operation)
+
+        if result == True:
+            metrics.RESULT_ENTRIES.observe(_result_size(details), method=method.value, domain=operation.domain)
+            # TODO исправить структуру groups
+            return _success_response(method, operation, details)
+        else:
+            raise APIError(message=f'Ошибка LDAP {details}',status_code=500)
+    finally:
+        metrics.REQUESTS_IN_FLIGHT.dec(method=method.value)
+        metrics.REQUEST_DURATION.observe(time.perf_counter() - started,
+                                         method=method.value, domain=operation.domain)
+
+def _success_response(method: APIMethod, operation: Operation, details: Any) -> Response:
+    '''
+    Ответ в формате BaseResponse без повторной валидации данных LDAP.
+    Большие массивы кодируются и отправляются частями.
+    '''
+    threshold = Settings.response.stream_threshold
+    if threshold and isinstance(details, list) and len(details) > threshold:
+        return StreamingArrayResponse(operation.data_response, details,
+                                      chunk_size=Settings.response.stream_chunk,
+                                      method=method.value, domain=operation.domain,
+                                      columns=operation.columns)
+    error = _validate_result(operation, details)
+    if error:
+        raise APIError(message=error, status_code=500)
+    with metrics.phase('serialize', operation.domain):
+        body = dumps(envelope({operation.data_response: _present(operation, details)}))
+    metrics.RESPONSE_BYTES.observe(len(body), method=method.value)
+    return Response(content=body, media_type="application/json")
+
+def _present(operation: Operation, details: Any) -> Any:
+    '''Результат в запрошенном формате; общий результат single flight не изменяется'''
+    if operation.columns is not None and isinstance(details, list):
+        return columnar(details, operation.columns)
+    return details
+
+def _validate_result(operation: Operation, details: Any) -> Optional[str]:
+    '''
+    Проверка небольших результатов моделями ответа; большие результаты
+    отдаются без проверки, чтобы не строить модель на каждую запись.
+    Возвращает текст ошибки при несоответствии модели.
+    '''
+    model = RESULT_MODELS.get(operation.data_response)
+    if model is None or _result_size(details) > Settings.response.validate_max_entries:
+        return None
+    try:
+        model.model_validate({operation.data_response: details})
+    except PydanticValidationError as e:
+        logger.error(f"Результат {operation.data_response} не соответствует модели ответа: "
+                     f"{format_pydantic_error(e)}")
+        return 'Некорректный ответ AD'
+    return None
+
+async def run_operation(method: APIMethod, operation: Operation) -> tuple[bool, Any]:
+    '''
+    Выполнение операции в пуле потоков. Одновременные одинаковые запросы
+    чтения объединяются и получают результат одной LDAP операции;
+    результат общий, поэтому изменять его после получения нельзя.
+    '''
+    if operation.is_write or not Settings.executor.coalesce_reads:
+        return await ldap_executor.run(operation.domain, operation.call)
+    return await single_flight.run(request_key(method.value, operation.params), method.value,
+                                   lambda: ldap_executor.run(operation.domain, operation.call))
+
+def _result_size(details: Any) -> int:
+    '''Количество записей в результате операции'''
+    if isinstance(details, list):
+        return len(details)
+    if isinstance(details, dict):
+        # sync: измененные и удаленные объекты; users_certificates: найденные и ненайденные пользователи
+        lists = [value for value in details.values() if isinstance(value, (list, dict))]
+        return sum(len(value) for value in lists)
+    return 1
+
+def _timed_call(index: int, method: str, operation: Operation,
+                durations: dict[int, float]) -> Callable[..., tuple[bool, Any]]:
+    '''Вызов операции пакета с меткой метода и замером длительности'''
+    def call(connection) -> tuple[bool, Any]:
+        # Выполняется в копии контекста запроса, метка пакета не изменяется
+        metrics.current_method.set(method)
+        started = time.perf_counter()
+        try:
+            return operation.call(connection=connection)
+        finally:
+            durations[index] = time.perf_counter() - started
+    return call
+
+def _batch_item(data: Optional[dict] = None, error: Optional[str] = None) -> dict:
+    return {"data": data or {}, "errorText": error}
+
+@router.post(
+    "/batch",
+    response_model=BaseResponse,
+    summary="Пакетное выполнение AD операций",
+    description="Выполнение списка операций; результаты и ошибки возвращаются по каждой операции в исходном порядке. "
+                "Операции домена выполняются в порядке запроса: чтение видит записи, указанные до него, "
+                "и не видит указанные после"
+)
+async def execute_batch_operations(
+        request: BatchRequest,
+        _: Annotated[str, Depends(validate_api_key)]
+        ) -> BaseResponse:
+    '''
+    Пакетное выполнение AD операций.
+    Операции группируются по домену и выполняются в порядке запроса:
+    операции чтения между двумя операциями записи распределяются не более
+    чем на BATCH_CONCURRENCY соединений и выполняются параллельно, операция
+    записи начинается после них, а следующие чтения - после нее. Подряд
+    идущие записи выполняются по порядку на одном соединении. Результаты
+    совпадают с результатами тех же операций, отправленных по одной.
+    Домены обрабатываются параллельно.
+    '''
+
+    logger.info(f"Пакетный запрос: {len(request.operations)} операций")
+    metrics.current_method.set("batch")
+    results: list = [None] * len(request.operations)
+    by_domain: dict[str, list[tuple[int, Operation]]] = defaultdict(list)
+    methods: list[str] = [item.method.value for item in request.operations]
+
+    for index, item in enumerate(request.operations):
+        method, parameters = validate_and_extract_params(item)
+        try:
+            operation = build_operation(method, parameters)
+        except PydanticValidationError as e:
+            results[index] = _batch_item(error=f"Ошибка валидации параметров: {format_pydantic_error(e)}")
+            continue
+        except APIError as e:
+            results[index] = _batch_item(error=e.message)
+            continue
+        if isinstance(operation.params, GetGroupsByOUParams) and operation.params.stream:
+            results[index] = _batch_item(error="Потоковый ответ не поддерживается в пакетном режиме")
+            continue
+        by_domain[operation.domain].append((index, operation))
+
+    concurrency = Settings.executor.batch_concurrency
+
+    async def run_chunk(domain: str, chunk: list[tuple[int, Operation]]) -> None:
+        durations: dict[int, float] = {}
+        for index, _ in chunk:
+            metrics.REQUESTS_IN_FLIGHT.inc(method=methods[index])
+        started = time.perf_counter()
+        try:
+            outcomes = await ldap_executor.run(domain, execute_batch, domain,
+                                               [_timed_call(index, methods[index], operation, durations)
+                                                for index, operation in chunk])
+        finally:
+            elapsed = time.perf_counter() - started
+            for index, _ in chunk:
+                metrics.REQUESTS_IN_FLIGHT.dec(method=methods[index])
+                # Операции, не начатые из-за ошибки соединения, учитываются временем пакета
+                metrics.REQUEST_DURATION.observe(durations.get(index, elapsed),
+                                                 method=methods[index], domain=domain)
+        for (index, operation), (result, details) in zip(chunk, outcomes):
+            if result:
+                metrics.RESULT_ENTRIES.observe(_result_size(details), method=methods[index], domain=domain)
+                error = _validate_result(operation, details)
+                if error:
+                    results[index] = _batch_item(error=error)
+                else:
+                    results[index] = _batch_item(data={operation.data_response: _present(operation, details)})
+            else:
+                results[index] = _batch_item(error=f'Ошибка LDAP {details}')
+
+    async def run_reads(domain: str, reads: list[tuple[int, Operation]]) -> None:
+        workers = min(concurrency, len(reads))
+        await asyncio.gather(*(run_chunk(domain, reads[worker::workers]) for worker in range(workers)))
+
+    async def run_domain(domain: str, items: list[tuple[int, Operation]]) -> None:
+        # Последовательные группы: чтения до записи, затем подряд идущие записи
+        for is_write, group in groupby(items, key=lambda item: item[1].is_write):
+            group = list(group)
+            if is_write:
+                await run_chunk(domain, group)
+            else:
+                await run_reads(domain, group)
+
+    await asyncio.gather(*(run_domain(domain, items) for domain, items in by_domain.items()))
+
+    return JSONBytesResponse(envelope({"results": results}))
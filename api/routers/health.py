@@ -1,7 +1,11 @@
 """Роутер для проверки работоспособности сервиса."""
 from datetime import datetime
+from typing import Optional
 from fastapi import APIRouter
-from schemas.response import HealthResponse
+from fastapi.responses import JSONResponse
+from schemas.response import HealthResponse, ReadinessResponse, DeepHealthResponse
+from services.health import health_monitor
+from services.warmup import warmup
 
 router = APIRouter(tags=["health"])
 
@@ -9,12 +13,62 @@ router = APIRouter(tags=["health"])
     "/health",
     response_model=HealthResponse,
     summary="Проверка работоспособности",
-    description=""
+    description="503, пока при запуске не подготовлены соединения с доменами",
+    responses={503: {"model": HealthResponse, "description": "Сервис запускается"}}
 )
 async def health_check() -> HealthResponse:
     
-    return HealthResponse(
-        status="healthy",
+    response = HealthResponse(
+        status="healthy" if warmup.ready else "starting",
         timestamp=datetime.now(),
-        version="1.0.0"
-    )
\ No newline at end of file
+        version="1.0.0",
+        startup=warmup.status()
+    )
+    if not warmup.ready:
+        return JSONResponse(status_code=503, content=response.model_dump(mode='json'))
+    return response
+
+def _checked_at(status: dict) -> Optional[datetime]:
+    return datetime.fromtimestamp(status["updated"]) if status["updated"] else None
+
+@router.get(
+    "/health/ready",
+    response_model=ReadinessResponse,
+    summary="Готовность к приему запросов",
+    description="Для балансировщика: 503, если контроллеры доменов недоступны или не выполняется bind. "
+                "Результат фоновой проверки, запрос к AD не обращается",
+    responses={503: {"model": ReadinessResponse, "description": "Сервис не готов"}}
+)
+async def readiness_check() -> ReadinessResponse:
+    status = health_monitor.status()
+    response = ReadinessResponse(
+        status=status["status"],
+        timestamp=_checked_at(status),
+        age=status["age"],
+        domains={host: state["ready"] for host, state in status["domains"].items()}
+    )
+    if not status["ready"]:
+        return JSONResponse(status_code=503, content=response.model_dump(mode='json'))
+    return response
+
+@router.get(
+    "/health/deep",
+    response_model=DeepHealthResponse,
+    summary="Подробное состояние доменов",
+    description="Доступность контроллеров, bind, задержка последней успешной операции и занятость пула "
+                "по доменам. Результат фоновой проверки, запрос к AD не обращается",
+    responses={503: {"model": DeepHealthResponse, "description": "Сервис не готов"}}
+)
+async def deep_health_check() -> DeepHealthResponse:
+    status = health_monitor.status()
+    response = DeepHealthResponse(
+        status=status["status"],
+        timestamp=_checked_at(status),
+        age=status["age"],
+        version="1.0.0",
+        startup=warmup.status(),
+        domains=status["domains"]
+    )
+    if not status["ready"]:
+        return JSONResponse(status_code=503, content=response.model_dump(mode='json'))
+    return response
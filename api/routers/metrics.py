@@ -0,0 +1,16 @@
+"""Роутер метрик в формате Prometheus."""
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from services.metrics import registry
+
+router = APIRouter(tags=["metrics"])
+
+@router.get(
+    "/metrics",
+    response_class=PlainTextResponse,
+    summary="Метрики сервиса",
+    description="Длительности фаз операций, размеры результатов, ошибки LDAP, состояние пулов в формате Prometheus"
+)
+async def metrics() -> PlainTextResponse:
+
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
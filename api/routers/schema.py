@@ -0,0 +1,28 @@
+"""Роутер для управления кэшем схемы контроллеров домена."""
+from typing import Annotated, Optional
+from fastapi import APIRouter, Depends
+from fastapi.concurrency import run_in_threadpool
+from schemas.response import BaseResponse
+from api.dependencies import validate_api_key
+from api.errors import NotFoundError
+from configs.config import Settings
+from services.server_cache import server_cache
+
+router = APIRouter(prefix="/schema", tags=["schema"])
+
+@router.post(
+    "/refresh",
+    response_model=BaseResponse,
+    summary="Обновление кэша схемы",
+    description="Перечитывание схемы и Root DSE с контроллеров домена; 404, если домена нет в конфигурации"
+)
+async def refresh_schema(
+        _: Annotated[str, Depends(validate_api_key)],
+        domain: Optional[str] = None
+        ) -> BaseResponse:
+    '''Принудительное обновление схемы одного домена или всех доменов.'''
+
+    if domain and not Settings.has_server(domain):
+        raise NotFoundError(message=f'Домен {domain} не найден в конфигурации')
+    result = await run_in_threadpool(server_cache.refresh, domain)
+    return BaseResponse(data={"schema": result})
@@ -0,0 +1,81 @@
+"""Общие утилиты бенчмарков: временная конфигурация, запуск приложения и статистика."""
+import asyncio
+import base64
+import hashlib
+import os
+import statistics
+import sys
+import tempfile
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import AsyncIterator, List, Optional
+
+import yaml
+from cryptography.fernet import Fernet
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+
+BENCH_KEY = "benchmark"
+BENCH_API_KEY = "benchmark-api-key"
+BENCH_DOMAIN = "dc.bench.local"
+BENCH_LOGIN = "CN=svc,DC=bench,DC=local"
+BENCH_PASSWORD = "secret"
+BENCH_OU = "OU=Bench,DC=bench,DC=local"
+
+
+def prepare_environment(extra_config: Optional[dict] = None) -> Path:
+    '''
+    Создание временного рабочего каталога с зашифрованным conf.yml.enc.
+    Должно вызываться до импорта модулей сервиса.
+    '''
+    work_dir = Path(tempfile.mkdtemp(prefix="ad-service-bench-"))
+    config = {
+        "General": {"ADIS_ACCESS_KEY": BENCH_API_KEY},
+        "servers": [{
+            "name": "bench",
+            "host": BENCH_DOMAIN,
+            "port": 389,
+            "login": BENCH_LOGIN,
+            "password": BENCH_PASSWORD
+        }]
+    }
+    config.update(extra_config or {})
+    key = base64.urlsafe_b64encode(hashlib.sha256(BENCH_KEY.encode()).digest())
+    encrypted = Fernet(key).encrypt(yaml.safe_dump(config).encode("utf-8"))
+    (work_dir / "conf.yml.enc").write_bytes(encrypted)
+
+    os.environ["KEY"] = BENCH_KEY
+    os.chdir(work_dir)
+    if str(ROOT_DIR) not in sys.path:
+        sys.path.insert(0, str(ROOT_DIR))
+    return work_dir
+
+
+@asynccontextmanager
+async def running(app, ready_timeout: float = 30.0) -> AsyncIterator[None]:
+    '''
+    Запуск и остановка приложения, как в uvicorn: lifespan (загрузка
+    конфигурации, подготовка соединений) и ожидание готовности.
+    httpx.ASGITransport lifespan не выполняет.
+    '''
+    from services.warmup import warmup
+
+    async with app.router.lifespan_context(app):
+        await asyncio.to_thread(warmup.wait, ready_timeout)
+        yield
+
+
+def percentile(values: List[float], pct: float) -> float:
+    '''Перцентиль по методу ближайшего ранга'''
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def summary(values: List[float]) -> str:
+    '''Строка p50/p95/p99/max в миллисекундах'''
+    ms = [v * 1000 for v in values]
+    return (f"n={len(ms)} mean={statistics.fmean(ms):.2f}ms p50={percentile(ms, 50):.2f}ms "
+            f"p95={percentile(ms, 95):.2f}ms p99={percentile(ms, 99):.2f}ms max={max(ms):.2f}ms")
@@ -0,0 +1,94 @@
+"""
+Микробенчмарк: сжатие больших ответов /execute.
+
+Для ответов с группами и пользователями (форматы rows и columns)
+выводит степень сжатия и скорость каждого доступного кодирования на
+нескольких уровнях. Затем измеряет задержку цикла событий, пока
+CompressionMiddleware сжимает ответы с пользователями: в самом цикле
+событий (порог COMPRESSION_OFFLOAD_SIZE больше тела) и в пуле потоков.
+
+    python -m benchmarks.compression --entries 20000
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks.common import prepare_environment, summary
+from benchmarks.json_serialization import make_groups, make_users
+
+LEVELS = {'gzip': (1, 6, 9), 'zstd': (1, 3, 9), 'br': (1, 4, 9)}
+
+
+async def loop_lag(duration: float, interval: float = 0.005) -> list:
+    '''Задержки пробуждения таймера относительно интервала'''
+    lags = []
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, time.perf_counter() - started - interval))
+    return lags
+
+
+async def measure_lag(middleware_class, config, body: bytes, requests: int) -> list:
+    '''Задержка цикла событий, пока requests ответов сжимаются одновременно'''
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": body})
+
+    async def discard(message):
+        pass
+
+    middleware = middleware_class(app, config)
+    scope = {"type": "http", "headers": [(b"accept-encoding", config.compression[0].encode())]}
+    lag = asyncio.create_task(loop_lag(0.5))
+    await asyncio.sleep(0.05)
+    for _ in range(requests):
+        await asyncio.gather(*(middleware(scope, None, discard) for _ in range(4)))
+    return await lag
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=20000)
+    parser.add_argument("--lag-requests", type=int, default=5)
+    args = parser.parse_args()
+    prepare_environment()
+
+    from api.compression import Codec, available_codecs
+    from api.middleware import CompressionMiddleware
+    from api.responses import columnar, dumps, envelope
+    from configs.config import ResponseConfig
+
+    codecs = available_codecs(['zstd', 'br', 'gzip'], {'zstd': 3, 'br': 4, 'gzip': 6})
+    print(f"Доступные кодирования: {', '.join(codec.name for codec in codecs)}")
+
+    groups, users = make_groups(args.entries), make_users(args.entries)
+    bodies = {
+        'groups': dumps(envelope({'groups': groups})),
+        'groups columns': dumps(envelope({'groups': columnar(groups, list(groups[0]))})),
+        'users': dumps(envelope({'users': users})),
+        'users columns': dumps(envelope({'users': columnar(users, list(users[0]))})),
+    }
+    for label, body in bodies.items():
+        print(f"{label}: {len(body) / 2 ** 20:.1f}MB")
+        for codec in codecs:
+            for level in LEVELS[codec.name]:
+                started = time.perf_counter()
+                compressed = Codec(codec.name, level).compress(body)
+                elapsed = time.perf_counter() - started
+                print(f"  {codec.name:<5} {level:>2}  {len(compressed) / len(body):6.3f}  "
+                      f"{len(compressed) / 2 ** 10:8.0f}KB  {elapsed * 1000:7.1f}ms  "
+                      f"{len(body) / elapsed / 2 ** 20:7.0f}MB/s")
+
+    body = bodies['users']
+    for codec in codecs:
+        for mode, offload_size in (("цикл событий", len(body) + 1), ("пул потоков", 65536)):
+            config = ResponseConfig(compression=[codec.name], compression_offload_size=offload_size)
+            lags = asyncio.run(measure_lag(CompressionMiddleware, config, body, args.lag_requests))
+            print(f"Задержка цикла событий, {codec.name}, {mode}: {summary(lags)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Микробенчмарк: преобразование записей поиска в словари.
+
+Сравнивает прежний путь через объекты Entry ldap3 (connection.entries,
+hasattr/getattr и str() для групп, `attr in entry` и entry[attr].value для
+пользователей) с преобразованием записей connection.response заранее
+подготовленными функциями. Ответ синтетический, значения атрибутов
+форматируются по схеме AD так же, как при реальном поиске.
+
+    python -m benchmarks.entry_conversion --entries 50000
+"""
+import argparse
+import time
+import uuid
+
+from ldap3 import Server, Connection, MOCK_SYNC, OFFLINE_AD_2012_R2
+from ldap3.protocol.formatters.standard import format_attribute_values
+from ldap3.utils.ciDict import CaseInsensitiveDict
+
+from benchmarks.common import prepare_environment, BENCH_OU
+
+
+def make_response(schema, count: int, kind: str) -> list:
+    '''Синтетический connection.response из count записей групп или пользователей'''
+    response = []
+    for i in range(count):
+        dn = f"CN={kind}{i},{BENCH_OU}"
+        raw = {
+            'cn': [f"{kind}{i}".encode()],
+            'distinguishedName': [dn.encode()],
+            'objectGUID': [uuid.uuid4().bytes_le],
+            'sAMAccountName': [f"{kind}{i}".encode()],
+        }
+        if kind == 'group':
+            if i % 2:
+                raw['description'] = [f"Группа {i}".encode()]
+        else:
+            raw['mail'] = [f"{kind}{i}@bench.local".encode()]
+            raw['userAccountControl'] = [b'512']
+            raw['userPrincipalName'] = [f"{kind}{i}@bench.local".encode()]
+        attributes = CaseInsensitiveDict()
+        raw_attributes = CaseInsensitiveDict()
+        for name, values in raw.items():
+            raw_attributes[name] = values
+            attributes[name] = format_attribute_values(schema, name, values, None)
+        response.append({'type': 'searchResEntry', 'dn': dn,
+                         'attributes': attributes, 'raw_attributes': raw_attributes})
+    return response
+
+
+def legacy_group_to_dict(entry, attributes: list) -> dict:
+    group_data = {}
+    for attr in attributes:
+        if hasattr(entry, attr):
+            value = getattr(entry, attr)
+            if isinstance(value, list):
+                group_data[attr] = [str(v) for v in value]
+            else:
+                group_data[attr] = str(value)
+    return group_data
+
+
+def legacy_user_to_dict(entry, attributes: list) -> dict:
+    user_data = {}
+    for attr in attributes:
+        if attr in entry:
+            user_data[attr] = entry[attr].value
+        else:
+            user_data[attr] = None
+    return user_data
+
+
+def measure(label: str, func) -> tuple[float, list]:
+    started = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - started
+    print(f"  {label:<8} {elapsed:8.3f}s  {len(result) / elapsed:10.0f} записей/с")
+    return elapsed, result
+
+
+def run(args: argparse.Namespace) -> None:
+    prepare_environment()
+
+    from services.ad_manager import (GROUP_ATTRIBUTES, USER_ATTRIBUTES,
+                                     group_converter, user_converter, search_entries)
+
+    connection = Connection(Server('bench', get_info=OFFLINE_AD_2012_R2), client_strategy=MOCK_SYNC)
+    request = {'base': BENCH_OU, 'filter': '(objectClass=*)'}
+
+    cases = [('group', GROUP_ATTRIBUTES, legacy_group_to_dict, group_converter),
+             ('user', USER_ATTRIBUTES, legacy_user_to_dict, user_converter)]
+    for kind, attributes, legacy, make_converter in cases:
+        response = make_response(connection.server.schema, args.entries, kind)
+        print(f"{kind}: {args.entries} записей")
+
+        def old_path() -> list:
+            entries = connection._get_entries(response, request)
+            return [legacy(entry, attributes) for entry in entries]
+
+        def new_path() -> list:
+            convert = make_converter(attributes)
+            return [convert(entry) for entry in search_entries(response)]
+
+        old_time, old_result = measure("Entry", old_path)
+        new_time, new_result = measure("response", new_path)
+        if old_result != new_result:
+            raise SystemExit(f"Результаты преобразования {kind} различаются")
+        print(f"  ускорение x{old_time / new_time:.1f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=50000)
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Микробенчмарк: сериализация больших ответов /execute.
+
+Сравнивает прежние пути (валидация BaseResponse через response_model
+FastAPI и BaseResponse.model_dump_json()) с прямой сериализацией данных
+LDAP (api.responses.dumps: orjson, если установлен, иначе
+pydantic_core.to_json без построения модели) и с потоковой отправкой
+массива частями. Ответы синтетические и повторяют структуру групп,
+пользователей и сертификатов; результаты всех путей сверяются побайтно.
+Пик памяти потокового пути включает сборку частей в одно тело, при
+отправке клиенту части не накапливаются.
+
+Для списков также сравниваются форматы rows и columns (format=columns):
+размер тела, время кодирования и разбора ответа клиентом (json.loads).
+
+    python -m benchmarks.json_serialization --entries 20000
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import time
+import tracemalloc
+import uuid
+from typing import Callable
+
+from benchmarks.common import prepare_environment, BENCH_OU
+
+
+def make_groups(count: int) -> list:
+    return [{
+        'cn': f"group{i}",
+        'description': f"Группа доступа {i}" if i % 2 else None,
+        'distinguishedName': f"CN=group{i},{BENCH_OU}",
+        'objectGUID': str(uuid.uuid4()),
+        'sAMAccountName': f"group{i}"
+    } for i in range(count)]
+
+
+def make_users(count: int) -> list:
+    return [{
+        'sAMAccountName': f"user{i}",
+        'cn': f"Пользователь {i}",
+        'mail': f"user{i}@bench.local",
+        'distinguishedName': f"CN=user{i},{BENCH_OU}",
+        'objectGUID': str(uuid.uuid4()),
+        'employeeNumber': str(i) if i % 3 else None,
+        'userPrincipalName': f"user{i}@bench.local",
+        'userAccountControl': 512
+    } for i in range(count)]
+
+
+def make_certificates(count: int) -> dict:
+    certificate = base64.b64encode(os.urandom(1200)).decode('ascii')
+    metadata = {
+        'subject': "CN=user,OU=Bench,DC=bench,DC=local",
+        'issuer': "CN=Bench CA,DC=bench,DC=local",
+        'serial_number': "1A2B3C4D5E6F",
+        'not_before': "2024-01-01T00:00:00+00:00",
+        'not_after': "2026-01-01T00:00:00+00:00",
+        'thumbprint': "AB" * 20
+    }
+    certificates = {str(uuid.uuid4()): [dict(metadata, certificate_data=certificate)]
+                    for _ in range(count)}
+    return {'certificates': certificates, 'not_found': [str(uuid.uuid4()) for _ in range(count // 10)]}
+
+
+def measure(func: Callable[[], bytes], repeat: int) -> tuple[float, float, bytes]:
+    '''Лучшее время из repeat запусков и пик выделенной памяти, МБ'''
+    best = float('inf')
+    body = b''
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = func()
+        best = min(best, time.perf_counter() - started)
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak / 2 ** 20, body
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--chunk", type=int, default=1000, help="Элементов массива в части потокового ответа")
+    args = parser.parse_args()
+    prepare_environment()
+
+    from fastapi.responses import JSONResponse
+    from api import responses
+    from api.responses import StreamingArrayResponse, columnar, dumps, envelope
+    from schemas.response import BaseResponse
+
+    def response_model(key: str, details) -> bytes:
+        # return BaseResponse(...) при response_model=BaseResponse: валидация и dump в JSONResponse
+        model = BaseResponse.model_validate(BaseResponse(data={key: details}).model_dump())
+        return JSONResponse(model.model_dump(mode='json')).body
+
+    def fallback(key: str, details) -> bytes:
+        encoder, responses.orjson = responses.orjson, None
+        try:
+            return dumps(envelope({key: details}))
+        finally:
+            responses.orjson = encoder
+
+    loop = asyncio.new_event_loop()
+
+    def streaming(key: str, details) -> bytes:
+        async def collect() -> bytes:
+            response = StreamingArrayResponse(key, details, chunk_size=args.chunk)
+            return b''.join([chunk async for chunk in response.body_iterator])
+        return loop.run_until_complete(collect())
+
+    shapes = [
+        ('groups', make_groups(args.entries)),
+        ('users', make_users(args.entries)),
+        ('users_certificates', make_certificates(args.entries // 4)),
+    ]
+    paths = [
+        ("response_model", response_model),
+        ("model_dump_json", lambda key, details: BaseResponse(data={key: details}).model_dump_json().encode()),
+        ("to_json", fallback),
+    ]
+    if responses.orjson is not None:
+        paths.append(("orjson", lambda key, details: dumps(envelope({key: details}))))
+    paths.append(("stream", streaming))
+
+    print(f"Кодировщик по умолчанию: {'orjson' if responses.orjson is not None else 'pydantic_core'}")
+    for key, details in shapes:
+        count = len(details) if isinstance(details, list) else len(details['certificates'])
+        print(f"{key}: {count} записей")
+        baseline = None
+        for label, path in paths:
+            if label == "stream" and not isinstance(details, list):
+                continue
+            elapsed, peak, body = measure(lambda: path(key, details), args.repeat)
+            if label == "response_model":
+                same = json.loads(body) == json.loads(BaseResponse(data={key: details}).model_dump_json())
+            else:
+                baseline = baseline or body
+                same = body == baseline
+            print(f"  {label:<16} {elapsed * 1000:9.1f}ms  пик {peak:7.1f}MB  "
+                  f"{len(body) / 2 ** 20:6.1f}MB  {'совпадает' if same else 'ОТЛИЧАЕТСЯ'}")
+    loop.close()
+
+    print("Форматы списков: rows / columns")
+    for key, details in shapes:
+        if not isinstance(details, list):
+            continue
+        columns = list(details[0])
+        rows_time, _, rows_body = measure(lambda: dumps(envelope({key: details})), args.repeat)
+        cols_time, _, cols_body = measure(lambda: dumps(envelope({key: columnar(details, columns)})), args.repeat)
+        rows_parse, _, _ = measure(lambda: json.loads(rows_body), args.repeat)
+        cols_parse, _, _ = measure(lambda: json.loads(cols_body), args.repeat)
+        print(f"  {key:<8} размер {len(rows_body) / 2 ** 20:5.1f}MB / {len(cols_body) / 2 ** 20:5.1f}MB  "
+              f"кодирование {rows_time * 1000:6.1f}ms / {cols_time * 1000:6.1f}ms  "
+              f"разбор {rows_parse * 1000:6.1f}ms / {cols_parse * 1000:6.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
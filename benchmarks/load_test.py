@@ -0,0 +1,266 @@
+"""
+Нагрузочный тест сервиса на синтетическом каталоге в ldap3 MOCK_SYNC/MOCK_ASYNC.
+
+Каталог: --groups групп в --ous подразделениях OU=Gnn,OU=Groups, вложенных
+деревом (каждая группа входит в родительскую, ветвление --fanout), и
+--users пользователей в --user-ous подразделениях OU=Unn,OU=Users, каждый
+в --memberships случайных группах. Запросы пользователей выполняются в
+пределах одного подразделения.
+Приложение FastAPI вызывается в процессе через httpx.ASGITransport; пулы
+соединений, executor и сериализация работают как в сервисе, заменяется
+только транспорт LDAP (mock ldap3 перебирает весь каталог при каждом
+поиске, поэтому абсолютные значения зависят от размера каталога).
+
+Смесь запросов задается --mix (метод=вес). Результат: пропускная
+способность, p50/p95/p99 по методам и пиковый RSS процесса.
+
+    python -m benchmarks.load_test --users 100000 --groups 10000 --requests 2000 --concurrency 32
+"""
+import argparse
+import asyncio
+import itertools
+import random
+import sys
+import time
+import uuid
+from collections import defaultdict
+from typing import Callable, Dict, List
+
+import httpx
+from ldap3 import Server, Connection, ASYNC, MOCK_SYNC, MOCK_ASYNC, OFFLINE_AD_2012_R2
+
+from benchmarks.common import (prepare_environment, running, summary, BENCH_API_KEY, BENCH_DOMAIN,
+                               BENCH_LOGIN, BENCH_PASSWORD)
+
+ROOT_DN = "DC=bench,DC=local"
+GROUPS_OU = f"OU=Groups,{ROOT_DN}"
+USERS_OU = f"OU=Users,{ROOT_DN}"
+
+DEFAULT_MIX = "get_groups_by_ou=30,get_users_by_group=30,get_user_certificates=30,create_group=10"
+
+
+def peak_rss_mb() -> float:
+    '''Пиковый RSS процесса, МБ (ru_maxrss: КБ в Linux, байты в macOS)'''
+    try:
+        import resource
+    except ImportError:  # Windows
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+# Байты, которые mock ldap3 неверно сопоставляет в экранированном фильтре по objectGUID
+FILTER_SPECIAL_BYTES = frozenset(b'*()\\\x00')
+
+
+def random_guid(rng: random.Random) -> uuid.UUID:
+    while True:
+        guid = uuid.UUID(int=rng.getrandbits(128))
+        if not FILTER_SPECIAL_BYTES.intersection(guid.bytes_le):
+            return guid
+
+
+class SnapshotDict(dict):
+    '''
+    Каталог mock сервера (Server.dit). ldap3 перебирает его при поиске без
+    блокировок, поэтому добавление группы в другом потоке приводит к
+    "dictionary changed size during iteration"; перебор идет по копии ключей.
+    '''
+
+    def __iter__(self):
+        return iter(list(dict.keys(self)))
+
+
+class Directory:
+    '''Синтетический каталог, общий для всех mock соединений (хранится в Server)'''
+
+    def __init__(self, args: argparse.Namespace):
+        self.server = Server(BENCH_DOMAIN, get_info=OFFLINE_AD_2012_R2)
+        self.ous = [f"OU=G{i:03d},{GROUPS_OU}" for i in range(args.ous)]
+        self.user_ous = [f"OU=U{i:03d},{USERS_OU}" for i in range(args.user_ous)]
+        self.groups: List[str] = []
+        # GUID пользователей по подразделениям
+        self.user_guids: Dict[str, List[str]] = defaultdict(list)
+        self._seed(args)
+
+    def _seed(self, args: argparse.Namespace) -> None:
+        rng = random.Random(args.seed)
+        connection = Connection(self.server, client_strategy=MOCK_SYNC)
+        self.server.dit = SnapshotDict(self.server.dit)
+        add = connection.strategy.add_entry
+        add(BENCH_LOGIN, {"objectClass": ["top", "user"], "userPassword": BENCH_PASSWORD,
+                          "sAMAccountName": "svc"})
+        for dn in [ROOT_DN, GROUPS_OU, USERS_OU] + self.ous + self.user_ous:
+            add(dn, {"objectClass": ["top", "organizationalUnit"]})
+
+        members: Dict[str, List[str]] = defaultdict(list)
+        for i in range(args.groups):
+            dn = f"CN=group{i},{self.ous[i % len(self.ous)]}"
+            self.groups.append(dn)
+            if i:
+                # Вложенность: группа i входит в группу (i - 1) // fanout
+                members[self.groups[(i - 1) // args.fanout]].append(dn)
+
+        users = []
+        for i in range(args.users):
+            ou = self.user_ous[i % len(self.user_ous)]
+            dn = f"CN=user{i},{ou}"
+            groups = rng.sample(self.groups, min(args.memberships, len(self.groups)))
+            for group in groups:
+                members[group].append(dn)
+            guid = random_guid(rng)
+            self.user_guids[ou].append(str(guid))
+            users.append((dn, i, guid, groups))
+
+        for i, dn in enumerate(self.groups):
+            parent = [self.groups[(i - 1) // args.fanout]] if i else []
+            add(dn, {"objectClass": ["top", "group"], "cn": f"group{i}", "sAMAccountName": f"group{i}",
+                     "description": f"Группа {i}", "distinguishedName": dn,
+                     "objectGUID": random_guid(rng).bytes_le,
+                     "memberOf": parent, "member": members.get(dn, [])})
+        for dn, i, guid, groups in users:
+            add(dn, {"objectClass": ["top", "person", "user"], "cn": f"user{i}",
+                     "sAMAccountName": f"user{i}", "userPrincipalName": f"user{i}@bench.local",
+                     "mail": f"user{i}@bench.local", "distinguishedName": dn,
+                     "objectGUID": guid.bytes_le, "userAccountControl": 512, "memberOf": groups,
+                     "userCertificate": [rng.randbytes(args.certificate_size)]})
+
+    def connection_factory(self) -> Callable[..., Connection]:
+        '''Замена ldap3.Connection в пуле: mock соединение с общим каталогом'''
+        def create(server, user=None, password=None, client_strategy=None, auto_bind=False, **kwargs):
+            strategy = MOCK_ASYNC if client_strategy == ASYNC else MOCK_SYNC
+            connection = Connection(self.server, user=user, password=password, client_strategy=strategy)
+            # MOCK_ASYNC с auto_bind оставляет соединение закрытым, поэтому open и bind явно
+            if auto_bind:
+                connection.open()
+                connection.bind()
+            return connection
+        return create
+
+
+def write_schema_snapshot(directory: Directory, snapshot_dir: str) -> None:
+    '''Снимок схемы для кэша схемы сервиса (SchemaCache.SNAPSHOT_DIR)'''
+    directory.server.info.to_file(f"{snapshot_dir}/{BENCH_DOMAIN}.info.json")
+    directory.server.schema.to_file(f"{snapshot_dir}/{BENCH_DOMAIN}.schema.json")
+
+
+def request_builders(directory: Directory, rng: random.Random) -> Dict[str, Callable[[], dict]]:
+    created = itertools.count()
+    run_id = uuid.uuid4().hex[:8]
+
+    def user_certificate() -> dict:
+        ou = rng.choice(directory.user_ous)
+        return {"ou_dn": ou, "user_guid": rng.choice(directory.user_guids[ou])}
+
+    def users_certificates() -> dict:
+        ou = rng.choice(directory.user_ous)
+        guids = directory.user_guids[ou]
+        return {"ou_dn": ou, "user_guids": rng.sample(guids, min(20, len(guids)))}
+
+    return {
+        "get_groups_by_ou": lambda: {"ou_dn": rng.choice(directory.ous)},
+        "get_users_by_group": lambda: {"ou_dn": rng.choice(directory.user_ous),
+                                       "group_dn": rng.choice(directory.groups)},
+        "get_user_certificates": user_certificate,
+        "get_users_certificates": users_certificates,
+        "create_group": lambda: {"ou_dn": rng.choice(directory.ous), "cn": f"new-{run_id}-{next(created)}"},
+    }
+
+
+def parse_mix(value: str) -> Dict[str, int]:
+    mix = {}
+    for item in value.split(","):
+        method, _, weight = item.partition("=")
+        mix[method.strip()] = int(weight or 1)
+    return mix
+
+
+async def run(args: argparse.Namespace) -> None:
+    work_dir = prepare_environment({
+        "SchemaCache": {"SNAPSHOT_DIR": "snapshots", "TTL": 10 ** 9},
+        "Failover": {"PROBE_INTERVAL": 0},
+        "Cache": {"ENABLED": args.cache},
+        "Pool": {"MIN_SIZE": 1, "MAX_SIZE": args.pool_size},
+        "Executor": {"PER_DOMAIN_LIMIT": args.pool_size},
+        "Logging": {"SAMPLE_RATE": args.log_sample_rate},
+    })
+
+    started = time.perf_counter()
+    directory = Directory(args)
+    (work_dir / "snapshots").mkdir()
+    write_schema_snapshot(directory, str(work_dir / "snapshots"))
+    print(f"Каталог: {args.users} пользователей в {args.user_ous} OU, {args.groups} групп в {args.ous} OU, "
+          f"создан за {time.perf_counter() - started:.1f}s, RSS {peak_rss_mb():.0f} МБ")
+
+    import main
+    from services import connection_pool
+
+    # Снимки схемы загружаются и пулы заполняются при запуске приложения (running)
+    connection_pool.Connection = directory.connection_factory()
+
+    rng = random.Random(args.seed)
+    builders = request_builders(directory, rng)
+    mix = parse_mix(args.mix)
+    unknown = set(mix) - set(builders)
+    if unknown:
+        raise SystemExit(f"Неизвестные методы в --mix: {', '.join(sorted(unknown))}")
+    methods = rng.choices(list(mix), weights=list(mix.values()), k=args.requests)
+
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    headers = {"X-API-Key": BENCH_API_KEY}
+
+    async def one(client: httpx.AsyncClient, method: str) -> None:
+        payload = {"method": method, "parameters": {"domain": BENCH_DOMAIN, **builders[method]()}}
+        async with semaphore:
+            request_started = time.perf_counter()
+            response = await client.post("/execute", json=payload, headers=headers)
+            latencies[method].append(time.perf_counter() - request_started)
+        if response.status_code != 200:
+            errors[method] += 1
+            if errors[method] == 1:
+                print(f"  ошибка {method}: {response.status_code} {response.text[:200]}")
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with running(main.app), \
+            httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for method in mix:
+            await one(client, method)
+        latencies.clear()
+        errors.clear()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(client, method) for method in methods))
+        elapsed = time.perf_counter() - started
+
+    print(f"Запросов: {args.requests}, параллельно: {args.concurrency}, кэш: {'да' if args.cache else 'нет'}")
+    print(f"Пропускная способность: {args.requests / elapsed:.1f} запросов/с за {elapsed:.1f}s")
+    for method in mix:
+        if latencies[method]:
+            print(f"  {method:<24} {summary(latencies[method])} ошибок: {errors[method]}")
+    print(f"  {'всего':<24} {summary([v for values in latencies.values() for v in values])}")
+    print(f"Пиковый RSS: {peak_rss_mb():.0f} МБ")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--groups", type=int, default=1000)
+    parser.add_argument("--ous", type=int, default=50, help="Подразделений с группами")
+    parser.add_argument("--user-ous", type=int, default=100, help="Подразделений с пользователями")
+    parser.add_argument("--fanout", type=int, default=10, help="Ветвление дерева вложенных групп")
+    parser.add_argument("--memberships", type=int, default=3, help="Групп у каждого пользователя")
+    parser.add_argument("--certificate-size", type=int, default=1200)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--pool-size", type=int, default=8, help="MAX_SIZE пула и PER_DOMAIN_LIMIT")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Методы и веса: метод=вес,...")
+    parser.add_argument("--cache", action="store_true", help="Включить кэш чтения")
+    parser.add_argument("--log-sample-rate", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=1)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
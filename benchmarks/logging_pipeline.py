@@ -0,0 +1,132 @@
+"""
+Нагрузочный тест: задержка /execute при синхронной записи журнала и через очередь.
+
+Каждый запрос /execute пишет в журнал строку с параметрами. Конкуренция
+за диск имитируется задержкой --stall-ms на каждой --stall-every записи
+в файл журнала; дополнительно --contention запускает потоки, которые
+пишут в тот же каталог с fsync. LDAP операция заменена мгновенной
+функцией, поэтому задержка запроса определяется журналом.
+
+    python -m benchmarks.logging_pipeline --requests 2000 --stall-ms 20
+"""
+import argparse
+import asyncio
+import logging
+import os
+import threading
+import time
+
+import httpx
+
+from benchmarks.common import prepare_environment, running, summary, BENCH_API_KEY, BENCH_DOMAIN, BENCH_OU
+
+
+class StallingStream:
+    '''Файл журнала, запись в который периодически задерживается'''
+
+    def __init__(self, stream, stall: float, every: int):
+        self._stream = stream
+        self._stall = stall
+        self._every = every
+        self._writes = 0
+
+    def write(self, data: str) -> int:
+        self._writes += 1
+        if self._every and self._writes % self._every == 0:
+            time.sleep(self._stall)
+        return self._stream.write(data)
+
+    def __getattr__(self, name: str):
+        return getattr(self._stream, name)
+
+
+def disk_contention(directory: str, stop: threading.Event) -> None:
+    '''Запись блоков по 1 МБ с fsync в каталог журнала'''
+    path = os.path.join(directory, f"contention-{threading.get_ident()}.bin")
+    block = os.urandom(1024 * 1024)
+    with open(path, "wb") as f:
+        while not stop.is_set():
+            f.write(block)
+            f.flush()
+            os.fsync(f.fileno())
+            f.seek(0)
+    os.remove(path)
+
+
+def file_handler() -> logging.Handler:
+    from configs import logging_config
+    if logging_config._listener is not None:
+        return logging_config._listener.handlers[0]
+    return logging.getLogger().handlers[0]
+
+
+async def measure(client: httpx.AsyncClient, requests: int, concurrency: int) -> list:
+    payload = {"method": "get_groups_by_ou",
+               "parameters": {"domain": BENCH_DOMAIN, "ou_dn": BENCH_OU}}
+    headers = {"X-API-Key": BENCH_API_KEY}
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one() -> None:
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.post("/execute", json=payload, headers=headers)
+            latencies.append(time.perf_counter() - started)
+            response.raise_for_status()
+
+    await asyncio.gather(*(one() for _ in range(requests)))
+    return latencies
+
+
+async def run(args: argparse.Namespace) -> None:
+    work_dir = prepare_environment({"Executor": {"COALESCE_READS": False}, "Cache": {"ENABLED": False}})
+
+    import main
+    from api.routers import execute
+    from configs import logging_config
+
+    execute.read_groups = lambda **kwargs: (True, [])
+
+    stop = threading.Event()
+    contention = [threading.Thread(target=disk_contention, args=(str(work_dir / logging_config.LOG_DIR), stop),
+                                   daemon=True) for _ in range(args.contention)]
+    for thread in contention:
+        thread.start()
+
+    print(f"Запросов: {args.requests}, параллельно: {args.concurrency}, "
+          f"задержка записи: {args.stall_ms}ms на каждую {args.stall_every}-ю, потоков fsync: {args.contention}")
+    transport = httpx.ASGITransport(app=main.app)
+    async with running(main.app), \
+            httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for mode in args.modes.split(","):
+            logging_config.setup_logging(log_format=args.format, use_queue=(mode == "queue"),
+                                         queue_size=args.queue_size)
+            handler = file_handler()
+            handler.stream = StallingStream(handler.stream, args.stall_ms / 1000, args.stall_every)
+            dropped = logging_config.dropped_records()
+            await measure(client, min(100, args.requests), args.concurrency)
+            latencies = await measure(client, args.requests, args.concurrency)
+            dropped = logging_config.dropped_records() - dropped
+            print(f"  {mode:<6} {summary(latencies)} отброшено записей: {dropped}")
+
+    stop.set()
+    for thread in contention:
+        thread.join()
+    logging_config.setup_logging(use_queue=False)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--stall-ms", type=float, default=20.0, help="Задержка записи в файл журнала, мс")
+    parser.add_argument("--stall-every", type=int, default=50, help="Задерживать каждую N-ю запись")
+    parser.add_argument("--contention", type=int, default=0, help="Потоков записи с fsync в каталог журнала")
+    parser.add_argument("--queue-size", type=int, default=10000)
+    parser.add_argument("--format", choices=("text", "json"), default="text")
+    parser.add_argument("--modes", default="sync,queue", help="Режимы через запятую: sync, queue")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
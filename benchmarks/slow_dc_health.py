@@ -0,0 +1,93 @@
+"""
+Нагрузочный тест: задержка /health при зависших на медленном DC запросах /execute.
+
+Медленный контроллер домена имитируется заменой read_groups на функцию,
+которая блокирует поток на --delay секунд. Для сравнения с прежним
+поведением (LDAP вызов прямо в цикле событий) используйте --inline.
+С --path /health/ready или /health/deep измеряются проверки готовности:
+они отдают результат фоновой проверки доменов и к AD не обращаются.
+
+    python -m benchmarks.slow_dc_health --slow-requests 20 --delay 2
+    python -m benchmarks.slow_dc_health --path /health/deep
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from benchmarks.common import prepare_environment, running, summary, BENCH_API_KEY, BENCH_DOMAIN, BENCH_OU
+
+
+async def measure_health(client: httpx.AsyncClient, count: int, interval: float, path: str = "/health") -> list:
+    '''Запросы path по расписанию; задержка считается от запланированного момента'''
+    latencies = []
+    started = time.perf_counter()
+    for i in range(count):
+        scheduled = started + i * interval
+        await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+        response = await client.get(path)
+        latencies.append(time.perf_counter() - scheduled)
+        # 503 - сервис не готов (в бенчмарке контроллеров домена нет), ответ тоже измеряется
+        if response.status_code != 503:
+            response.raise_for_status()
+    return latencies
+
+
+async def run(args: argparse.Namespace) -> None:
+    prepare_environment()
+
+    import main
+    from api.routers import execute
+    from services.executor import ldap_executor
+
+    def slow_read_groups(**kwargs):
+        time.sleep(args.delay)
+        return True, []
+
+    execute.read_groups = slow_read_groups
+    if args.inline:
+        async def inline_run(domain, func, *f_args, **f_kwargs):
+            return func(*f_args, **f_kwargs)
+        ldap_executor.run = inline_run
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with running(main.app), \
+            httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        if args.path != "/health":
+            # Первая фоновая проверка доменов выполняется после подготовки соединений
+            from services.health import health_monitor
+            await asyncio.to_thread(health_monitor.refresh)
+        baseline = await measure_health(client, args.health_requests, args.interval, args.path)
+
+        payload = {"method": "get_groups_by_ou",
+                   "parameters": {"domain": BENCH_DOMAIN, "ou_dn": BENCH_OU}}
+        started = time.perf_counter()
+        health = asyncio.create_task(measure_health(client, args.health_requests, args.interval, args.path))
+        await asyncio.sleep(args.interval * 3)
+        slow = [asyncio.create_task(client.post("/execute", json=payload,
+                                                headers={"X-API-Key": BENCH_API_KEY}))
+                for _ in range(args.slow_requests)]
+        under_load = await health
+        health_window = time.perf_counter() - started
+        await asyncio.gather(*slow)
+
+    mode = "inline (блокирующий)" if args.inline else "executor"
+    print(f"Режим: {mode}; зависших /execute: {args.slow_requests} x {args.delay}s")
+    print(f"{args.path} без нагрузки: {summary(baseline)}")
+    print(f"{args.path} под нагрузкой: {summary(under_load)} (окно {health_window:.2f}s)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--slow-requests", type=int, default=20)
+    parser.add_argument("--delay", type=float, default=2.0, help="Задержка имитируемого DC, сек")
+    parser.add_argument("--health-requests", type=int, default=50)
+    parser.add_argument("--interval", type=float, default=0.01)
+    parser.add_argument("--path", default="/health", choices=["/health", "/health/ready", "/health/deep"])
+    parser.add_argument("--inline", action="store_true", help="Выполнять LDAP вызовы в цикле событий")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,17 @@
 from configs.logging_config import setup_logging
 import yaml
-from dataclasses import dataclass
-from typing import List, Optional
+import hashlib
+import hmac
+import os
+import threading
+from dataclasses import dataclass, field, fields
+from typing import Callable, Dict, FrozenSet, List, Optional, Set
 from configs.crypt import decrypt_file
+from configs import shared_config
 import logging
 from configs.env import get_env_variable
 from api.errors import APIError
 
-setup_logging()
-
 logger = logging.getLogger(__name__)
 
 LOG_DIR = 'logs'
@@ -24,11 +27,19 @@ class ServerConfig:
     enable_passwork: bool
     login: str
     password: str
+    # Контроллеры домена (host или host:port); пустой список - поиск по SRV или host
+    dcs: List[str] = field(default_factory=list)
+    # Домен DNS для поиска контроллеров по записям _ldap._tcp.<srv_domain>
+    srv_domain: str = ''
 
 @dataclass
 class GeneralConfig:
     """Общие настройки сервиса"""
-    api_key: str
+    # Ключи API в виде SHA-256 (hex): ADIS_ACCESS_KEY хэшируется при разборе,
+    # открытый текст не хранится
+    api_key_hashes: List[str] = field(default_factory=list)
+    # Интервал проверки изменения файла конфигурации, 0 - только по SIGHUP
+    reload_interval: float = 5.0
   
 @dataclass
 class PassworkClientConfig:
@@ -38,6 +49,142 @@ class PassworkClientConfig:
     master_key: str
     host: str  
 
+@dataclass
+class PoolConfig:
+    """Настройки пула LDAP соединений"""
+    min_size: int = 1
+    max_size: int = 10
+    acquire_timeout: float = 10.0
+    health_check_interval: float = 30.0
+    max_idle_time: float = 300.0
+
+@dataclass
+class SchemaCacheConfig:
+    """Настройки кэша схемы и Root DSE контроллеров домена"""
+    ttl: float = 3600.0
+    snapshot_dir: str = ''
+
+@dataclass
+class ExecutorConfig:
+    """Настройки пула потоков для LDAP операций"""
+    max_workers: int = 32
+    per_domain_limit: int = 8
+    batch_concurrency: int = 4
+    bulk_window: int = 64
+    # Объединение одновременных одинаковых запросов чтения в одну LDAP операцию
+    coalesce_reads: bool = True
+
+@dataclass
+class FailoverConfig:
+    """Настройки выбора контроллеров домена и их проверки"""
+    srv_file: str = ''
+    probe_interval: float = 15.0
+    probe_timeout: float = 3.0
+    connect_timeout: float = 5.0
+    failure_threshold: int = 3
+    open_timeout: float = 30.0
+    discovery_interval: float = 300.0
+
+@dataclass
+class HealthConfig:
+    """Настройки /health/ready и /health/deep: фоновая проверка доменов"""
+    # Интервал обновления состояния доменов; проверка bind пропускается, если были успешные операции
+    interval: float = 10.0
+    # Состояние старше max_age считается устаревшим, сервис не готов
+    max_age: float = 60.0
+    # Готовность: all - все домены доступны, any - хотя бы один
+    ready_domains: str = 'all'
+    # Доля занятых соединений пула, с которой домен считается перегруженным
+    saturation_threshold: float = 0.9
+
+@dataclass
+class LoggingConfig:
+    """Настройки журнала: формат, очередь фоновой записи и выборка"""
+    format: str = 'text'
+    queue: bool = True
+    queue_size: int = 10000
+    # Доля сохраняемых записей INFO логгеров sampled_loggers (1.0 - все)
+    sample_rate: float = 1.0
+    sampled_loggers: List[str] = field(default_factory=lambda: ['api.routers.execute'])
+
+@dataclass
+class ResponseConfig:
+    """Настройки ответов /execute"""
+    # Ответы с массивом длиннее stream_threshold отправляются частями (0 - всегда целиком)
+    stream_threshold: int = 5000
+    stream_chunk: int = 1000
+    # Результаты не длиннее validate_max_entries проверяются моделями ответа (0 - без проверки)
+    validate_max_entries: int = 100
+    # Кодирования сжатия в порядке предпочтения; zstd и br - при установленных zstandard и brotli
+    compression: List[str] = field(default_factory=lambda: ['zstd', 'br', 'gzip'])
+    # Тела меньше compression_min_size не сжимаются, от compression_offload_size сжимаются в пуле потоков
+    compression_min_size: int = 1024
+    compression_offload_size: int = 65536
+    gzip_level: int = 6
+    zstd_level: int = 3
+    brotli_quality: int = 4
+
+@dataclass
+class CacheConfig:
+    """Настройки кэша чтения групп и участников"""
+    # Выключен по умолчанию: изменения, сделанные не через сервис, видны с задержкой до TTL
+    enabled: bool = False
+    ttl: float = 30.0
+    max_entries: int = 1024
+    backend: str = 'memory'
+    path: str = 'cache'
+
+@dataclass(frozen=True)
+class ServerIndex:
+    """Список доменов и индексы по хосту и имени; заменяется целиком при перезагрузке"""
+    servers: List[ServerConfig]
+    by_host: Dict[str, ServerConfig]
+    by_name: Dict[str, ServerConfig]
+    api_key_digests: FrozenSet[bytes]
+
+    @classmethod
+    def build(cls, servers: List[ServerConfig], general: GeneralConfig) -> 'ServerIndex':
+        by_host: Dict[str, ServerConfig] = {}
+        by_name: Dict[str, ServerConfig] = {}
+        for server in servers:
+            # Как и при поиске перебором, используется первый домен с совпадающим адресом
+            if server.host in by_host:
+                logger.warning(f"Домен с адресом {server.host} указан в конфигурации повторно")
+            by_host.setdefault(server.host, server)
+            by_name.setdefault(server.name, server)
+        return cls(servers=servers, by_host=by_host, by_name=by_name,
+                   api_key_digests=api_key_digests(general))
+
+
+def api_key_digest(api_key: str) -> bytes:
+    return hashlib.sha256(api_key.encode('utf-8')).digest()
+
+
+def api_key_digests(general: GeneralConfig) -> FrozenSet[bytes]:
+    """SHA-256 ключей API из ADIS_ACCESS_KEY (строка или список) и ADIS_ACCESS_KEY_SHA256"""
+    digests = set()
+    for value in general.api_key_hashes:
+        try:
+            digests.add(bytes.fromhex(value))
+        except ValueError:
+            logger.warning("Некорректное значение SHA-256 ключа API в ADIS_ACCESS_KEY_SHA256")
+    return frozenset(digests)
+
+
+def _changed_hosts(old: List[ServerConfig], new: List[ServerConfig]) -> Set[str]:
+    """Адреса доменов, которые добавлены, удалены или изменены"""
+    old_servers = {server.host: server for server in old}
+    new_servers = {server.host: server for server in new}
+    return {host for host in old_servers.keys() | new_servers.keys()
+            if old_servers.get(host) != new_servers.get(host)}
+
+
+def _update_section(section, values) -> None:
+    """Обновление раздела настроек на месте: модули сервиса хранят ссылки на разделы"""
+    for item in fields(section):
+        setattr(section, item.name, getattr(values, item.name))
+
+
 class Config:
     """Класс для чтения и работы с конфигурацией из YAML файла"""
     
@@ -46,20 +193,107 @@ class Config:
         self.config_path = config_path
         self.passwork_client: Optional[PassworkClientConfig] = None
         self.general: Optional[GeneralConfig] = None
-        self.servers: List[ServerConfig] = []
-        self._load_config()
+        self.pool: PoolConfig = PoolConfig()
+        self.schema_cache: SchemaCacheConfig = SchemaCacheConfig()
+        self.executor: ExecutorConfig = ExecutorConfig()
+        self.cache: CacheConfig = CacheConfig()
+        self.failover: FailoverConfig = FailoverConfig()
+        self.logging: LoggingConfig = LoggingConfig()
+        self.response: ResponseConfig = ResponseConfig()
+        self.health: HealthConfig = HealthConfig()
+        self._index = ServerIndex.build([], GeneralConfig())
+        self._reload_lock = threading.Lock()
+        self._reload_listeners: List[Callable[[Set[str]], None]] = []
+        self.loaded_mtime = 0.0
+        self.loaded = False
+
+    @property
+    def servers(self) -> List[ServerConfig]:
+        return self._index.servers
+
+    def load(self) -> None:
+        """
+        Загрузка конфигурации при запуске сервиса (lifespan приложения,
+        serve.py). При импорте модулей файл не расшифровывается; повторный
+        вызов ничего не делает.
+        """
+        with self._reload_lock:
+            if self.loaded:
+                return
+            setup_logging()
+            self._load_config()
+            self.loaded = True
+
+    def _read_config_data(self) -> dict:
+        """Расшифровка и разбор конфигурационного файла"""
+        try:
+            mtime = os.path.getmtime(self.config_path)
+
+            # Воркеры serve.py получают конфигурацию, расшифрованную один раз,
+            # пока файл не изменился после запуска
+            shared = shared_config.read_shared_config()
+            if shared is not None and shared[1] == mtime:
+                config_text = shared[0]
+            else:
+                key = get_env_variable()
+                config_text = decrypt_file(file_path=self.config_path, password=key)
+
+            config_data = yaml.safe_load(config_text)
+            self.loaded_mtime = mtime
+            return config_data
+        except FileNotFoundError:
+            logger.error(f"Конфигурационный файл не найден: {self.config_path}")
+            raise FileNotFoundError(f"Конфигурационный файл не найден: {self.config_path}")
+        except yaml.YAMLError as e:
+            logger.error(f"Ошибка парсинга YAML: {e}", exc_info=True)
+            raise ValueError(f"Ошибка парсинга YAML: {e}")
+        except Exception as e:
+            logger.error(f"Ошибка загрузки конфигурации: {e}", exc_info=True)
+            raise ValueError(f"Ошибка загрузки конфигурации: {e}")
+
+    @staticmethod
+    def _parse_general(config_data: dict) -> GeneralConfig:
+        general_data = config_data.get('General', {})
+        keys = general_data.get('ADIS_ACCESS_KEY')
+        hashes = general_data.get('ADIS_ACCESS_KEY_SHA256', []) or []
+        if isinstance(hashes, str):
+            hashes = [hashes]
+        return GeneralConfig(
+                    api_key_hashes=[api_key_digest(str(key)).hex()
+                                    for key in (keys if isinstance(keys, list) else [keys]) if key]
+                                   + list(hashes),
+                    reload_interval=general_data.get('RELOAD_INTERVAL', 5.0)
+                    )
+
+    @staticmethod
+    def _parse_servers(config_data: dict) -> List[ServerConfig]:
+        servers = []
+        servers_data = config_data.get('servers', [])
+        for server in servers_data:
+            
+            server_data = ServerConfig(
+                name=server.get('name', ''),
+                host=server.get('host', ''),
+                port=server.get('port', 389),
+                item_id=server.get('item_id', ''),
+                enable_passwork=server.get('enable_passwork', ''),
+                login=server.get('login', ''),
+                password=server.get('password', ''),
+                dcs=server.get('dcs', []) or [],
+                srv_domain=server.get('srv_domain', '')
+            )
+            if server_data.enable_passwork == True:
+                # TODO добавить обработку получения уч. данных с passwork
+                pass
+            servers.append(server_data)
+            logger.info(f"Параметры домена {server_data.name}")
+        return servers
     
     def _load_config(self) -> None:
         """Загрузка конфигурации из YAML файла"""
         logger.info("Начало загрузки конфигурационного файла")
+        config_data = self._read_config_data()
         try:
-            
-            key = get_env_variable()
-
-            config_text = decrypt_file(file_path=self.config_path, password=key)
-
-            config_data = yaml.safe_load(config_text)
- 
             # Загрузка конфигурации PassworkClient
             passwork_data = config_data.get('PassworkClient', {})
             self.passwork_client = PassworkClientConfig(
@@ -69,55 +303,175 @@ class Config:
                                         host=passwork_data.get('HOST', '')
                                         )
             
-            general_data = config_data.get('General', {})
-            self.general = GeneralConfig(
-                                api_key=general_data.get('ADIS_ACCESS_KEY')
-                                ) 
+            self.general = self._parse_general(config_data)
+
+            logging_data = config_data.get('Logging', {})
+            _update_section(self.logging, LoggingConfig(
+                                format=logging_data.get('FORMAT', 'text'),
+                                queue=logging_data.get('QUEUE', True),
+                                queue_size=logging_data.get('QUEUE_SIZE', 10000),
+                                sample_rate=logging_data.get('SAMPLE_RATE', 1.0),
+                                sampled_loggers=logging_data.get('SAMPLED_LOGGERS', ['api.routers.execute'])
+                                ))
+            setup_logging(log_format=self.logging.format,
+                          use_queue=self.logging.queue,
+                          queue_size=self.logging.queue_size,
+                          sample_rate=self.logging.sample_rate,
+                          sampled_loggers=self.logging.sampled_loggers)
+
+            pool_data = config_data.get('Pool', {})
+            _update_section(self.pool, PoolConfig(
+                            min_size=pool_data.get('MIN_SIZE', 1),
+                            max_size=pool_data.get('MAX_SIZE', 10),
+                            acquire_timeout=pool_data.get('ACQUIRE_TIMEOUT', 10.0),
+                            health_check_interval=pool_data.get('HEALTH_CHECK_INTERVAL', 30.0),
+                            max_idle_time=pool_data.get('MAX_IDLE_TIME', 300.0)
+                            ))
+
+            schema_data = config_data.get('SchemaCache', {})
+            _update_section(self.schema_cache, SchemaCacheConfig(
+                                    ttl=schema_data.get('TTL', 3600.0),
+                                    snapshot_dir=schema_data.get('SNAPSHOT_DIR', '')
+                                    ))
+
+            executor_data = config_data.get('Executor', {})
+            _update_section(self.executor, ExecutorConfig(
+                                max_workers=executor_data.get('MAX_WORKERS', 32),
+                                per_domain_limit=executor_data.get('PER_DOMAIN_LIMIT', 8),
+                                batch_concurrency=executor_data.get('BATCH_CONCURRENCY', 4),
+                                bulk_window=executor_data.get('BULK_WINDOW', 64),
+                                coalesce_reads=executor_data.get('COALESCE_READS', True)
+                                ))
+
+            cache_data = config_data.get('Cache', {})
+            _update_section(self.cache, CacheConfig(
+                            enabled=cache_data.get('ENABLED', False),
+                            ttl=cache_data.get('TTL', 30.0),
+                            max_entries=cache_data.get('MAX_ENTRIES', 1024),
+                            backend=cache_data.get('BACKEND', 'memory'),
+                            path=cache_data.get('PATH', 'cache')
+                            ))
+
+            response_data = config_data.get('Response', {})
+            _update_section(self.response, ResponseConfig(
+                                stream_threshold=response_data.get('STREAM_THRESHOLD', 5000),
+                                stream_chunk=response_data.get('STREAM_CHUNK', 1000),
+                                validate_max_entries=response_data.get('VALIDATE_MAX_ENTRIES', 100),
+                                compression=response_data.get('COMPRESSION', ['zstd', 'br', 'gzip']),
+                                compression_min_size=response_data.get('COMPRESSION_MIN_SIZE', 1024),
+                                compression_offload_size=response_data.get('COMPRESSION_OFFLOAD_SIZE', 65536),
+                                gzip_level=response_data.get('GZIP_LEVEL', 6),
+                                zstd_level=response_data.get('ZSTD_LEVEL', 3),
+                                brotli_quality=response_data.get('BROTLI_QUALITY', 4)
+                                ))
+
+            failover_data = config_data.get('Failover', {})
+            _update_section(self.failover, FailoverConfig(
+                                srv_file=failover_data.get('SRV_FILE', ''),
+                                probe_interval=failover_data.get('PROBE_INTERVAL', 15.0),
+                                probe_timeout=failover_data.get('PROBE_TIMEOUT', 3.0),
+                                connect_timeout=failover_data.get('CONNECT_TIMEOUT', 5.0),
+                                failure_threshold=failover_data.get('FAILURE_THRESHOLD', 3),
+                                open_timeout=failover_data.get('OPEN_TIMEOUT', 30.0),
+                                discovery_interval=failover_data.get('DISCOVERY_INTERVAL', 300.0)
+                                ))
+
+            health_data = config_data.get('Health', {})
+            _update_section(self.health, HealthConfig(
+                                interval=health_data.get('INTERVAL', 10.0),
+                                max_age=health_data.get('MAX_AGE', 60.0),
+                                ready_domains=health_data.get('READY_DOMAINS', 'all'),
+                                saturation_threshold=health_data.get('SATURATION_THRESHOLD', 0.9)
+                                ))
+
+            self._apply_worker_layout()
 
             # Загрузка списка серверов
-            servers_data = config_data.get('servers', [])
-            for server in servers_data:
-                
-                server_data = ServerConfig(
-                    name=server.get('name', ''),
-                    host=server.get('host', ''),
-                    port=server.get('port', 389),
-                    item_id=server.get('item_id', ''),
-                    enable_passwork=server.get('enable_passwork', ''),
-                    login=server.get('login', ''),
-                    password=server.get('password', '')
-                )
-                if server_data.enable_passwork == True:
-                    # TODO добавить обработку получения уч. данных с passwork
-                    pass
-                self.servers.append(server_data)
-                logger.info(f"Параметры домена {server_data.name}")
+            self._index = ServerIndex.build(self._parse_servers(config_data), self.general)
             logger.info("Конфигурационный файл загружен")
-        except FileNotFoundError:
-            logger.error(f"Конфигурационный файл не найден: {self.config_path}")
-            raise FileNotFoundError(f"Конфигурационный файл не найден: {self.config_path}")
-        except yaml.YAMLError as e:
-            logger.error(f"Ошибка парсинга YAML: {e}", exc_info=True)
-            raise ValueError(f"Ошибка парсинга YAML: {e}")
         except Exception as e:
             logger.error(f"Ошибка загрузки конфигурации: {e}", exc_info=True)
             raise ValueError(f"Ошибка загрузки конфигурации: {e}")
+
+    def _apply_worker_layout(self) -> None:
+        """
+        Настройки для запуска в нескольких воркерах (serve.py).
+        Лимиты соединений и интервал проверки контроллеров делятся между
+        воркерами, чтобы нагрузка на контроллеры домена не росла с числом
+        воркеров. Кэш чтения в памяти заменяется файловым, а снимки схемы
+        сохраняются в общем каталоге воркеров.
+        """
+        workers = shared_config.workers()
+        if workers == 1:
+            return
+        self.pool.max_size = max(1, -(-self.pool.max_size // workers))
+        self.pool.min_size = min(self.pool.max_size, -(-self.pool.min_size // workers))
+        self.executor.per_domain_limit = max(1, -(-self.executor.per_domain_limit // workers))
+        self.failover.probe_interval *= workers
+        runtime_dir = shared_config.runtime_dir()
+        if runtime_dir:
+            if self.cache.backend == 'memory':
+                self.cache.backend = 'file'
+                self.cache.path = os.path.join(runtime_dir, 'cache')
+            if not self.schema_cache.snapshot_dir:
+                self.schema_cache.snapshot_dir = os.path.join(runtime_dir, 'schema')
+        logger.info(f"Воркеров: {workers}; пул {self.pool.min_size}-{self.pool.max_size}, "
+                    f"лимит домена {self.executor.per_domain_limit}, кэш {self.cache.backend}")
+
+    def add_reload_listener(self, listener: Callable[[Set[str]], None]) -> None:
+        """Подписка на перезагрузку: listener получает адреса измененных доменов"""
+        self._reload_listeners.append(listener)
+
+    def reload(self) -> bool:
+        """
+        Перезагрузка списка доменов и ключей API без перезапуска сервиса.
+        Новый индекс подменяется одним присваиванием, поэтому запросы видят
+        либо прежнюю, либо новую конфигурацию целиком. Остальные разделы
+        (Pool, Executor, Cache и т.д.) применяются только при перезапуске.
+        При ошибке сохраняется прежняя конфигурация.
+        """
+        with self._reload_lock:
+            logger.info("Перезагрузка конфигурационного файла")
+            try:
+                config_data = self._read_config_data()
+                general = self._parse_general(config_data)
+                index = ServerIndex.build(self._parse_servers(config_data), general)
+            except Exception as e:
+                logger.error(f"Конфигурация не перезагружена, используется прежняя: {e}")
+                return False
+            changed = _changed_hosts(self._index.servers, index.servers)
+            self.general = general
+            self._index = index
+        logger.info(f"Конфигурация перезагружена, изменены домены: {', '.join(sorted(changed)) or 'нет'}")
+        for listener in self._reload_listeners:
+            try:
+                listener(changed)
+            except Exception as e:
+                logger.error(f"Ошибка обработки перезагрузки конфигурации: {e}", exc_info=True)
+        return True
     
-    def get_api_key_header(self) -> str:
-        return self.general.api_key         
+    def check_api_key(self, api_key: str) -> bool:
+        """Проверка ключа API по SHA-256 с постоянным временем сравнения"""
+        digest = api_key_digest(api_key)
+        valid = False
+        # Сравниваются все ключи, время не зависит от того, какой ключ совпал
+        for known in self._index.api_key_digests:
+            valid |= hmac.compare_digest(digest, known)
+        return valid
     
     def get_server_by_name(self, name: str) -> Optional[ServerConfig]:
         """Получить конфигурацию сервера по имени"""
-        for server in self.servers:
-            if server.name == name:
-                return server
-        return None
+        return self._index.by_name.get(name)
     
+    def has_server(self, host: str) -> bool:
+        """Домен с указанным адресом есть в конфигурации"""
+        return host in self._index.by_host
+
     def get_server_by_host(self, host: str) -> Optional[ServerConfig]:
         """Получить конфигурацию сервера по хосту"""
-        for server in self.servers:
-            if server.host == host:
-                return server
-        raise APIError(message=f'Не найдены учетные данные домена по адресу {host}',status_code=500)
+        server = self._index.by_host.get(host)
+        if server is None:
+            raise APIError(message=f'Не найдены учетные данные домена по адресу {host}',status_code=500)
+        return server
     
 Settings = Config(config_path="conf.yml.enc")
@@ -1,4 +1,3 @@
-import sys
 from cryptography.fernet import Fernet
 import base64
 import hashlib
@@ -19,8 +18,8 @@ def decrypt_file(file_path: str, password: str) -> str:
     try:
         decrypted_data = fernet.decrypt(encrypted_data)
     except Exception as e:
-        print("Ошибка при расшифровке. Проверьте правильность пароля или файла.")
-        sys.exit(1)
+        # Исключение вместо выхода: при перезагрузке сохраняется прежняя конфигурация
+        raise ValueError("Ошибка при расшифровке. Проверьте правильность пароля или файла.") from e
 
     return decrypted_data.decode('utf-8')
 
@@ -1,53 +1,221 @@
+import atexit
+import contextvars
+import json
 import logging
+import logging.handlers
+import queue
+import random
+import threading
+import zlib
 from pathlib import Path
 import os
 from datetime import datetime
+from typing import Iterable, Optional
+
+from configs.shared_config import workers
 
 LOG_DIR = 'logs'
 
-def setup_logging():
-    """Настройка логирования с ротацией по дням"""
-    
+# Идентификатор запроса, добавляется в записи журнала (см. api.middleware)
+request_id: contextvars.ContextVar[str] = contextvars.ContextVar("request_id", default="")
+
+# Сколько ждать места в очереди для записей WARNING и выше перед их отбрасыванием
+BLOCKING_PUT_TIMEOUT = 0.05
+
+_listener: Optional['LogListener'] = None
+_queue_handler: Optional['DropQueueHandler'] = None
+
+
+class RequestContextFilter(logging.Filter):
+    '''Добавление request_id в запись в потоке, где она создана'''
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    '''
+    Выборка записей INFO и ниже указанных логгеров с долей rate.
+    Решение принимается по request_id, поэтому записи одного запроса
+    сохраняются или отбрасываются вместе. WARNING и выше не отбрасываются.
+    '''
+
+    def __init__(self, rate: float, loggers: Iterable[str]):
+        super().__init__()
+        self.rate = rate
+        self.loggers = tuple(loggers)
+
+    def _sampled(self, name: str) -> bool:
+        return any(name == prefix or name.startswith(prefix + '.') for prefix in self.loggers)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.rate >= 1.0 or record.levelno > logging.INFO or not self._sampled(record.name):
+            return True
+        current = getattr(record, 'request_id', '')
+        if current:
+            return zlib.crc32(current.encode()) / 0xFFFFFFFF < self.rate
+        return random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    '''Запись журнала одной строкой JSON'''
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, 'request_id', ''):
+            data["request_id"] = record.request_id
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data["exc"] = record.exc_text
+        return json.dumps(data, ensure_ascii=False)
+
+
+class DropQueueHandler(logging.handlers.QueueHandler):
+    '''
+    Передача записей в ограниченную очередь фонового потока записи.
+    При переполнении записи ниже WARNING отбрасываются сразу, записи
+    WARNING и выше ждут место не дольше BLOCKING_PUT_TIMEOUT.
+    Количество отброшенных записей доступно в dropped.
+    '''
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Сообщение и трассировка форматируются в потоке вызова,
+        # форматтер (текст или JSON) применяется в потоке записи
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+            return
+        except queue.Full:
+            pass
+        if record.levelno >= logging.WARNING:
+            try:
+                self.queue.put(record, timeout=BLOCKING_PUT_TIMEOUT)
+                return
+            except queue.Full:
+                pass
+        with self._lock:
+            self.dropped += 1
+
+
+class LogListener(logging.handlers.QueueListener):
+    '''Фоновый поток записи; при остановке ждет место в заполненной очереди'''
+
+    def enqueue_sentinel(self) -> None:
+        self.queue.put(self._sentinel)
+
+
+def dropped_records() -> int:
+    '''Количество записей журнала, отброшенных из-за переполнения очереди'''
+    return _queue_handler.dropped if _queue_handler is not None else 0
+
+
+def _stop_listener() -> None:
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+def setup_logging(log_format: str = 'text',
+                  use_queue: bool = True,
+                  queue_size: int = 10000,
+                  sample_rate: float = 1.0,
+                  sampled_loggers: Iterable[str] = ('api.routers.execute',)):
+    """
+    Настройка логирования с ротацией по дням.
+    Запись в файл выполняется фоновым потоком QueueListener, вызов логгера
+    только помещает запись в очередь. Повторный вызов (после загрузки
+    раздела Logging конфигурации) перенастраивает журнал.
+    """
+    global _listener, _queue_handler
+
     # Создаем директорию для логов если ее нет
     log_dir = Path(LOG_DIR)
     log_dir.mkdir(exist_ok=True)
-    
+
     # Базовый логгер
     logger = logging.getLogger()
     logger.setLevel(logging.INFO)
-    
+
     if logger.handlers:
+        for handler in logger.handlers:
+            if handler is not _queue_handler:
+                handler.close()
         logger.handlers.clear()
+    # Оставшиеся в очереди записи дописываются прежним обработчиком
+    _stop_listener()
+    _queue_handler = None
 
     # Формат логов
-    log_format = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-    date_format = "%Y-%m-%d %H:%M:%S"    
-    formatter = logging.Formatter(log_format, date_format)
-   
+    log_format_string = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    date_format = "%Y-%m-%d %H:%M:%S"
+    if log_format == 'json':
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(log_format_string, date_format)
+
     file_handler = logging.handlers.TimedRotatingFileHandler(
-        filename=log_dir / "app.log",
+        # Воркеры serve.py пишут в отдельные файлы: ротация общего файла
+        # несколькими процессами невозможна в Windows
+        filename=log_dir / ("app.log" if workers() == 1 else f"app-{os.getpid()}.log"),
         when="midnight",  # Ротация в полночь
         interval=1,       # Каждый день
-        backupCount=3,    
+        backupCount=3,
         encoding="utf-8"
     )
     file_handler.setLevel(logging.INFO)
     file_handler.setFormatter(formatter)
     file_handler.suffix = "%Y-%m-%d"  # Суффикс для архивных файлов
     file_handler.extMatch = r"^\d{4}-\d{2}-\d{2}$"  # Регулярка для имен файлов
-        
+
+    filters = [RequestContextFilter(), SamplingFilter(sample_rate, sampled_loggers)]
+
     # Добавляем обработчики
-    logger.addHandler(file_handler)
+    if use_queue:
+        _queue_handler = DropQueueHandler(queue.Queue(maxsize=queue_size))
+        for log_filter in filters:
+            _queue_handler.addFilter(log_filter)
+        _listener = LogListener(_queue_handler.queue, file_handler, respect_handler_level=True)
+        _listener.start()
+        logger.addHandler(_queue_handler)
+    else:
+        for log_filter in filters:
+            file_handler.addFilter(log_filter)
+        logger.addHandler(file_handler)
     '''
     # Логирование от uvicorn (если нужно)
     uvicorn_logger = logging.getLogger("uvicorn")
     uvicorn_logger.handlers.clear()
     uvicorn_logger.addHandler(file_handler)
-    
+
     # Отключаем логирование от внешних библиотек если не нужно
     logging.getLogger("uvicorn.access").disabled = True
-    
+
     watchfiles_logger = logging.getLogger("watchfiles")
     watchfiles_logger.disabled = True
     '''
 
+
+atexit.register(_stop_listener)
@@ -0,0 +1,68 @@
+"""Перезагрузка конфигурации по сигналу SIGHUP или при изменении файла."""
+import logging
+import os
+import signal
+import threading
+from typing import Optional
+
+from configs.config import Config, Settings
+
+logger = logging.getLogger(__name__)
+
+
+class ConfigWatcher:
+    '''
+    Фоновый поток перезагрузки конфигурации. Поток просыпается по SIGHUP
+    (на Windows сигнала нет) или раз в RELOAD_INTERVAL секунд проверяет
+    время изменения файла. Сама перезагрузка выполняется в потоке,
+    а не в обработчике сигнала.
+    '''
+
+    def __init__(self, settings: Config):
+        self.settings = settings
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def request_reload(self) -> None:
+        self._wakeup.set()
+
+    def _file_changed(self) -> bool:
+        try:
+            return os.path.getmtime(self.settings.config_path) != self.settings.loaded_mtime
+        except OSError:
+            return False
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            interval = self.settings.general.reload_interval
+            signalled = self._wakeup.wait(interval if interval > 0 else None)
+            self._wakeup.clear()
+            if self._stop.is_set():
+                break
+            if signalled or self._file_changed():
+                self.settings.reload()
+
+    def _install_signal_handler(self) -> None:
+        sighup = getattr(signal, 'SIGHUP', None)
+        if sighup is None or threading.current_thread() is not threading.main_thread():
+            return
+        signal.signal(sighup, lambda signum, frame: self.request_reload())
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._install_signal_handler()
+        self._thread = threading.Thread(target=self._run, name="config-reload", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+config_watcher = ConfigWatcher(Settings)
@@ -0,0 +1,54 @@
+"""Передача расшифрованной конфигурации и параметров запуска воркерам через разделяемую память."""
+import os
+import struct
+from multiprocessing import shared_memory
+from typing import Optional, Tuple
+
+# Имя блока разделяемой памяти с расшифрованной конфигурацией
+SHARED_CONFIG_ENV = "ADIS_SHARED_CONFIG"
+# Количество воркеров, запущенных serve.py
+WORKERS_ENV = "ADIS_WORKERS"
+# Общий каталог воркеров: кэш чтения, снимки схемы, статистика
+RUNTIME_DIR_ENV = "ADIS_RUNTIME_DIR"
+
+# Заголовок блока: длина текста и время изменения файла конфигурации
+_HEADER = struct.Struct("<Qd")
+
+
+def publish_config(text: str, mtime: float) -> shared_memory.SharedMemory:
+    '''Размещение текста конфигурации в разделяемой памяти; блок живет, пока открыт у владельца'''
+    data = text.encode("utf-8")
+    block = shared_memory.SharedMemory(create=True, size=_HEADER.size + len(data))
+    _HEADER.pack_into(block.buf, 0, len(data), mtime)
+    block.buf[_HEADER.size:_HEADER.size + len(data)] = data
+    return block
+
+
+def read_shared_config() -> Optional[Tuple[str, float]]:
+    '''Текст конфигурации и время изменения файла, из которого она расшифрована'''
+    name = os.environ.get(SHARED_CONFIG_ENV)
+    if not name:
+        return None
+    try:
+        block = shared_memory.SharedMemory(name=name)
+    except (FileNotFoundError, OSError):
+        return None
+    # Воркеры uvicorn запускаются через multiprocessing spawn и используют
+    # resource_tracker процесса serve.py, блок удаляется только им
+    try:
+        length, mtime = _HEADER.unpack_from(block.buf, 0)
+        text = bytes(block.buf[_HEADER.size:_HEADER.size + length]).decode("utf-8")
+    finally:
+        block.close()
+    return text, mtime
+
+
+def workers() -> int:
+    try:
+        return max(1, int(os.environ.get(WORKERS_ENV, "1")))
+    except ValueError:
+        return 1
+
+
+def runtime_dir() -> str:
+    return os.environ.get(RUNTIME_DIR_ENV, "")
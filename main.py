@@ -5,11 +5,42 @@ from fastapi.exceptions import RequestValidationError
 from pydantic import ValidationError as PydanticValidationError
 import logging
 import uvicorn
-from api.routers import health, execute
+from contextlib import asynccontextmanager
+from api.routers import health, execute, schema, cache, metrics
+from api.middleware import RequestIdMiddleware, CompressionMiddleware
+from configs.config import Settings
+from services.connection_pool import close_all_pools
+from services.server_cache import server_cache
+from services.executor import ldap_executor
+from services.domain_controllers import dc_prober
+from configs.reload import config_watcher
+from services.worker_stats import worker_stats
+from services.warmup import warmup
+from services.health import health_monitor
 
 
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    """Жизненный цикл приложения."""
+    # Конфигурация расшифровывается при запуске, а не при импорте модулей
+    Settings.load()
+    server_cache.load_snapshots()
+    warmup.start()
+    health_monitor.start()
+    dc_prober.start()
+    config_watcher.start()
+    worker_stats.start()
+    yield
+    worker_stats.stop()
+    config_watcher.stop()
+    health_monitor.stop()
+    dc_prober.stop()
+    logger.info("Закрытие пулов LDAP соединений.")
+    ldap_executor.shutdown()
+    close_all_pools()
+
 def create_application() -> FastAPI:
     
     app = FastAPI(
@@ -17,7 +48,8 @@ def create_application() -> FastAPI:
         description="Сервис интегарции Active Directory",
         version="1.0.0",
         docs_url="/docs",
-        redoc_url="/redoc"
+        redoc_url="/redoc",
+        lifespan=lifespan
     )
  
          
@@ -63,9 +95,15 @@ def create_application() -> FastAPI:
             }
         )
 
+    app.add_middleware(CompressionMiddleware, config=Settings.response)
+    app.add_middleware(RequestIdMiddleware)
+
     # Регистрация роутеров
     app.include_router(health.router, tags=["health"])
     app.include_router(execute.router, tags=["execute"])
+    app.include_router(schema.router, tags=["schema"])
+    app.include_router(cache.router, tags=["cache"])
+    app.include_router(metrics.router, tags=["metrics"])
     return app
 
 app = create_application()
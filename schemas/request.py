@@ -1,13 +1,103 @@
+import base64
+import json
+import uuid
+from datetime import datetime
 from enum import Enum
 from typing import Dict, Any, Optional, List
-from pydantic import BaseModel, Field, field_validator, ConfigDict
+from pydantic import BaseModel, Field, field_validator, model_validator, ConfigDict
+
+def encode_continuation_cookie(offset: int) -> str:
+    """Непрозрачный cookie продолжения постраничного чтения."""
+    payload = json.dumps({"offset": offset}, separators=(",", ":")).encode("ascii")
+    return base64.urlsafe_b64encode(payload).decode("ascii")
+
+def decode_continuation_cookie(cookie: str) -> int:
+    """Разбор cookie продолжения, ValueError при некорректном значении."""
+    try:
+        payload = json.loads(base64.b64decode(cookie.encode("ascii"), altchars=b"-_", validate=True))
+        offset = payload["offset"]
+    except (ValueError, UnicodeEncodeError, TypeError, KeyError):
+        raise ValueError("Некорректный cookie продолжения")
+    if not isinstance(offset, int) or offset < 0:
+        raise ValueError("Некорректный cookie продолжения")
+    return offset
+
+def encode_watermark(watermark: dict) -> str:
+    """Непрозрачный watermark инкрементальной синхронизации."""
+    payload = json.dumps(watermark, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(payload).decode("ascii")
+
+def decode_watermark(watermark: str) -> dict:
+    """
+    Разбор watermark синхронизации, ValueError при некорректном значении.
+    Watermark прежнего формата (USN одного контроллера по dsServiceName)
+    приводится к пустому списку контроллеров: выполняется полная выгрузка.
+    """
+    try:
+        payload = json.loads(base64.b64decode(watermark.encode("ascii"), altchars=b"-_", validate=True))
+    except (ValueError, UnicodeEncodeError):
+        raise ValueError("Некорректный watermark синхронизации")
+    if not isinstance(payload, dict) or not isinstance(payload.get("ou"), str):
+        raise ValueError("Некорректный watermark синхронизации")
+    usns = payload.get("usn")
+    if isinstance(usns, int) and isinstance(payload.get("dc"), str):
+        return {"usn": {}, "ou": payload["ou"]}
+    if (not isinstance(usns, dict)
+            or not all(isinstance(key, str) and isinstance(value, int) for key, value in usns.items())):
+        raise ValueError("Некорректный watermark синхронизации")
+    return payload
 
 class APIMethod(str, Enum):
     """Доступные методы API."""
     GET_GROUPS_BY_OU = "get_groups_by_ou"
     GET_USERS_BY_GROUP = "get_users_by_group"
     CREATE_GROUP = "create_group"
+    CREATE_GROUPS = "create_groups"
     GET_USER_CERTIFICATES = "get_user_certificates"
+    GET_USERS_CERTIFICATES = "get_users_certificates"
+    SYNC_GROUPS = "sync_groups"
+    SYNC_USERS = "sync_users"
+
+class MembershipMode(str, Enum):
+    """Режимы чтения участников группы."""
+    DIRECT = "direct"
+    TRANSITIVE = "transitive"
+    MEMBER_RANGE = "member_range"
+
+class GroupAttribute(str, Enum):
+    """Атрибуты группы, доступные для выборки."""
+    CN = "cn"
+    DESCRIPTION = "description"
+    DISTINGUISHED_NAME = "distinguishedName"
+    OBJECT_GUID = "objectGUID"
+    SAM_ACCOUNT_NAME = "sAMAccountName"
+
+class UserAttribute(str, Enum):
+    """Атрибуты пользователя, доступные для выборки."""
+    SAM_ACCOUNT_NAME = "sAMAccountName"
+    CN = "cn"
+    MAIL = "mail"
+    DISTINGUISHED_NAME = "distinguishedName"
+    OBJECT_GUID = "objectGUID"
+    EMPLOYEE_NUMBER = "employeeNumber"
+    USER_PRINCIPAL_NAME = "userPrincipalName"
+    USER_ACCOUNT_CONTROL = "userAccountControl"
+
+class ResponseFormat(str, Enum):
+    """Формат списка объектов в ответе."""
+    ROWS = "rows"
+    COLUMNS = "columns"
+
+class SortAttribute(str, Enum):
+    """Атрибуты серверной сортировки списков."""
+    CN = "cn"
+    SAM_ACCOUNT_NAME = "sAMAccountName"
+    WHEN_CREATED = "whenCreated"
+    WHEN_CHANGED = "whenChanged"
+
+def unique_attributes(value: Optional[List[Enum]]) -> Optional[List[Enum]]:
+    """Удаление повторов атрибутов с сохранением порядка."""
+    return list(dict.fromkeys(value)) if value is not None else None
 
 class BaseRequest(BaseModel):
     """Базовая модель запроса для всех операций."""
@@ -21,6 +111,20 @@ class BaseRequest(BaseModel):
         description="Параметры для выполнения метода"
     )    
 
+class BatchRequest(BaseModel):
+    """
+    Пакетный запрос: список операций.
+    Операции одного домена выполняются в порядке списка: чтение видит
+    результат записей, указанных до него, и не видит указанные после.
+    """
+    model_config = ConfigDict(extra="forbid")
+
+    operations: List[BaseRequest] = Field(
+        min_length=1,
+        max_length=1000,
+        description="Операции для выполнения"
+    )
+
 class GetGroupsByOUParams(BaseModel):
     """Параметры для получения групп по OU."""
     model_config = ConfigDict(extra="forbid")
@@ -33,6 +137,74 @@ class GetGroupsByOUParams(BaseModel):
     domain: str = Field(
         description="Адрес домена"
     ) 
+    page_size: int = Field(
+        default=1000,
+        ge=1,
+        le=1000,
+        description="Размер страницы постраничного поиска"
+    )
+    cookie: Optional[str] = Field(
+        default=None,
+        max_length=4096,
+        description="Cookie продолжения из предыдущего потокового ответа. Поиск повторяется с начала "
+                    "с пропуском уже выданных групп; при изменении OU между запросами группы "
+                    "могут быть пропущены или повторены"
+    )
+    stream: bool = Field(
+        default=False,
+        description="Потоковый ответ NDJSON, по строке на страницу"
+    )
+    attributes: Optional[List[GroupAttribute]] = Field(
+        default=None,
+        min_length=1,
+        description="Возвращаемые атрибуты, по умолчанию все"
+    )
+    dn_only: bool = Field(
+        default=False,
+        description="Только DN групп, атрибуты с сервера не запрашиваются"
+    )
+    format: ResponseFormat = Field(
+        default=ResponseFormat.ROWS,
+        description="rows - список объектов; columns - {\"columns\": [атрибуты], \"rows\": [[значения], ...]}, "
+                    "имена атрибутов передаются один раз"
+    )
+    name_prefix: Optional[str] = Field(
+        default=None,
+        min_length=1,
+        max_length=256,
+        description="Начало cn или sAMAccountName группы"
+    )
+    modified_since: Optional[datetime] = Field(
+        default=None,
+        description="Только группы, измененные начиная с указанного момента (whenChanged), без часового пояса - UTC"
+    )
+    sort_by: Optional[SortAttribute] = Field(
+        default=None,
+        description="Атрибут серверной сортировки (RFC 2891)"
+    )
+    sort_descending: bool = Field(
+        default=False,
+        description="Сортировка по убыванию"
+    )
+
+    _unique_attributes = field_validator('attributes')(unique_attributes)
+
+    @model_validator(mode='after')
+    def validate_projection(self) -> 'GetGroupsByOUParams':
+        if self.dn_only and self.attributes is not None:
+            raise ValueError('Параметры attributes и dn_only несовместимы')
+        return self
+
+    @field_validator('cookie')
+    @classmethod
+    def validate_cookie(cls, value: Optional[str]) -> Optional[str]:
+        if value is not None:
+            decode_continuation_cookie(value)
+        return value
+
+    def offset(self) -> int:
+        """Смещение, с которого продолжается чтение."""
+        return decode_continuation_cookie(self.cookie) if self.cookie else 0
 
 class GetUsersByGroupParams(BaseModel):
     """Параметры для получения пользователей по группе."""
@@ -48,6 +220,59 @@ class GetUsersByGroupParams(BaseModel):
     
     domain: str = Field(description="Адрес домена")
 
+    membership: MembershipMode = Field(
+        default=MembershipMode.DIRECT,
+        description="direct - прямые участники, transitive - с учетом вложенных групп, "
+                    "member_range - DN участников из атрибута member группы"
+    )
+    attributes: Optional[List[UserAttribute]] = Field(
+        default=None,
+        min_length=1,
+        description="Возвращаемые атрибуты, по умолчанию все; не применяется в режиме member_range"
+    )
+    dn_only: bool = Field(
+        default=False,
+        description="Только DN пользователей, атрибуты с сервера не запрашиваются"
+    )
+    format: ResponseFormat = Field(
+        default=ResponseFormat.ROWS,
+        description="rows - список объектов; columns - {\"columns\": [атрибуты], \"rows\": [[значения], ...]}, "
+                    "имена атрибутов передаются один раз"
+    )
+    name_prefix: Optional[str] = Field(
+        default=None,
+        min_length=1,
+        max_length=256,
+        description="Начало cn или sAMAccountName пользователя"
+    )
+    modified_since: Optional[datetime] = Field(
+        default=None,
+        description="Только пользователи, измененные начиная с указанного момента (whenChanged), без часового пояса - UTC"
+    )
+    enabled_only: bool = Field(
+        default=False,
+        description="Только включенные учетные записи (без флага ACCOUNTDISABLE в userAccountControl)"
+    )
+    sort_by: Optional[SortAttribute] = Field(
+        default=None,
+        description="Атрибут серверной сортировки (RFC 2891)"
+    )
+    sort_descending: bool = Field(
+        default=False,
+        description="Сортировка по убыванию"
+    )
+
+    _unique_attributes = field_validator('attributes')(unique_attributes)
+
+    @model_validator(mode='after')
+    def validate_projection(self) -> 'GetUsersByGroupParams':
+        if self.dn_only and self.attributes is not None:
+            raise ValueError('Параметры attributes и dn_only несовместимы')
+        if self.membership == MembershipMode.MEMBER_RANGE and (
+                self.name_prefix or self.modified_since or self.enabled_only or self.sort_by):
+            raise ValueError('Фильтры и сортировка не применяются в режиме member_range')
+        return self
+
 class CreateGroupParams(BaseModel):
     """Параметры для создания группы."""
     model_config = ConfigDict(extra="forbid")
@@ -71,6 +296,43 @@ class CreateGroupParams(BaseModel):
     
     domain: str = Field(description="Адрес домена")
 
+class GroupSpec(BaseModel):
+    """Группа для пакетного создания."""
+    model_config = ConfigDict(extra="forbid")
+
+    cn: str = Field(
+        min_length=1,
+        max_length=64,
+        description="CN группы"
+    )
+    description: Optional[str] = Field(
+        default=None,
+        max_length=1024,
+        description="Описание группы"
+    )
+
+class CreateGroupsParams(BaseModel):
+    """Параметры для пакетного создания групп."""
+    model_config = ConfigDict(extra="forbid")
+
+    groups: List[GroupSpec] = Field(
+        min_length=1,
+        max_length=5000,
+        description="Создаваемые группы"
+    )
+    if_missing: bool = Field(
+        default=False,
+        description="Не считать ошибкой уже существующую группу"
+    )
+
+    ou_dn: str = Field(
+        min_length=3,
+        max_length=2000,
+        description="DN организационного подразделения"
+        )
+    
+    domain: str = Field(description="Адрес домена")
+
 class GetUserCertificatesParams(BaseModel):
     """Параметры для получения сертификатов пользователя."""
     model_config = ConfigDict(extra="forbid")
@@ -82,4 +344,78 @@ class GetUserCertificatesParams(BaseModel):
         max_length=2000,
         description="DN организационного подразделения"
         )
-    domain: str = Field(description="Адрес домена")               
\ No newline at end of file
+    domain: str = Field(description="Адрес домена")
+
+class GetUsersCertificatesParams(BaseModel):
+    """Параметры для получения сертификатов множества пользователей."""
+    model_config = ConfigDict(extra="forbid")
+
+    user_guids: List[str] = Field(
+        default_factory=list,
+        description="GUID пользователей"
+    )
+    sam_account_names: List[str] = Field(
+        default_factory=list,
+        description="sAMAccountName пользователей"
+    )
+    with_metadata: bool = Field(
+        default=False,
+        description="Добавить subject, issuer, срок действия и отпечаток сертификатов"
+    )
+
+    ou_dn: str = Field(
+        min_length=3,
+        max_length=2000,
+        description="DN организационного подразделения"
+        )
+    domain: str = Field(description="Адрес домена")
+
+    @field_validator('user_guids')
+    @classmethod
+    def validate_guids(cls, value: List[str]) -> List[str]:
+        for guid in value:
+            try:
+                uuid.UUID(guid)
+            except ValueError:
+                raise ValueError(f'Некорректный GUID {guid}')
+        return value
+
+    @model_validator(mode='after')
+    def validate_count(self) -> 'GetUsersCertificatesParams':
+        count = len(self.user_guids) + len(self.sam_account_names)
+        if count == 0:
+            raise ValueError('Не указаны пользователи')
+        if count > 5000:
+            raise ValueError('Не более 5000 пользователей в одном запросе')
+        return self
+
+class SyncParams(BaseModel):
+    """
+    Параметры инкрементальной синхронизации групп или пользователей OU.
+    Инкрементальная синхронизация не сообщает об объектах, перемещенных
+    из OU; чтобы их удалить, периодически выполняйте полную выгрузку без watermark.
+    """
+    model_config = ConfigDict(extra="forbid")
+
+    ou_dn: str = Field(
+        min_length=3,
+        max_length=2000,
+        description="DN организационного подразделения"
+        )
+    domain: str = Field(description="Адрес домена")
+    watermark: Optional[str] = Field(
+        default=None,
+        max_length=4096,
+        description="Watermark из предыдущего ответа, без него выполняется полная выгрузка"
+    )
+
+    @field_validator('watermark')
+    @classmethod
+    def validate_watermark(cls, value: Optional[str]) -> Optional[str]:
+        if value is not None:
+            decode_watermark(value)
+        return value
+
+    def decoded_watermark(self) -> Optional[dict]:
+        """Состояние предыдущей синхронизации."""
+        return decode_watermark(self.watermark) if self.watermark else None
@@ -1,13 +1,32 @@
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from datetime import datetime
-from typing import List, Optional
+from typing import Dict, List, Optional, Type
 
 class HealthResponse(BaseModel):
     """Ответ для health"""
     status: str
     timestamp: datetime
     version: str
+    startup: Optional[dict] = Field(default=None, description="Подготовка соединений с доменами при запуске")
+
+class ReadinessResponse(BaseModel):
+    """Ответ для health/ready"""
+    status: str = Field(description="starting, stale, unhealthy, degraded или healthy")
+    timestamp: Optional[datetime] = Field(default=None, description="Время проверки доменов")
+    age: Optional[float] = Field(default=None, description="Возраст результатов проверки, сек")
+    domains: Dict[str, bool] = Field(default_factory=dict, description="Готовность доменов")
+
+class DeepHealthResponse(BaseModel):
+    """Ответ для health/deep"""
+    status: str = Field(description="starting, stale, unhealthy, degraded или healthy")
+    timestamp: Optional[datetime] = Field(default=None, description="Время проверки доменов")
+    age: Optional[float] = Field(default=None, description="Возраст результатов проверки, сек")
+    version: str
+    startup: dict = Field(description="Подготовка соединений с доменами при запуске")
+    domains: Dict[str, dict] = Field(
+        default_factory=dict,
+        description="По доменам: контроллеры, bind, последняя успешная операция и занятость пула")
 
 class BaseResponse(BaseModel):
     """Базовая модель ответа."""
@@ -15,43 +34,121 @@ class BaseResponse(BaseModel):
     errorText: Optional[str] = Field(default=None)
 
 class GroupInfo(BaseModel):
-    """Информации о группе."""
-    cn: str = Field(description="CN группы")
-    sAMAccountName: str = Field(description="Имя учетной записи SAM")
-    objectGUID: str = Field(description="GUID объекта в AD")
-    distinguishedName: str = Field(description="DN")    
+    """Информации о группе; атрибуты, отсутствующие у группы или не запрошенные, не выдаются."""
+    model_config = ConfigDict(extra="forbid")
+
+    cn: Optional[str] = Field(default=None, description="CN группы")
+    description: Optional[str] = Field(default=None, description="Описание группы")
+    sAMAccountName: Optional[str] = Field(default=None, description="Имя учетной записи SAM")
+    objectGUID: Optional[str] = Field(default=None, description="GUID объекта в AD")
+    distinguishedName: Optional[str] = Field(default=None, description="DN")
 
 class GetGroupsResponse(BaseModel):
     """Ответ для получения групп."""
     groups: List[GroupInfo]
 
 class UserInfo(BaseModel):
-    """Модель информации о пользователе."""
-    objectGUID: str
-    sAMAccountName: str
-    userPrincipalName: str
-    userAccountControl: int
-    mail: str
-    distinguishedName: str
-    employeeNumber: str
+    """Модель информации о пользователе; отсутствующие атрибуты - None, не запрошенные не выдаются."""
+    model_config = ConfigDict(extra="forbid")
+
+    objectGUID: Optional[str] = None
+    sAMAccountName: Optional[str] = None
+    cn: Optional[str] = None
+    userPrincipalName: Optional[str] = None
+    userAccountControl: Optional[int] = None
+    mail: Optional[str] = None
+    distinguishedName: Optional[str] = None
+    employeeNumber: Optional[str] = None
 
 class GetUsersResponse(BaseModel):
     """Ответ для получения пользователей."""
     users: List[UserInfo]
 
 class CertificateInfo(BaseModel):
-    """Модель информации о сертификате."""
+    """Модель информации о сертификате; разобранные поля - только с with_metadata."""
+    model_config = ConfigDict(extra="forbid")
+
     certificate_data: str = Field(description="Данные сертификата в base64")
+    subject: Optional[str] = None
+    issuer: Optional[str] = None
+    serial_number: Optional[str] = None
+    not_before: Optional[str] = None
+    not_after: Optional[str] = None
+    thumbprint: Optional[str] = None
+    parse_error: Optional[str] = Field(default=None, description="Ошибка разбора сертификата")
 
 class GetCertificatesResponse(BaseModel):
     """Ответ для получения сертификатов."""
     certificates: List[CertificateInfo]
 
+class GetUsersCertificatesResult(BaseModel):
+    """Сертификаты пользователей по переданным GUID и sAMAccountName."""
+    certificates: Dict[str, List[CertificateInfo]]
+    not_found: List[str]
+
+class GetUsersCertificatesResponse(BaseModel):
+    """Ответ для получения сертификатов нескольких пользователей."""
+    users_certificates: GetUsersCertificatesResult
+
 class CreateGroupInfo(BaseModel):
     """Информации о созданной группе."""
-    cn: str = Field(description="CN группы")
-    distinguishedName: str = Field(description="DN")
+    model_config = ConfigDict(extra="forbid")
+
+    group_dn: str = Field(description="DN")
 
 class CreateGroupResponse(BaseModel):
     """Ответ для создания группы."""
-    group: List[CreateGroupInfo]     
\ No newline at end of file
+    create_group: List[CreateGroupInfo]
+
+class CreateGroupsItem(BaseModel):
+    """Результат создания одной группы из пакета."""
+    model_config = ConfigDict(extra="forbid")
+
+    cn: str = Field(description="CN группы")
+    group_dn: Optional[str] = Field(default=None, description="DN")
+    status: str = Field(description="created, exists, error или unknown - запрос отправлен, "
+                                    "но ответ не получен из-за ошибки соединения, группа могла быть создана")
+    errorText: Optional[str] = None
+
+class CreateGroupsResponse(BaseModel):
+    """Ответ для создания нескольких групп."""
+    create_groups: List[CreateGroupsItem]
+
+class DeletedObjectInfo(BaseModel):
+    """Удаленный объект OU."""
+    model_config = ConfigDict(extra="forbid")
+
+    objectGUID: str
+    lastKnownParent: str
+
+class SyncResult(BaseModel):
+    """
+    Изменения OU с предыдущей синхронизации; заполнен groups или users.
+    Объекты, перемещенные из OU, при инкрементальной синхронизации не
+    возвращаются ни в изменениях, ни в deleted: их удаляет только
+    периодическая полная выгрузка (запрос без watermark).
+    """
+    model_config = ConfigDict(extra="forbid")
+
+    groups: Optional[List[GroupInfo]] = None
+    users: Optional[List[UserInfo]] = None
+    deleted: List[DeletedObjectInfo] = Field(
+        description="Объекты, удаленные из OU; перемещенные в другое OU сюда не попадают")
+    full_sync: bool = Field(
+        description="Полная выгрузка: список заменяет ранее полученный, в том числе перемещенные из OU объекты")
+    watermark: str
+
+class SyncResponse(BaseModel):
+    """Ответ для инкрементальной синхронизации."""
+    sync: SyncResult
+
+# Модели проверки результата по ключу data ответа
+RESULT_MODELS: Dict[str, Type[BaseModel]] = {
+    'groups': GetGroupsResponse,
+    'users': GetUsersResponse,
+    'certificates': GetCertificatesResponse,
+    'users_certificates': GetUsersCertificatesResponse,
+    'create_group': CreateGroupResponse,
+    'create_groups': CreateGroupsResponse,
+    'sync': SyncResponse,
+}
@@ -0,0 +1,102 @@
+"""
+Запуск сервиса в нескольких воркерах uvicorn.
+
+Конфигурация расшифровывается один раз в этом процессе и передается
+воркерам через разделяемую память. Схема и Root DSE доменов читаются
+с контроллеров домена один раз до запуска воркеров (--preload) и
+сохраняются снимками в общем каталоге, откуда их загружают воркеры.
+Кэш чтения воркеров общий (файловый, в Linux в /dev/shm), пулы
+соединений и лимиты домена делятся между воркерами.
+
+Параметры берутся из аргументов или раздела Server конфигурации:
+WORKERS, HOST, PORT, PRELOAD.
+
+    python serve.py --workers 4
+"""
+import argparse
+import logging
+import os
+import shutil
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import uvicorn
+import yaml
+
+from configs.crypt import decrypt_file
+from configs.env import get_env_variable
+from configs.logging_config import setup_logging
+from configs import shared_config
+
+CONFIG_PATH = "conf.yml.enc"
+
+logger = logging.getLogger(__name__)
+
+
+def _runtime_dir() -> str:
+    '''Общий каталог воркеров; в Linux в памяти (tmpfs /dev/shm)'''
+    base = "/dev/shm" if os.path.isdir("/dev/shm") else None
+    return tempfile.mkdtemp(prefix="ad-service-", dir=base)
+
+
+def preload_schema() -> None:
+    '''Чтение схемы всех доменов до запуска воркеров, снимки сохраняются в общий каталог'''
+    from configs.config import Settings
+    from services.server_cache import server_cache
+
+    Settings.load()
+
+    def load(server_config) -> None:
+        try:
+            server_cache.get_server(server_config)
+        except Exception as e:
+            logger.warning(f"Схема домена {server_config.host} не загружена заранее: {e}")
+
+    with ThreadPoolExecutor(max_workers=8, thread_name_prefix="preload") as executor:
+        list(executor.map(load, Settings.servers))
+    logger.info(f"Схема загружена заранее для {len(Settings.servers)} доменов")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--host")
+    parser.add_argument("--port", type=int)
+    parser.add_argument("--preload", action=argparse.BooleanOptionalAction, default=None,
+                        help="Загрузить схему доменов до запуска воркеров")
+    args = parser.parse_args()
+    setup_logging()
+
+    try:
+        mtime = os.path.getmtime(CONFIG_PATH)
+        config_text = decrypt_file(file_path=CONFIG_PATH, password=get_env_variable())
+        server_data = (yaml.safe_load(config_text) or {}).get('Server', {})
+    except (OSError, ValueError, yaml.YAMLError) as e:
+        print(f"Ошибка загрузки конфигурации: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    workers = args.workers or server_data.get('WORKERS', 1)
+    host = args.host or server_data.get('HOST', '0.0.0.0')
+    port = args.port or server_data.get('PORT', 8000)
+    preload = args.preload if args.preload is not None else server_data.get('PRELOAD', True)
+
+    runtime_dir = _runtime_dir()
+    block = shared_config.publish_config(config_text, mtime)
+    del config_text
+    os.environ[shared_config.SHARED_CONFIG_ENV] = block.name
+    os.environ[shared_config.WORKERS_ENV] = str(workers)
+    os.environ[shared_config.RUNTIME_DIR_ENV] = runtime_dir
+    try:
+        if preload:
+            preload_schema()
+        logger.info(f"Запуск сервиса: воркеров {workers}, {host}:{port}")
+        uvicorn.run("main:app", host=host, port=port, workers=workers, reload=False, log_level="info")
+    finally:
+        block.close()
+        block.unlink()
+        shutil.rmtree(runtime_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,225 @@
-from typing import Union
-from ldap3 import Server, Connection, ALL, SUBTREE, BASE
-from ldap3.core.exceptions import LDAPException, LDAPBindError
-from configs.config import Settings
+from typing import Any, Union, Callable, Iterator, Optional
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from ldap3 import Connection, SUBTREE, BASE, NO_ATTRIBUTES
+from ldap3.core.exceptions import LDAPException, LDAPBindError, LDAPCommunicationError
+from ldap3.core.results import RESULT_SUCCESS, RESULT_ENTRY_ALREADY_EXISTS
+from ldap3.protocol.microsoft import show_deleted_control
+from ldap3.protocol.controls import build_control
+from ldap3.protocol.rfc4511 import AttributeDescription, MatchingRuleId
+from pyasn1.type.univ import Sequence, SequenceOf, Boolean
+from pyasn1.type.namedtype import NamedTypes, NamedType, OptionalNamedType, DefaultedNamedType
+from pyasn1.type.tag import Tag, tagClassContext, tagFormatSimple
+from ldap3.utils.conv import escape_filter_chars, escape_bytes
+from cryptography import x509
+from ldap3.utils.dn import escape_rdn
+from ldap3.utils.repr import to_stdout_encoding
+from collections import deque
+from services.connection_pool import get_pool, create_async_connection
+from services.cache import read_cache, make_key, normalize_dn
+from services import metrics
+from api.errors import APIError
 import base64
+import time
+import hashlib
+import uuid
+
+# OID контрола постраничного поиска (RFC 2696)
+PAGED_RESULTS_CONTROL = '1.2.840.113556.1.4.319'
+# Правило LDAP_MATCHING_RULE_IN_CHAIN для транзитивного членства
+MATCHING_RULE_IN_CHAIN = '1.2.840.113556.1.4.1941'
+# Правило LDAP_MATCHING_RULE_BIT_AND для проверки флагов userAccountControl
+MATCHING_RULE_BIT_AND = '1.2.840.113556.1.4.803'
+# Флаг ACCOUNTDISABLE в userAccountControl
+ACCOUNT_DISABLE = 2
+# OID контрола серверной сортировки (RFC 2891)
+SERVER_SORT_CONTROL = '1.2.840.113556.1.4.473'
+# Максимальное число условий в одном OR-фильтре при пакетном чтении сертификатов
+CERTIFICATE_CHUNK_SIZE = 100
+# MaxPageSize контроллера домена AD по умолчанию
+PAGE_SIZE = 1000
+
+GROUP_ATTRIBUTES = ['cn', 'description', 'distinguishedName', 'objectGUID', 'sAMAccountName']
+
+USER_ATTRIBUTES = ['sAMAccountName', 
+                   'cn', 
+                   'mail', 
+                   'distinguishedName', 
+                   'objectGUID', 
+                   'employeeNumber',
+                   'userPrincipalName',
+                   'userAccountControl'
+                   ]
+
+def guid_filter_value(guid: Union[str, bytes]) -> str:
+    '''
+    Значение objectGUID для LDAP фильтра: GUID в строковом виде
+    ({...} или без скобок) преобразуется в экранированные байты little-endian
+    '''
+    if isinstance(guid, bytes):
+        return escape_bytes(guid)
+    try:
+        return escape_bytes(uuid.UUID(guid).bytes_le)
+    except ValueError:
+        return escape_filter_chars(guid)
+
+def certificate_metadata(cert_bin: bytes) -> dict:
+    '''Разбор DER сертификата: subject, issuer, срок действия, отпечаток SHA-1'''
+    try:
+        cert = x509.load_der_x509_certificate(cert_bin)
+    except ValueError as e:
+        return {'parse_error': str(e)}
+    return {
+        'subject': cert.subject.rfc4514_string(),
+        'issuer': cert.issuer.rfc4514_string(),
+        'serial_number': format(cert.serial_number, 'X'),
+        'not_before': cert.not_valid_before_utc.isoformat(),
+        'not_after': cert.not_valid_after_utc.isoformat(),
+        'thumbprint': hashlib.sha1(cert_bin).hexdigest().upper()
+    }
+
+class SortKey(Sequence):
+    # SortKey ::= SEQUENCE {
+    #    attributeType   AttributeDescription,
+    #    orderingRule    [0] MatchingRuleId OPTIONAL,
+    #    reverseOrder    [1] BOOLEAN DEFAULT FALSE }
+    componentType = NamedTypes(
+        NamedType('attributeType', AttributeDescription()),
+        OptionalNamedType('orderingRule',
+                          MatchingRuleId().subtype(implicitTag=Tag(tagClassContext, tagFormatSimple, 0))),
+        DefaultedNamedType('reverseOrder',
+                           Boolean(False).subtype(implicitTag=Tag(tagClassContext, tagFormatSimple, 1)))
+    )
+
+
+class SortKeyList(SequenceOf):
+    # SortKeyList ::= SEQUENCE OF SortKey
+    componentType = SortKey()
+
+
+def server_sort_control(attribute: str, reverse: bool = False, criticality: bool = True):
+    '''
+    Контрол серверной сортировки по одному атрибуту (AD поддерживает один ключ).
+    По умолчанию критичный: если контроллер не может отсортировать результат,
+    поиск завершается ошибкой, а не возвращает несортированные записи.
+    '''
+    sort_key = SortKey()
+    sort_key['attributeType'] = attribute
+    if reverse:
+        sort_key['reverseOrder'] = True
+    sort_keys = SortKeyList()
+    sort_keys.setComponentByPosition(0, sort_key)
+    return build_control(SERVER_SORT_CONTROL, criticality, sort_keys)
+
+
+def generalized_time(moment: datetime) -> str:
+    '''Значение GeneralizedTime для фильтра, время без часового пояса считается UTC'''
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(timezone.utc).strftime('%Y%m%d%H%M%S.0Z')
+
+
+@dataclass(frozen=True)
+class SearchOptions:
+    '''Фильтры и сортировка списков групп и пользователей, выполняемые контроллером домена'''
+    name_prefix: Optional[str] = None
+    modified_since: Optional[datetime] = None
+    enabled_only: bool = False
+    sort_by: Optional[str] = None
+    sort_descending: bool = False
+
+    def search_filter(self, *conditions: str) -> str:
+        '''Фильтр из условий объекта и параметров выборки'''
+        conditions = list(conditions)
+        if self.name_prefix:
+            prefix = escape_filter_chars(self.name_prefix)
+            conditions.append(f'(|(cn={prefix}*)(sAMAccountName={prefix}*))')
+        if self.modified_since:
+            conditions.append(f'(whenChanged>={generalized_time(self.modified_since)})')
+        if self.enabled_only:
+            conditions.append(f'(!(userAccountControl:{MATCHING_RULE_BIT_AND}:={ACCOUNT_DISABLE}))')
+        return conditions[0] if len(conditions) == 1 else f"(&{''.join(conditions)})"
+
+    def controls(self) -> Optional[list]:
+        if not self.sort_by:
+            return None
+        return [server_sort_control(self.sort_by, self.sort_descending)]
+
+    def cache_variant(self) -> str:
+        '''Параметры выборки для ключа кэша'''
+        if self == NO_OPTIONS:
+            return ''
+        modified_since = generalized_time(self.modified_since) if self.modified_since else ''
+        return (f"{self.name_prefix or ''}|{modified_since}|{int(self.enabled_only)}|"
+                f"{self.sort_by or ''}|{int(self.sort_descending)}")
+
+
+NO_OPTIONS = SearchOptions()
+
+_MISSING = object()
+
+
+def _string_value(value: Any) -> str:
+    '''Значение атрибута строкой, как str(Attribute) в ldap3'''
+    if isinstance(value, list):
+        return to_stdout_encoding(value[0] if len(value) == 1 else value)
+    return to_stdout_encoding(value)
+
+
+def _plain_value(value: Any) -> Any:
+    '''Значение атрибута как Attribute.value в ldap3: одно значение, список или None'''
+    if isinstance(value, list):
+        if not value:
+            return None
+        return value[0] if len(value) == 1 else value
+    return value
+
+
+def compile_converter(attributes: list, convert: Callable[[Any], Any],
+                      missing: Any = _MISSING) -> Callable[[dict], dict]:
+    '''
+    Функция преобразования записи ответа (connection.response) в словарь атрибутов
+    Параметры:
+        attributes (list): Атрибуты в порядке выдачи
+        convert (Callable): Преобразование значения атрибута
+        missing: Значение отсутствующего атрибута; по умолчанию атрибут не выдается
+    '''
+    converters = tuple((name, convert) for name in attributes)
+
+    def converter(entry: dict) -> dict:
+        result = {}
+        get = entry['attributes'].get
+        for name, convert_value in converters:
+            value = get(name, _MISSING)
+            if value is not _MISSING:
+                result[name] = convert_value(value)
+            elif missing is not _MISSING:
+                result[name] = missing
+        return result
+
+    return converter
+
+
+def group_converter(attributes: list) -> Callable[[dict], dict]:
+    '''Преобразование записи группы: значения строками, отсутствующие атрибуты не выдаются'''
+    return compile_converter(attributes, _string_value)
+
+
+def user_converter(attributes: list) -> Callable[[dict], dict]:
+    '''Преобразование записи пользователя: значения как есть, отсутствующие - None'''
+    return compile_converter(attributes, _plain_value, missing=None)
+
+
+def dn_converter(entry: dict) -> dict:
+    '''Преобразование записи, запрошенной без атрибутов: только DN'''
+    return {'distinguishedName': entry['dn']}
+
+
+def search_entries(response: Optional[list]) -> list:
+    '''Записи searchResEntry из connection.response без построения объектов Entry'''
+    return [item for item in response or () if item['type'] == 'searchResEntry']
+
 
 class ADManager:
     '''Класс для управления Active Directory через LDAP'''
@@ -23,30 +240,10 @@ class ADManager:
         self.password = password
         self.base_ou = base_ou
         self.connection = None
+        # Последняя перехваченная ошибка LDAP: методы возвращают (False, текст),
+        # а по ошибке связи соединение не должно вернуться в пул
+        self.error: Optional[LDAPException] = None
 
-    def connect(self) -> tuple [bool, str]:
-    
-        '''Установка соединения с сервером AD'''
-        
-        try:
-            # Создаем сервер
-            server = Server(self.server_address, get_info=ALL)
-            
-            # Устанавливаем соединение
-            self.connection = Connection(
-                server,
-                user=self.username,
-                password=self.password,
-                auto_bind=True
-            )
-            return True, ''    
-        except LDAPBindError as e:
-            err = f"Ошибка аутентификации: {e}"
-            return False, err
-        except LDAPException as e:
-            err = f"Ошибка подключения к LDAP: {e}"
-            return False, err
-        
     def disconnect(self):
         '''Закрытие соединения с AD'''
 
@@ -54,130 +251,342 @@ class ADManager:
             self.connection.unbind()
             self.connection = None
         
-    def read_groups(self) -> tuple[bool, Union[list, str]]:
-        '''Чтение групп из указанного OU'''
+    def _search_error(self) -> Optional[str]:
+        '''
+        Текст ошибки последнего поиска или None.
+        last_error соединения ldap3 не сбрасывается успешным поиском, поэтому
+        на переиспользуемых соединениях проверяется код результата.
+        '''
+        result = self.connection.result or {}
+        if result.get('result', RESULT_SUCCESS) == RESULT_SUCCESS:
+            return None
+        return result.get('description') or self.connection.last_error
+
+    def _unsupported_options(self, options: SearchOptions) -> Optional[str]:
+        '''Текст ошибки, если контроллер не поддерживает запрошенную сортировку'''
+        info = self.connection.server.info
+        if not options.sort_by or info is None:
+            return None
+        if any(control[0] == SERVER_SORT_CONTROL for control in info.supported_controls or []):
+            return None
+        return 'Контроллер домена не поддерживает серверную сортировку (RFC 2891)'
+
+    def _search(self, **kwargs) -> Any:
+        '''Поиск с замером фазы search и учетом кода результата'''
+        with metrics.phase('search', self.server_address):
+            result = self.connection.search(**kwargs)
+        if self.connection.strategy.sync:
+            metrics.record_ldap_result(self.server_address, self.connection.result)
+        return result
+
+    def iter_group_pages(self, page_size: int = PAGE_SIZE, offset: int = 0,
+                         attributes: Optional[list] = None, dn_only: bool = False,
+                         options: SearchOptions = NO_OPTIONS
+                         ) -> Iterator[tuple[bool, Union[list, str], Optional[int]]]:
+        '''
+        Постраничное чтение групп из указанного OU (RFC 2696)
+        Параметры:
+            page_size (int): Размер страницы, не больше MaxPageSize контроллера
+            offset (int): Количество групп, уже полученных клиентом (продолжение чтения)
+            attributes (list, optional): Запрашиваемые атрибуты, по умолчанию GROUP_ATTRIBUTES
+            dn_only (bool): Запрос без атрибутов (1.1), возвращаются только DN
+            options (SearchOptions): Фильтры и серверная сортировка
+        Возвращает кортежи (успех, группы страницы или ошибка, смещение следующей страницы).
+        Cookie RFC 2696 в AD действителен только в рамках соединения, поэтому
+        продолжение после разрыва выполняется по смещению: уже выданные
+        страницы запрашиваются повторно, но не преобразуются.
+        '''
         
         if not self.connection:
-            return False, 'Нет подключения к AD'
+            yield False, 'Нет подключения к AD', None
+            return
 
-        attributes = ['cn', 'description', 'distinguishedName', 'objectGUID', 'sAMAccountName']
+        attributes = attributes or GROUP_ATTRIBUTES
+        if dn_only:
+            attributes, convert = [NO_ATTRIBUTES], dn_converter
+        else:
+            convert = group_converter(attributes)
             
         search_base = self.base_ou
         
         if not search_base:
-           return False, 'Не указан OU для поиска'
+            yield False, 'Не указан OU для поиска', None
+            return
         
+        unsupported = self._unsupported_options(options)
+        if unsupported:
+            yield False, unsupported, None
+            return
+
         # Фильтр для поиска групп
-        search_filter = '(objectClass=group)'
+        search_filter = options.search_filter('(objectClass=group)')
+        controls = options.controls()
         
-        try:
-            self.connection.search(
-                search_base=search_base,
-                search_filter=search_filter,
-                search_scope=SUBTREE,
-                attributes=attributes
-            )
-            
-            groups = []
-            
-            if not self.connection.entries and self.connection.last_error:
-                return False, self.connection.last_error
-
-            for entry in self.connection.entries:
-                group_data = {}
-                for attr in attributes:
-                    if hasattr(entry, attr):
-                        value = getattr(entry, attr)
-                        # Преобразуем объект атрибута в удобный формат
-                        if isinstance(value, list):
-                            group_data[attr] = [str(v) for v in value]
-                        else:
-                            group_data[attr] = str(value)
-                groups.append(group_data)
-            
-            return True, groups
-            
-        except LDAPException as e:
-            err = f"Ошибка при чтении групп: {e}"
-            return False, err 
+        cookie = None
+        position = 0
+        while True:
+            try:
+                self._search(
+                    search_base=search_base,
+                    search_filter=search_filter,
+                    search_scope=SUBTREE,
+                    attributes=attributes,
+                    paged_size=page_size,
+                    paged_cookie=cookie,
+                    controls=controls
+                )
+            except LDAPException as e:
+                self.error = e
+                yield False, f"Ошибка при чтении групп: {e}", None
+                return
+
+            entries = search_entries(self.connection.response)
+            if not entries and self._search_error():
+                yield False, self._search_error(), None
+                return
+
+            cookie = (self.connection.result.get('controls', {})
+                      .get(PAGED_RESULTS_CONTROL, {})
+                      .get('value', {})
+                      .get('cookie')) or None
 
-    def read_group_users(self, group_dn: str) -> tuple[bool, Union[list, str]]:
+            skip = max(0, offset - position)
+            position += len(entries)
+            if skip < len(entries) or not cookie:
+                with metrics.phase('convert', self.server_address):
+                    groups = [convert(entry) for entry in entries[skip:]]
+                yield True, groups, position if cookie else None
+            if not cookie:
+                return
+
+    def read_groups(self, page_size: int = PAGE_SIZE, offset: int = 0,
+                    attributes: Optional[list] = None, dn_only: bool = False,
+                    options: SearchOptions = NO_OPTIONS) -> tuple[bool, Union[list, str]]:
+        '''Чтение всех групп из указанного OU постраничным поиском'''
+        
+        groups = []
+        for result, page, _ in self.iter_group_pages(page_size, offset, attributes, dn_only, options):
+            if not result:
+                return False, page
+            groups.extend(page)
+        
+        return True, groups
+
+    def read_group_users(self, group_dn: str, membership: str = 'direct',
+                         attributes: Optional[list] = None, dn_only: bool = False,
+                         options: SearchOptions = NO_OPTIONS) -> tuple[bool, Union[list, str]]:
         '''
         Чтение пользователей группы по DN группы  
         Параметры:
             group_dn (str): Distinguished Name группы
+            membership (str): Режим чтения участников
+                direct - прямые участники-пользователи (memberOf)
+                transitive - участники с учетом вложенных групп (LDAP_MATCHING_RULE_IN_CHAIN)
+                member_range - DN всех участников из атрибута member группы;
+                               диапазоны member;range=... дочитываются ldap3 (auto_range)
+            attributes (list, optional): Запрашиваемые атрибуты, по умолчанию USER_ATTRIBUTES
+            dn_only (bool): Запрос без атрибутов (1.1), возвращаются только DN
+            options (SearchOptions): Фильтры и серверная сортировка (кроме member_range)
         '''
 
         if not self.connection:
             return False, 'Нет подключения к AD'
+
+        unsupported = self._unsupported_options(options)
+        if unsupported:
+            return False, unsupported
         
-        attributes = ['sAMAccountName', 
-                      'cn', 
-                      'mail', 
-                      'distinguishedName', 
-                      'objectGUID', 
-                      'employeeNumber',
-                      'userPrincipalName',
-                      'userAccountControl'
-                      ]
+        attributes = attributes or USER_ATTRIBUTES
+        if dn_only:
+            attributes, convert = [NO_ATTRIBUTES], dn_converter
+        else:
+            convert = user_converter(attributes)
+        not_found = f"Группа с DN '{group_dn}' не найдена"
         
         try:
-            # Проверяем существование группы по DN
-            self.connection.search(
-                search_base=group_dn,
-                search_filter='(objectClass=group)',
-                search_scope=BASE,
-                attributes=['objectClass']  # Минимальные атрибуты для проверки
-            )
-            
-            if not self.connection.entries:
-                err = f"Группа с DN '{group_dn}' не найдена"
-                return False, err
-            
+            if membership == 'member_range':
+                # Один поиск BASE по группе одновременно проверяет ее существование
+                self._search(
+                    search_base=group_dn,
+                    search_filter='(objectClass=group)',
+                    search_scope=BASE,
+                    attributes=['member']
+                )
+                if not self.connection.entries:
+                    return False, not_found
+                group_entry = self.connection.entries[0]
+                members = group_entry['member'].values if 'member' in group_entry else []
+                return True, [{'distinguishedName': str(member)} for member in members]
+
             # Получаем всех членов группы 
-            search_filter = f'(&(objectClass=user)(memberOf={group_dn}))'
+            rule = f':{MATCHING_RULE_IN_CHAIN}:' if membership == 'transitive' else ''
+            search_filter = options.search_filter('(objectClass=user)', 
+                                                  f'(memberOf{rule}={escape_filter_chars(group_dn)})')
                     
-            # Выполняем поиск
-            self.connection.search(
-                        search_base=self.base_ou,
-                        search_filter=search_filter,
-                        search_scope='SUBTREE',
-                        attributes=attributes
-                    )
+            # Выполняем постраничный поиск
+            entries = self._search_all(self.base_ou, search_filter, attributes, options.controls())
+
+            if not entries:
+                # Существование группы проверяем только при пустом результате
+                self._search(
+                    search_base=group_dn,
+                    search_filter='(objectClass=group)',
+                    search_scope=BASE,
+                    attributes=[NO_ATTRIBUTES]  # Для проверки существования атрибуты не нужны
+                )
+                if not self.connection.entries:
+                    return False, not_found
+
             # Собираем результаты
-            users = []
-            for entry in self.connection.entries:
-                user_data = {}
-                for attr in attributes:
-                    if attr in entry:
-                        user_data[attr] = entry[attr].value
-                    else:
-                        user_data[attr] = None
-                users.append(user_data)
+            with metrics.phase('convert', self.server_address):
+                users = [convert(entry) for entry in entries]
             
             return True, users
             
         except LDAPException as e:
+            self.error = e
             err = f"Ошибка при чтении пользователей группы: {e}"
             return False, err
 
-    def create_group(self, group_name: str, description: str = "", 
-                    group_scope: str = "GLOBAL", group_type: str = "SECURITY") -> tuple[bool, Union[list, str]]:
+    def _read_usn_state(self) -> dict:
         '''
-        Создание группы в Active Directory
+        Чтение текущего highestCommittedUSN контроллера из Root DSE и
+        invocationId базы контроллера (объект NTDS Settings из dsServiceName)
+        '''
+        self._search(
+            search_base='',
+            search_filter='(objectClass=*)',
+            search_scope=BASE,
+            attributes=['highestCommittedUSN', 'dsServiceName', 'defaultNamingContext']
+        )
+        if not self.connection.entries:
+            raise LDAPException(f"Не удалось прочитать Root DSE: {self._search_error()}")
+        root_dse = self.connection.entries[0]
+        state = {
+            'usn': int(root_dse['highestCommittedUSN'].value),
+            'dc': str(root_dse['dsServiceName'].value),
+            'naming_context': str(root_dse['defaultNamingContext'].value)
+        }
+        self._search(
+            search_base=state['dc'],
+            search_filter='(objectClass=*)',
+            search_scope=BASE,
+            attributes=['invocationId']
+        )
+        if not self.connection.entries or not self.connection.entries[0]['invocationId'].raw_values:
+            raise LDAPException(f"Не удалось прочитать invocationId контроллера: {self._search_error()}")
+        invocation_id = self.connection.entries[0]['invocationId'].raw_values[0]
+        state['invocation_id'] = str(uuid.UUID(bytes_le=invocation_id))
+        return state
+
+    def _search_all(self, search_base: str, search_filter: str, 
+                    attributes: list, controls: Optional[list] = None) -> list:
+        '''Постраничный поиск всех записей, возвращает записи searchResEntry ответа'''
+        entries = []
+        cookie = None
+        while True:
+            self._search(
+                search_base=search_base,
+                search_filter=search_filter,
+                search_scope=SUBTREE,
+                attributes=attributes,
+                paged_size=PAGE_SIZE,
+                paged_cookie=cookie,
+                controls=controls
+            )
+            page = search_entries(self.connection.response)
+            if not page and self._search_error():
+                raise LDAPException(self._search_error())
+            entries.extend(page)
+            cookie = (self.connection.result.get('controls', {})
+                      .get(PAGED_RESULTS_CONTROL, {})
+                      .get('value', {})
+                      .get('cookie'))
+            if not cookie:
+                return entries
+
+    def sync_objects(self, object_type: str, 
+                     watermark: Optional[dict] = None) -> tuple[bool, Union[dict, str]]:
+        '''
+        Инкрементальная синхронизация групп или пользователей OU по uSNChanged
         Параметры:
-            group_name (str): Имя группы
-            description (str): Описание группы
-            group_scope (str): Область группы (GLOBAL, DOMAIN_LOCAL, UNIVERSAL)
-            group_type (str): Тип группы (SECURITY, DISTRIBUTION)
+            object_type (str): 'groups' или 'users'
+            watermark (dict, optional): Состояние предыдущей синхронизации
+                                        {'usn': {invocationId: USN}, 'ou': OU}
+        USN у каждого контроллера свой, а соединения пула распределяются между
+        контроллерами домена, поэтому watermark хранит последний USN каждого
+        контроллера, на котором выполнялась синхронизация. Изменения читаются
+        от USN текущего контроллера; без watermark, для другого OU и на
+        контроллере, которого нет в watermark (в том числе после восстановления
+        базы, когда меняется invocationId), выполняется полная выгрузка. Удаленные объекты ищутся среди tombstone
+        (контрол Show Deleted) по lastKnownParent. Объекты, перемещенные из OU,
+        в удаленные не попадают: без состояния по каждому объекту их не отличить
+        от объектов, всегда бывших вне OU; их удаляет полная выгрузка.
         '''
         if not self.connection:
             return False, 'Нет подключения к AD'
-        
-        ou = self.base_ou
+
+        if not self.base_ou:
+            return False, 'Не указан OU для поиска'
+
+        object_filter, attributes, make_converter = {
+            'groups': ('(objectClass=group)', GROUP_ATTRIBUTES, group_converter),
+            'users': ('(objectClass=user)', USER_ATTRIBUTES, user_converter)
+        }[object_type]
+
+        base_ou = normalize_dn(self.base_ou)
+
+        try:
+            state = self._read_usn_state()
+            usns = dict(watermark['usn']) if watermark is not None and watermark.get('ou') == base_ou else {}
+            since = usns.get(state['invocation_id'])
+            full_sync = since is None
+
+            if full_sync:
+                search_filter = object_filter
+            else:
+                search_filter = f"(&{object_filter}(uSNChanged>={since + 1}))"
+
+            entries = self._search_all(self.base_ou, search_filter, attributes)
+            with metrics.phase('convert', self.server_address):
+                convert = make_converter(attributes)
+                changed = [convert(entry) for entry in entries]
+
+            deleted = []
+            if not full_sync:
+                tombstones = self._search_all(
+                    state['naming_context'],
+                    f"(&{object_filter}(isDeleted=TRUE)(uSNChanged>={since + 1}))",
+                    ['objectGUID', 'lastKnownParent'],
+                    controls=[show_deleted_control(criticality=True)]
+                )
+                tombstone = user_converter(['objectGUID', 'lastKnownParent'])
+                for entry in tombstones:
+                    item = tombstone(entry)
+                    parent_dn = item['lastKnownParent']
+                    parent = normalize_dn(str(parent_dn)) if parent_dn is not None else ''
+                    if parent == base_ou or parent.endswith(',' + base_ou):
+                        deleted.append({'objectGUID': str(item['objectGUID']),
+                                        'lastKnownParent': str(parent_dn)})
+
+            return True, {
+                object_type: changed,
+                'deleted': deleted,
+                'full_sync': full_sync,
+                'watermark': {'usn': dict(usns, **{state['invocation_id']: state['usn']}), 'ou': base_ou}
+            }
+
+        except LDAPException as e:
+            self.error = e
+            err = f"Ошибка при синхронизации: {e}"
+            return False, err
+
+    def _group_entry(self, group_name: str, description: Optional[str] = "", 
+                     group_scope: str = "GLOBAL", group_type: str = "SECURITY") -> tuple[str, dict]:
+        '''DN и атрибуты новой группы'''
         
         # Формируем DN новой группы
-        group_dn = f"CN={group_name},{ou}"
+        group_dn = f"CN={escape_rdn(group_name)},{self.base_ou}"
         
         # Преобразуем параметры в числовые флаги
         scope_flags = {
@@ -198,13 +607,34 @@ class ADManager:
             'objectClass': ['top', 'group'],
             'cn': group_name,
             'sAMAccountName': group_name,
-            'groupType': group_type_value,
-            'description': description
+            'groupType': group_type_value
         }
+        # AD не принимает пустое значение атрибута
+        if description:
+            attributes['description'] = description
+        
+        return group_dn, attributes
+
+    def create_group(self, group_name: str, description: str = "", 
+                    group_scope: str = "GLOBAL", group_type: str = "SECURITY") -> tuple[bool, Union[list, str]]:
+        '''
+        Создание группы в Active Directory
+        Параметры:
+            group_name (str): Имя группы
+            description (str): Описание группы
+            group_scope (str): Область группы (GLOBAL, DOMAIN_LOCAL, UNIVERSAL)
+            group_type (str): Тип группы (SECURITY, DISTRIBUTION)
+        '''
+        if not self.connection:
+            return False, 'Нет подключения к AD'
+        
+        group_dn, attributes = self._group_entry(group_name, description, group_scope, group_type)
         
         try:
             # Создаем группу
-            result = self.connection.add(group_dn, attributes=attributes)
+            with metrics.phase('add', self.server_address):
+                result = self.connection.add(group_dn, attributes=attributes)
+            metrics.record_ldap_result(self.server_address, self.connection.result)
             
             if result:
                 response = {
@@ -216,9 +646,91 @@ class ADManager:
                 return False, err 
                 
         except LDAPException as e:
+            self.error = e
             err = f"Ошибка при создании группы: {e}"
             return False, err
 
+    def create_groups(self, groups: list[dict], if_missing: bool = False, 
+                      window: int = 64) -> tuple[bool, Union[list, str]]:
+        '''
+        Пакетное создание групп в одном OU
+        Параметры:
+            groups (list): Группы вида {'cn': ..., 'description': ...}
+            if_missing (bool): Существующая группа (entryAlreadyExists) не считается ошибкой
+            window (int): Максимальное число отправленных add без ответа
+        На соединении со стратегией ASYNC запросы add отправляются конвейером:
+        следующий запрос уходит, не дожидаясь ответа на предыдущий, пока число
+        ожидающих ответа не достигнет window. На синхронном соединении группы
+        создаются последовательно.
+        Возвращает результат по каждой группе в исходном порядке. При ошибке
+        соединения группы, запрос на создание которых отправлен, но ответ не
+        получен, возвращаются со статусом unknown: они могли быть созданы.
+        '''
+        if not self.connection:
+            return False, 'Нет подключения к AD'
+
+        results: list = [None] * len(groups)
+
+        def complete(index: int, group_dn: str, result: dict) -> None:
+            metrics.record_ldap_result(self.server_address, result)
+            code = result.get('result')
+            if code == RESULT_SUCCESS:
+                status, error = 'created', None
+            elif code == RESULT_ENTRY_ALREADY_EXISTS and if_missing:
+                status, error = 'exists', None
+            else:
+                status, error = 'error', f"Ошибка при создании группы: {result.get('description')} {result.get('message', '')}".strip()
+            results[index] = {'cn': groups[index]['cn'], 'group_dn': group_dn, 
+                              'status': status, 'errorText': error}
+
+        pending: deque = deque()
+        # Группа синхронного add, ответ на который еще не получен
+        sending: Optional[tuple[int, str]] = None
+        try:
+            for index, group in enumerate(groups):
+                group_dn, attributes = self._group_entry(group['cn'], group.get('description'))
+                if self.connection.strategy.sync:
+                    sending = (index, group_dn)
+                    with metrics.phase('add', self.server_address):
+                        self.connection.add(group_dn, attributes=attributes)
+                    sending = None
+                    complete(index, group_dn, self.connection.result)
+                    continue
+                if len(pending) >= window:
+                    # Группа остается в pending, пока ответ не получен
+                    done_index, done_dn, message_id = pending[0]
+                    _, result = self.connection.get_response(message_id)
+                    pending.popleft()
+                    complete(done_index, done_dn, result)
+                pending.append((index, group_dn, self.connection.add(group_dn, attributes=attributes)))
+            while pending:
+                done_index, done_dn, message_id = pending[0]
+                _, result = self.connection.get_response(message_id)
+                pending.popleft()
+                complete(done_index, done_dn, result)
+        except LDAPException as e:
+            self.error = e
+            unanswered = {index: group_dn for index, group_dn, _ in pending}
+            if sending is not None and isinstance(e, LDAPCommunicationError):
+                unanswered[sending[0]] = sending[1]
+            for index, group in enumerate(groups):
+                if results[index] is not None:
+                    continue
+                if index in unanswered:
+                    results[index] = {'cn': group['cn'], 'group_dn': unanswered[index], 'status': 'unknown',
+                                      'errorText': f"Результат создания группы неизвестен: {e}"}
+                else:
+                    results[index] = {'cn': group['cn'], 'group_dn': None,
+                                      'status': 'error', 'errorText': f"Ошибка при создании группы: {e}"}
+            if pending and not self.connection.closed:
+                # Ответы на отправленные запросы не получены, соединение не используется повторно
+                try:
+                    self.connection.unbind()
+                except LDAPException:
+                    pass
+
+        return True, results
+
     def read_user_certificates(self, user_object_id: str) -> tuple[bool, Union[list, str]]:
         '''
         Чтение сертификатов пользователя по objectGUID        
@@ -231,12 +743,9 @@ class ADManager:
         attributes = ['userCertificate']
 
         try:
-            if isinstance(user_object_id, bytes):
-                user_filter = f'(objectGUID={user_object_id.hex()})'
-            else:
-                user_filter = f'(objectGUID={user_object_id})'
+            user_filter = f'(objectGUID={guid_filter_value(user_object_id)})'
             
-            self.connection.search(
+            self._search(
                 search_base=self.base_ou,
                 search_filter=user_filter,
                 search_scope=SUBTREE,
@@ -263,68 +772,346 @@ class ADManager:
             return True, certificates
             
         except LDAPException as e:
+            self.error = e
             err = f"Ошибка при чтении сертификатов: {e}"
             return False, err                 
 
-# TODO Написать  методы для работы с AD для вызова из вне
-        
-def read_groups(server: str, base_ou:str) -> tuple[bool, Union[list, str]]:
-        
-    server_data = Settings.get_server_by_host(server)
+    def read_certificates_bulk(self, user_guids: list[str], sam_account_names: list[str],
+                               with_metadata: bool = False, chunk_size: int = CERTIFICATE_CHUNK_SIZE,
+                               window: int = 64) -> tuple[bool, Union[dict, str]]:
+        '''
+        Чтение сертификатов множества пользователей
+        Параметры:
+            user_guids (list): objectGUID пользователей
+            sam_account_names (list): sAMAccountName пользователей
+            with_metadata (bool): Добавить разобранные subject, issuer, notAfter, отпечаток
+            chunk_size (int): Максимальное число условий в одном OR-фильтре
+            window (int): Максимальное число одновременно ожидающих ответа поисков
+        Идентификаторы объединяются в OR-фильтры по chunk_size. На соединении
+        ASYNC поиски по частям отправляются конвейером, на синхронном - по очереди.
+        Возвращает {'certificates': {идентификатор: [сертификаты]}, 'not_found': [...]}
+        '''
+        if not self.connection:
+            return False, 'Нет подключения к AD'
 
-    ADConnect = ADManager(server=server, 
-                       user=server_data.login,
-                       password=server_data.password,
-                       base_ou=base_ou)
-    
-    ADConnect.connect()
+        attributes = ['objectGUID', 'sAMAccountName', 'userCertificate']
 
-    return ADConnect.read_groups()
-    
-def read_user_certificates(server: str, base_ou:str, user_object_id: str) -> tuple[bool, Union[list, str]]:
-    
-    server_data = Settings.get_server_by_host(server)
+        # Условие фильтра -> идентификатор в ответе
+        conditions = [(f'(objectGUID={guid_filter_value(guid)})', guid) for guid in user_guids]
+        conditions += [(f'(sAMAccountName={escape_filter_chars(name)})', name) for name in sam_account_names]
+        chunks = [conditions[i:i + chunk_size] for i in range(0, len(conditions), chunk_size)]
+
+        guid_keys = {str(uuid.UUID(guid)): guid for guid in user_guids}
+        name_keys = {name.lower(): name for name in sam_account_names}
+        certificates: dict = {}
+
+        def collect(response: list) -> None:
+            for item in response:
+                if item.get('type') != 'searchResEntry':
+                    continue
+                raw = item['raw_attributes']
+                certs = [self._certificate_to_dict(cert, with_metadata) for cert in raw.get('userCertificate', [])]
+                if raw.get('objectGUID'):
+                    guid = str(uuid.UUID(bytes_le=bytes(raw['objectGUID'][0])))
+                    if guid in guid_keys:
+                        certificates[guid_keys[guid]] = certs
+                if raw.get('sAMAccountName'):
+                    name = bytes(raw['sAMAccountName'][0]).decode('utf-8').lower()
+                    if name in name_keys:
+                        certificates[name_keys[name]] = certs
+
+        def search(chunk: list) -> Any:
+            return self._search(
+                search_base=self.base_ou,
+                search_filter=f"(|{''.join(condition for condition, _ in chunk)})",
+                search_scope=SUBTREE,
+                attributes=attributes
+            )
+
+        try:
+            if self.connection.strategy.sync:
+                for chunk in chunks:
+                    search(chunk)
+                    if self._search_error():
+                        return False, f"Ошибка при чтении сертификатов: {self._search_error()}"
+                    collect(self.connection.response or [])
+            else:
+                pending: deque = deque()
+                for chunk in chunks:
+                    if len(pending) >= window:
+                        collect(self._async_search_response(pending.popleft()))
+                    pending.append(search(chunk))
+                while pending:
+                    collect(self._async_search_response(pending.popleft()))
+        except LDAPException as e:
+            self.error = e
+            err = f"Ошибка при чтении сертификатов: {e}"
+            return False, err
+
+        not_found = [key for _, key in conditions if key not in certificates]
+        return True, {'certificates': certificates, 'not_found': not_found}
+
+    def _async_search_response(self, message_id: int) -> list:
+        with metrics.phase('search', self.server_address):
+            response, result = self.connection.get_response(message_id)
+        metrics.record_ldap_result(self.server_address, result)
+        if result.get('result') != RESULT_SUCCESS:
+            raise LDAPException(result.get('description'))
+        return response
 
-    ADConnect = ADManager(server=server, 
-                       user=server_data.login,
-                       password=server_data.password,
+    def _certificate_to_dict(self, cert_bin: bytes, with_metadata: bool) -> dict:
+        '''Сертификат в base64 и, при необходимости, его разобранные поля'''
+        certificate = {'certificate_data': base64.b64encode(cert_bin).decode('ascii')}
+        if with_metadata:
+            certificate.update(certificate_metadata(cert_bin))
+        return certificate
+
+# Операции для вызова из роутеров: выполняются на соединении из пула домена
+
+@contextmanager
+def pooled_manager(server: str, base_ou: str, 
+                   connection: Optional[Connection] = None) -> Iterator[ADManager]:
+    '''
+    ADManager с соединением из пула домена, соединение возвращается в пул при выходе.
+    Если передано уже полученное из пула соединение (пакетное выполнение), используется оно.
+    '''
+    pool = get_pool(server)
+    ADConnect = ADManager(server=server,
+                       user=pool.server_config.login,
+                       password=pool.server_config.password,
                        base_ou=base_ou)
-    
-    ADConnect.connect()
+    if connection is not None:
+        ADConnect.connection = connection
+        yield ADConnect
+        return
+    with pool.connection() as pooled_connection:
+        ADConnect.connection = pooled_connection
+        yield ADConnect
 
-    return ADConnect.read_user_certificates(user_object_id)
+@contextmanager
+def borrow_connection(server: str) -> Iterator[Connection]:
+    '''Соединение из пула домена для выполнения нескольких операций подряд'''
+    with get_pool(server).connection() as connection:
+        yield connection
+
+def _check_connection(server: str, ADConnect: ADManager, success: bool, duration: float) -> None:
+    '''
+    Результат операции для пула: успешная операция учитывается в состоянии
+    домена, соединение после ошибки связи, перехваченной методом ADManager,
+    не возвращается в пул
+    '''
+    # Метод может вернуть частичный результат после ошибки (create_groups)
+    if success and ADConnect.error is None:
+        get_pool(server).record_success(ADConnect.connection, duration)
+    if isinstance(ADConnect.error, LDAPCommunicationError):
+        get_pool(server).mark_broken(ADConnect.connection, ADConnect.error)
+    elif ADConnect.connection.closed:
+        get_pool(server).mark_broken(ADConnect.connection,
+                                     LDAPCommunicationError(ADConnect.error or 'соединение закрыто'))
+
+def _execute(server: str, base_ou: str, 
+             operation: Callable[[ADManager], tuple[bool, Union[list, str]]],
+             connection: Optional[Connection] = None
+             ) -> tuple[bool, Union[list, str]]:
+    '''Выполнение операции на соединении из пула'''
+    try:
+        with pooled_manager(server, base_ou, connection) as ADConnect:
+            started = time.perf_counter()
+            result = operation(ADConnect)
+            _check_connection(server, ADConnect, result[0], time.perf_counter() - started)
+            return result
+    except LDAPBindError as e:
+        metrics.record_exception(server, e)
+        return False, f"Ошибка аутентификации: {e}"
+    except LDAPException as e:
+        metrics.record_exception(server, e)
+        return False, f"Ошибка подключения к LDAP: {e}"
+        
+def _projection(attributes: Optional[list], default: list, dn_only: bool) -> tuple[str, ...]:
+    '''Запрашиваемые атрибуты для ключа кэша'''
+    return (NO_ATTRIBUTES, ) if dn_only else tuple(attributes or default)
 
-def read_group_users(server: str, base_ou:str, group_dn: str) -> tuple[bool, Union[list, str]]:
+def read_groups(server: str, 
+                base_ou:str, 
+                page_size: int = PAGE_SIZE, 
+                offset: int = 0,
+                attributes: Optional[list] = None,
+                dn_only: bool = False,
+                options: SearchOptions = NO_OPTIONS,
+                connection: Optional[Connection] = None) -> tuple[bool, Union[list, str]]:
+        
+    def load() -> tuple[bool, Union[list, str]]:
+        return _execute(server, base_ou, 
+                        lambda ADConnect: ADConnect.read_groups(page_size, offset, attributes, 
+                                                                dn_only, options),
+                        connection)
+
+    # Кэшируется только полный список, продолжение по смещению читается из AD
+    if offset:
+        return load()
+    key = make_key('groups', server, base_ou, attributes=_projection(attributes, GROUP_ATTRIBUTES, dn_only),
+                   variant=options.cache_variant())
+    return read_cache.get_or_load(key, load)
+
+def iter_group_pages(server: str, 
+                     base_ou: str, 
+                     page_size: int = PAGE_SIZE, 
+                     offset: int = 0,
+                     attributes: Optional[list] = None,
+                     dn_only: bool = False,
+                     options: SearchOptions = NO_OPTIONS
+                     ) -> Iterator[tuple[bool, Union[list, str], Optional[int]]]:
+    '''Постраничное чтение групп, соединение удерживается до закрытия генератора'''
+    try:
+        with pooled_manager(server, base_ou) as ADConnect:
+            pages = ADConnect.iter_group_pages(page_size, offset, attributes, dn_only, options)
+            # Время отправки страниц клиенту в длительность операции не входит
+            duration = 0.0
+            success = True
+            while True:
+                started = time.perf_counter()
+                page = next(pages, None)
+                duration += time.perf_counter() - started
+                if page is None:
+                    break
+                success = success and page[0]
+                yield page
+            _check_connection(server, ADConnect, success, duration)
+    except LDAPBindError as e:
+        yield False, f"Ошибка аутентификации: {e}", None
+    except LDAPException as e:
+        yield False, f"Ошибка подключения к LDAP: {e}", None
     
-    server_data = Settings.get_server_by_host(server)
+def read_user_certificates(server: str, 
+                           base_ou:str, 
+                           user_object_id: str,
+                           connection: Optional[Connection] = None) -> tuple[bool, Union[list, str]]:
+    
+    return _execute(server, base_ou, 
+                    lambda ADConnect: ADConnect.read_user_certificates(user_object_id),
+                    connection)
 
-    ADConnect = ADManager(server=server, 
-                       user=server_data.login,
-                       password=server_data.password,
-                       base_ou=base_ou)
+def read_group_users(server: str, 
+                     base_ou:str, 
+                     group_dn: str,
+                     membership: str = 'direct',
+                     attributes: Optional[list] = None,
+                     dn_only: bool = False,
+                     options: SearchOptions = NO_OPTIONS,
+                     connection: Optional[Connection] = None) -> tuple[bool, Union[list, str]]:
     
-    ADConnect.connect()
+    key = make_key(f'users:{membership}', server, base_ou, group_dn,
+                   _projection(attributes, USER_ATTRIBUTES, dn_only), options.cache_variant())
+    return read_cache.get_or_load(
+                    key,
+                    lambda: _execute(server, base_ou, 
+                                     lambda ADConnect: ADConnect.read_group_users(group_dn, membership,
+                                                                                  attributes, dn_only,
+                                                                                  options),
+                                     connection))
 
-    return ADConnect.read_group_users(group_dn)
+def sync_objects(server: str, 
+                 base_ou: str, 
+                 object_type: str, 
+                 watermark: Optional[dict] = None,
+                 connection: Optional[Connection] = None) -> tuple[bool, Union[dict, str]]:
+    
+    return _execute(server, base_ou, 
+                    lambda ADConnect: ADConnect.sync_objects(object_type, watermark),
+                    connection)
 
 def create_group(server: str,
                  base_ou:str, 
                  group_name: str, 
                  description: str = "", 
                  group_scope: str = "GLOBAL", 
-                 group_type: str = "SECURITY"
+                 group_type: str = "SECURITY",
+                 connection: Optional[Connection] = None
                  ) -> tuple[bool, Union[list, str]]:
     
-    server_data = Settings.get_server_by_host(server)
+    result, details = _execute(server, base_ou, 
+                               lambda ADConnect: ADConnect.create_group(group_name,
+                                                                        description,
+                                                                        group_scope,
+                                                                        group_type),
+                               connection)
+    if result:
+        # Новая группа должна появиться в списках групп своего OU и вышестоящих
+        read_cache.invalidate_ou(server, details[0]['group_dn'])
+    return result, details
 
-    ADConnect = ADManager(server=server, 
-                       user=server_data.login,
-                       password=server_data.password,
-                       base_ou=base_ou)
+def _execute_async(server: str, base_ou: str, 
+                   operation: Callable[[ADManager], tuple[bool, Any]],
+                   connection: Optional[Connection] = None) -> tuple[bool, Any]:
+    '''
+    Выполнение конвейерной операции. Без переданного соединения открывается
+    отдельное соединение со стратегией ASYNC и закрывается по завершении.
+    '''
+    if connection is not None:
+        return _execute(server, base_ou, operation, connection)
+    try:
+        async_connection = create_async_connection(server)
+    except LDAPBindError as e:
+        return False, f"Ошибка аутентификации: {e}"
+    except LDAPException as e:
+        return False, f"Ошибка подключения к LDAP: {e}"
+    try:
+        return _execute(server, base_ou, operation, async_connection)
+    finally:
+        try:
+            async_connection.unbind()
+        except LDAPException:
+            pass
+
+def create_groups(server: str, 
+                  base_ou: str, 
+                  groups: list[dict], 
+                  if_missing: bool = False,
+                  window: int = 64,
+                  connection: Optional[Connection] = None) -> tuple[bool, Union[list, str]]:
+    
+    result, details = _execute_async(server, base_ou, 
+                                     lambda ADConnect: ADConnect.create_groups(groups, if_missing, window),
+                                     connection)
+    if result and any(item['status'] in ('created', 'unknown') for item in details):
+        read_cache.invalidate_ou(server, base_ou)
+    return result, details
+
+def read_certificates_bulk(server: str,
+                           base_ou: str,
+                           user_guids: list[str],
+                           sam_account_names: list[str],
+                           with_metadata: bool = False,
+                           window: int = 64,
+                           connection: Optional[Connection] = None) -> tuple[bool, Union[dict, str]]:
     
-    ADConnect.connect()
+    return _execute_async(server, base_ou, 
+                          lambda ADConnect: ADConnect.read_certificates_bulk(user_guids, 
+                                                                             sam_account_names,
+                                                                             with_metadata,
+                                                                             window=window),
+                          connection)
 
-    return ADConnect.create_group(group_name,
-                                  description,
-                                  group_scope,
-                                  group_type)
\ No newline at end of file
+def execute_batch(server: str, 
+                  calls: list[Callable[..., tuple[bool, Any]]]) -> list[tuple[bool, Any]]:
+    '''
+    Последовательное выполнение операций одного домена на одном соединении из пула
+    Параметры:
+        server (str): Адрес домена
+        calls (list): Вызовы вспомогательных функций модуля, принимающие connection
+    Возвращает результаты в порядке вызовов; при ошибке соединения
+    невыполненные операции получают ее текст.
+    '''
+    results = []
+    try:
+        with borrow_connection(server) as connection:
+            for call in calls:
+                results.append(call(connection=connection))
+        return results
+    except LDAPBindError as e:
+        err = f"Ошибка аутентификации: {e}"
+    except LDAPException as e:
+        err = f"Ошибка подключения к LDAP: {e}"
+    except APIError as e:
+        err = e.message
+    return results + [(False, err)] * (len(calls) - len(results))
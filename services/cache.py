@@ -0,0 +1,279 @@
+"""Кэш результатов чтения групп и участников групп."""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Iterable, Optional, Set, Tuple, Union
+
+from configs.config import Settings, CacheConfig
+from services import metrics
+
+logger = logging.getLogger(__name__)
+
+# Ключ кэша: (операция, домен, ou_dn, group_dn, атрибуты, параметры выборки)
+CacheKey = Tuple[str, str, str, Optional[str], Tuple[str, ...], str]
+
+
+def normalize_dn(dn: Optional[str]) -> Optional[str]:
+    '''Приведение DN к виду для сравнения: без пробелов у запятых, в нижнем регистре'''
+    if dn is None:
+        return None
+    return ','.join(part.strip() for part in dn.split(',')).lower()
+
+
+def make_key(operation: str, domain: str, ou_dn: str,
+             group_dn: Optional[str] = None, attributes: Tuple[str, ...] = (), 
+             variant: str = '') -> CacheKey:
+    return (operation, domain.lower(), normalize_dn(ou_dn), normalize_dn(group_dn), tuple(attributes), variant)
+
+
+class CacheBackend(ABC):
+    '''Хранилище записей кэша'''
+
+    @abstractmethod
+    def get(self, key: CacheKey) -> Optional[Any]:
+        '''Значение по ключу или None, если записи нет или истек TTL'''
+
+    @abstractmethod
+    def set(self, key: CacheKey, value: Any, ttl: float) -> None:
+        '''Сохранение значения с TTL'''
+
+    @abstractmethod
+    def delete_ous(self, domain: str, ou_dns: Iterable[str]) -> int:
+        '''Удаление записей всех операций домена для OU из ou_dns (ключи уже нормализованы)'''
+
+    @abstractmethod
+    def clear(self) -> None:
+        '''Удаление всех записей'''
+
+    @abstractmethod
+    def size(self) -> int:
+        '''Количество записей'''
+
+
+class MemoryBackend(CacheBackend):
+    '''Кэш в памяти процесса с вытеснением LRU'''
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._data: 'OrderedDict[CacheKey, Tuple[float, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: CacheKey) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: CacheKey, value: Any, ttl: float) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete_ous(self, domain: str, ou_dns: Iterable[str]) -> int:
+        ou_dns = set(ou_dns)
+        with self._lock:
+            keys = [key for key in self._data if key[1] == domain and key[2] in ou_dns]
+            for key in keys:
+                del self._data[key]
+            return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def size(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+
+class FileBackend(CacheBackend):
+    '''
+    Кэш в каталоге на локальном диске, общий для нескольких воркеров uvicorn.
+    Запись - JSON файл с ключом, временем истечения и значением;
+    LRU по времени последнего обращения (mtime файла). Имя файла начинается
+    с хэша домена и OU, поэтому при сбросе записей OU файлы выбираются по
+    имени и не читаются.
+    '''
+
+    def __init__(self, path: Union[str, Path], max_entries: int):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+
+    @staticmethod
+    def _scope(domain: str, ou_dn: Optional[str]) -> str:
+        return hashlib.sha256(json.dumps([domain, ou_dn]).encode('utf-8')).hexdigest()[:16]
+
+    def _file(self, key: CacheKey) -> Path:
+        digest = hashlib.sha256(json.dumps(key).encode('utf-8')).hexdigest()
+        return self.path / f"{self._scope(key[1], key[2])}-{digest}.json"
+
+    def _read(self, file: Path) -> Optional[dict]:
+        try:
+            with open(file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _remove(self, file: Path) -> None:
+        try:
+            file.unlink()
+        except OSError:
+            pass
+
+    def get(self, key: CacheKey) -> Optional[Any]:
+        file = self._file(key)
+        record = self._read(file)
+        if record is None:
+            return None
+        if record['expires_at'] < time.time():
+            self._remove(file)
+            return None
+        try:
+            os.utime(file)
+        except OSError:
+            pass
+        return record['value']
+
+    def set(self, key: CacheKey, value: Any, ttl: float) -> None:
+        file = self._file(key)
+        tmp = file.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        record = {'key': key, 'expires_at': time.time() + ttl, 'value': value}
+        try:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(record, f, ensure_ascii=False)
+            os.replace(tmp, file)
+        except (OSError, TypeError, ValueError) as e:
+            # Значение, которое не сериализуется в JSON, не кэшируется: результат чтения отдается без кэша
+            logger.warning(f"Не удалось записать запись кэша {file}: {e}")
+            self._remove(tmp)
+            return
+        self._evict()
+
+    def _entries(self) -> list:
+        return [entry for entry in os.scandir(self.path) if entry.name.endswith('.json')]
+
+    def _evict(self) -> None:
+        entries = self._entries()
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in entries[:len(entries) - self.max_entries]:
+            self._remove(Path(entry.path))
+
+    def delete_ous(self, domain: str, ou_dns: Iterable[str]) -> int:
+        scopes = {self._scope(domain, ou_dn) for ou_dn in ou_dns}
+        removed = 0
+        for entry in self._entries():
+            if entry.name.partition('-')[0] in scopes:
+                self._remove(Path(entry.path))
+                removed += 1
+        return removed
+
+    def clear(self) -> None:
+        for entry in self._entries():
+            self._remove(Path(entry.path))
+
+    def size(self) -> int:
+        return len(self._entries())
+
+
+def create_backend(config: CacheConfig) -> CacheBackend:
+    if config.backend == 'file':
+        return FileBackend(config.path, config.max_entries)
+    if config.backend != 'memory':
+        logger.warning(f"Неизвестный тип кэша {config.backend}, используется memory")
+    return MemoryBackend(config.max_entries)
+
+
+class ReadCache:
+    '''Сквозной кэш чтения (read-through) со счетчиками попаданий и промахов'''
+
+    def __init__(self, config: CacheConfig, backend: Optional[CacheBackend] = None):
+        self.config = config
+        self._backend = backend
+        self._backend_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+
+    @property
+    def backend(self) -> CacheBackend:
+        '''Хранилище создается при первом обращении, после загрузки настроек'''
+        if self._backend is None:
+            with self._backend_lock:
+                if self._backend is None:
+                    self._backend = create_backend(self.config)
+        return self._backend
+
+    def get_or_load(self, key: CacheKey,
+                    loader: Callable[[], Tuple[bool, Union[list, str]]]) -> Tuple[bool, Union[list, str]]:
+        '''Результат из кэша или из loader; кэшируются только успешные результаты'''
+        if not self.config.enabled:
+            return loader()
+        value = self.backend.get(key)
+        if value is not None:
+            with self._lock:
+                self.hits += 1
+            return True, value
+        with self._lock:
+            self.misses += 1
+        result, details = loader()
+        if result:
+            self.backend.set(key, details, self.config.ttl)
+        return result, details
+
+    def invalidate_ou(self, domain: str, dn: str) -> int:
+        '''
+        Сброс записей OU, в которые входит объект с указанным DN: списков
+        групп и участников групп, прочитанных с этими OU
+        '''
+        parts = normalize_dn(dn).split(',')
+        # Сам объект и все вышестоящие DN
+        ou_dns: Set[str] = {','.join(parts[index:]) for index in range(len(parts))}
+        removed = self.backend.delete_ous(domain.lower(), ou_dns)
+        with self._lock:
+            self.invalidations += removed
+        return removed
+
+    def clear(self) -> None:
+        self.backend.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.config.enabled,
+                "backend": self.config.backend,
+                "entries": self.backend.size(),
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations
+            }
+
+
+read_cache = ReadCache(Settings.cache)
+
+
+def _collect_cache_metrics() -> dict:
+    stats = read_cache.stats()
+    return {(event, ): stats[event] for event in ('hits', 'misses', 'invalidations')}
+
+
+metrics.registry.register(metrics.Counter(
+    "ad_cache_events_total", "Попадания, промахи и сбросы кэша чтения", ("event",),
+    collect=_collect_cache_metrics))
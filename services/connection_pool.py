@@ -0,0 +1,395 @@
+"""Пул LDAP соединений с контроллерами домена."""
+import logging
+import threading
+import time
+import weakref
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict, Iterator, Optional, Set, Tuple
+
+from ldap3 import Connection, ASYNC
+from ldap3.core.exceptions import (LDAPException, LDAPBindError, LDAPCommunicationError,
+                                   LDAPServerPoolExhaustedError)
+
+from configs.config import Settings, ServerConfig, PoolConfig
+from services import metrics
+from services.domain_controllers import get_controllers
+from services.server_cache import server_cache
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeoutError(LDAPException):
+    '''Не удалось получить соединение из пула за отведенное время'''
+
+
+class LDAPConnectionPool:
+    '''Пул привязанных (bind) соединений к контроллерам одного домена'''
+
+    def __init__(self, server_config: ServerConfig, pool_config: PoolConfig):
+        '''
+            Инициализация пула
+        Параметры:
+            server_config (ServerConfig): Параметры домена (хост, порт, учетные данные)
+            pool_config (PoolConfig): Размеры пула и интервалы проверок
+        '''
+        self.server_config = server_config
+        self.pool_config = pool_config
+        # Свободные соединения: (соединение, время возврата в пул)
+        self._idle: Deque[Tuple[Connection, float]] = deque()
+        self._size = 0
+        self._in_use = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        # Соединения, которые при возврате закрываются, а не возвращаются в пул
+        self._broken: weakref.WeakSet = weakref.WeakSet()
+        # Для /health/deep: потоки в ожидании соединения, результат последнего bind
+        # (успех, время, ошибка) и последняя успешная операция (время, длительность)
+        self._waiting = 0
+        self._bind: Tuple[Optional[bool], float, str] = (None, 0.0, '')
+        self._last_success: Optional[Tuple[float, float]] = None
+        self.controllers = get_controllers(server_config)
+
+    @property
+    def host(self) -> str:
+        return self.server_config.host
+
+    def stats(self) -> dict:
+        '''Текущее состояние пула'''
+        with self._cond:
+            return {
+                "size": self._size,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "max_size": self.pool_config.max_size,
+                "waiting": self._waiting
+            }
+
+    def health(self) -> dict:
+        '''Результат последнего bind и последняя успешная операция на соединении пула'''
+        bound, bind_at, bind_error = self._bind
+        last_success = self._last_success
+        return {
+            "bind": {"ok": bound, "at": bind_at or None, "error": bind_error or None},
+            "last_success": {"at": last_success[0], "latency": round(last_success[1], 4)} if last_success else None
+        }
+
+    def _set_bind(self, error: Optional[Exception]) -> None:
+        self._bind = (error is None, time.time(), str(error) if error is not None else '')
+
+    def open(self, connection: Connection) -> None:
+        '''
+        Открытие соединения через ServerPool (FIRST) с учетом ошибок в
+        размыкателе цепи: контроллеры перед выбранным не ответили за таймаут
+        подключения, при исчерпании пула не ответил ни один. Успешное
+        подключение счетчик ошибок не сбрасывает - это делают успешные операции.
+        '''
+        servers = list(connection.server_pool.servers) if connection.server_pool else []
+        try:
+            with metrics.phase('connect', self.host):
+                connection.open()
+        except LDAPException as e:
+            failed = None if isinstance(e, LDAPServerPoolExhaustedError) else connection.server
+            self._record_connect_failures(servers, failed)
+            if failed is not None:
+                self.controllers.record_failure(failed.host, str(e))
+            raise
+        self._record_connect_failures(servers, connection.server)
+
+    def _record_connect_failures(self, servers: list, chosen) -> None:
+        '''Ошибки контроллеров, пропущенных ServerPool до выбранного (все при chosen=None)'''
+        for server in servers:
+            if server is chosen:
+                break
+            self.controllers.record_failure(server.host, "Нет ответа при подключении")
+
+    def _create_connection(self) -> Connection:
+        '''Открытие нового соединения с bind к первому доступному контроллеру домена'''
+        # Схема и Root DSE берутся из кэша, соединение их не запрашивает
+        connection = Connection(
+            server_cache.get_server_pool(self.server_config),
+            user=self.server_config.login,
+            password=self.server_config.password
+        )
+        try:
+            self.open(connection)
+            with metrics.phase('bind', self.host):
+                bound = connection.bind()
+            if not bound:
+                self._close_connection(connection)
+                raise LDAPBindError(f"Не удалось выполнить bind к {self.host}: {connection.result.get('description')}")
+        except LDAPException as e:
+            self._set_bind(e)
+            raise
+        self._set_bind(None)
+        return connection
+
+    def _close_connection(self, connection: Connection) -> None:
+        try:
+            connection.unbind()
+        except LDAPException as e:
+            logger.debug(f"Ошибка при закрытии соединения с {self.host}: {e}")
+
+    def _is_healthy(self, connection: Connection) -> bool:
+        '''Проверка соединения запросом Who Am I'''
+        if connection.closed or not connection.bound:
+            return False
+        try:
+            connection.extend.standard.who_am_i()
+            return connection.result.get('result') == 0
+        except LDAPException:
+            return False
+
+    def _record_failure(self, connection: Connection, error: Exception) -> None:
+        '''Учет ошибки связи с контроллером в размыкателе цепи'''
+        if connection.server is not None:
+            self.controllers.record_failure(connection.server.host, str(error))
+
+    def fill(self) -> None:
+        '''Заполнение пула до минимального размера'''
+        while True:
+            with self._cond:
+                if self._closed or self._size >= self.pool_config.min_size:
+                    return
+                self._size += 1
+            try:
+                connection = self._create_connection()
+            except LDAPException as e:
+                with self._cond:
+                    self._size -= 1
+                logger.warning(f"Не удалось заполнить пул соединений {self.host}: {e}")
+                return
+            with self._cond:
+                self._idle.append((connection, time.monotonic()))
+                self._cond.notify()
+
+    def acquire(self) -> Connection:
+        '''Получение проверенного соединения из пула'''
+        deadline = time.monotonic() + self.pool_config.acquire_timeout
+        while True:
+            connection = None
+            returned_at = 0.0
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise LDAPException(f"Пул соединений {self.host} закрыт")
+                    if self._idle:
+                        connection, returned_at = self._idle.pop()
+                        break
+                    if self._size < self.pool_config.max_size:
+                        self._size += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolTimeoutError(
+                            f"Нет свободных соединений с {self.host} "
+                            f"(max_size={self.pool_config.max_size})")
+                    self._waiting += 1
+                    try:
+                        self._cond.wait(remaining)
+                    finally:
+                        self._waiting -= 1
+                self._in_use += 1
+
+            try:
+                if connection is None:
+                    return self._create_connection()
+                # ldap3 не сбрасывает last_error при успешных операциях
+                connection.last_error = None
+                if self.controllers.is_available(connection.server.host):
+                    idle_time = time.monotonic() - returned_at
+                    if idle_time < self.pool_config.health_check_interval and not connection.closed:
+                        return connection
+                    if self._is_healthy(connection):
+                        return connection
+                    self._record_failure(connection, LDAPCommunicationError('Who Am I'))
+            except LDAPException:
+                self._discard()
+                raise
+            # Соединение устарело или контроллер исключен: новое соединение
+            # откроется к доступному контроллеру, освобождаем слот и пробуем снова
+            logger.info(f"Соединение с {connection.server.host} ({self.host}) удалено из пула")
+            self._close_connection(connection)
+            self._discard()
+
+    def _discard(self) -> None:
+        with self._cond:
+            self._size -= 1
+            self._in_use -= 1
+            self._cond.notify()
+
+    def record_success(self, connection: Connection, duration: float) -> None:
+        '''
+        Успешная операция домена (для /health/deep и пропуска фоновой проверки
+        bind); сбрасывает счетчик ошибок контроллера, выполнившего операцию
+        '''
+        self._last_success = (time.time(), duration)
+        if connection.server is not None:
+            self.controllers.record_success(connection.server.host)
+
+    def mark_broken(self, connection: Connection, error: Exception) -> None:
+        '''
+        Ошибка связи, перехваченная вызывающим кодом (методы ADManager
+        возвращают (False, текст)): учитывается в размыкателе цепи контроллера,
+        соединение закрывается при возврате в пул
+        '''
+        self._record_failure(connection, error)
+        self._broken.add(connection)
+
+    def release(self, connection: Connection, broken: bool = False) -> None:
+        '''Возврат соединения в пул'''
+        if connection in self._broken:
+            self._broken.discard(connection)
+            broken = True
+        if broken or connection.closed or self._closed:
+            self._close_connection(connection)
+            self._discard()
+            return
+        now = time.monotonic()
+        expired = []
+        with self._cond:
+            self._in_use -= 1
+            self._idle.append((connection, now))
+            # Закрываем простаивающие соединения сверх минимального размера
+            while (len(self._idle) > 1 and self._size > self.pool_config.min_size
+                   and now - self._idle[0][1] > self.pool_config.max_idle_time):
+                expired.append(self._idle.popleft()[0])
+                self._size -= 1
+            self._cond.notify()
+        for stale in expired:
+            self._close_connection(stale)
+
+    @contextmanager
+    def connection(self) -> Iterator[Connection]:
+        '''Контекстный менеджер: соединение гарантированно возвращается в пул'''
+        connection = self.acquire()
+        broken = False
+        try:
+            yield connection
+        except LDAPCommunicationError as e:
+            broken = True
+            self._record_failure(connection, e)
+            raise
+        except LDAPException:
+            broken = True
+            raise
+        finally:
+            self.release(connection, broken=broken)
+
+    def probe(self, recent: float) -> None:
+        '''
+        Фоновая проверка bind для /health/deep: Who Am I на свободном
+        соединении пула (или bind нового, если пул не заполнен). Не
+        выполняется, если за последние recent секунд были успешные операции,
+        и если свободных соединений нет - проверка не занимает соединения
+        запросов и не ждет их.
+        '''
+        last_success = self._last_success
+        if last_success is not None and time.time() - last_success[0] < recent:
+            return
+        with self._cond:
+            if self._closed or (not self._idle and self._size >= self.pool_config.max_size):
+                return
+        try:
+            connection = self.acquire()
+        except LDAPException as e:
+            # Ошибка bind нового соединения уже учтена в _create_connection
+            logger.debug(f"Проверка пула {self.host} не выполнена: {e}")
+            return
+        healthy = self._is_healthy(connection)
+        if healthy:
+            self._set_bind(None)
+            self.controllers.record_success(connection.server.host)
+        else:
+            self._set_bind(LDAPCommunicationError(connection.last_error or 'Who Am I'))
+            self._record_failure(connection, LDAPCommunicationError('Who Am I'))
+        self.release(connection, broken=not healthy)
+
+    def close(self) -> None:
+        '''Закрытие всех свободных соединений пула'''
+        with self._cond:
+            self._closed = True
+            idle = [connection for connection, _ in self._idle]
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for connection in idle:
+            self._close_connection(connection)
+
+
+_pools: Dict[str, LDAPConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(host: str) -> LDAPConnectionPool:
+    '''Получить пул соединений домена по адресу (ServerConfig.host)'''
+    pool = _pools.get(host)
+    if pool is not None:
+        return pool
+    server_config = Settings.get_server_by_host(host)
+    with _pools_lock:
+        pool = _pools.get(host)
+        if pool is None:
+            pool = LDAPConnectionPool(server_config, Settings.pool)
+            _pools[host] = pool
+    pool.fill()
+    return pool
+
+
+def create_async_connection(host: str) -> Connection:
+    '''Отдельное соединение со стратегией ASYNC для конвейерных операций'''
+    server_config = Settings.get_server_by_host(host)
+    connection = Connection(
+        server_cache.get_server_pool(server_config),
+        user=server_config.login,
+        password=server_config.password,
+        client_strategy=ASYNC
+    )
+    get_pool(host).open(connection)
+    if not connection.bind():
+        error = connection.last_error or (connection.result or {}).get('description')
+        try:
+            connection.unbind()
+        except LDAPException:
+            pass
+        raise LDAPBindError(f"Не удалось выполнить bind к {host}: {error}")
+    return connection
+
+
+def pools_stats() -> Dict[str, dict]:
+    '''Состояние всех пулов по доменам'''
+    return {host: pool.stats() for host, pool in list(_pools.items())}
+
+
+def close_all_pools() -> None:
+    '''Закрытие всех пулов (при остановке сервиса)'''
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
+
+def _close_changed_pools(hosts: Set[str]) -> None:
+    '''Закрытие пулов доменов, измененных при перезагрузке конфигурации'''
+    with _pools_lock:
+        pools = [_pools.pop(host) for host in hosts if host in _pools]
+    for pool in pools:
+        logger.info(f"Пул соединений {pool.host} закрыт после изменения конфигурации")
+        pool.close()
+
+
+Settings.add_reload_listener(_close_changed_pools)
+
+
+def _collect_pool_metrics() -> Dict[Tuple[str, ...], float]:
+    values = {}
+    for host, stats in pools_stats().items():
+        for state in ('in_use', 'idle', 'max_size'):
+            values[(host, state)] = stats[state]
+    return values
+
+
+metrics.registry.register(metrics.Gauge(
+    "ad_pool_connections", "Соединения пула по состоянию: in_use, idle, max_size",
+    ("domain", "state"), collect=_collect_pool_metrics))
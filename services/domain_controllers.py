@@ -0,0 +1,315 @@
+"""Контроллеры домена: обнаружение, активная проверка, размыкатель цепи и выбор по задержке."""
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+import yaml
+from ldap3 import Server, Connection, BASE, NONE
+from ldap3.core.exceptions import LDAPException
+
+from configs.config import Settings, ServerConfig, FailoverConfig
+from services import metrics
+
+try:
+    import dns.resolver
+except ImportError:  # dnspython не входит в обязательные зависимости
+    dns = None
+
+logger = logging.getLogger(__name__)
+
+# Коэффициент экспоненциального сглаживания задержки
+LATENCY_ALPHA = 0.3
+
+
+@dataclass
+class DCState:
+    """Состояние контроллера домена"""
+    host: str
+    port: int
+    priority: int = 0
+    latency: Optional[float] = None
+    failures: int = 0
+    open_until: float = 0.0
+    last_error: str = ''
+    last_probe: float = 0.0
+
+    def is_open(self, now: float) -> bool:
+        '''Цепь разомкнута: контроллер пропускается до истечения open_until'''
+        return self.open_until > now
+
+
+def parse_address(value: str, default_port: int) -> Tuple[str, int]:
+    '''Адрес вида host или host:port'''
+    host, _, port = value.strip().rpartition(':')
+    if not host or not port.isdigit():
+        return value.strip(), default_port
+    return host, int(port)
+
+
+def _parse_srv_records(records: List[str], default_port: int) -> List[Tuple[str, int, int]]:
+    '''Записи SRV в формате зоны DNS: "priority weight port target"'''
+    result = []
+    for record in records:
+        parts = str(record).split()
+        if len(parts) != 4:
+            logger.warning(f"Некорректная запись SRV: {record}")
+            continue
+        priority, _, port, target = parts
+        result.append((target.rstrip('.'), int(port) or default_port, int(priority)))
+    return result
+
+
+def discover(server_config: ServerConfig, config: FailoverConfig) -> List[Tuple[str, int, int]]:
+    '''
+    Список контроллеров домена (хост, порт, приоритет)
+    Источники по порядку: список dcs из конфигурации; записи SRV
+    _ldap._tcp.<srv_domain> из файла SRV_FILE (замена DNS для тестов) или DNS;
+    адрес домена host.
+    '''
+    if server_config.dcs:
+        return [(*parse_address(dc, server_config.port), 0) for dc in server_config.dcs]
+
+    if server_config.srv_domain:
+        name = f"_ldap._tcp.{server_config.srv_domain}"
+        records: List[Tuple[str, int, int]] = []
+        try:
+            if config.srv_file:
+                zone = yaml.safe_load(Path(config.srv_file).read_text(encoding='utf-8')) or {}
+                records = _parse_srv_records(zone.get(name, []), server_config.port)
+            elif dns is not None:
+                answer = dns.resolver.resolve(name, 'SRV', lifetime=config.probe_timeout)
+                records = [(str(item.target).rstrip('.'), item.port, item.priority) for item in answer]
+            else:
+                logger.warning(f"Не установлен dnspython, SRV {name} не запрашивается")
+        except Exception as e:
+            logger.warning(f"Не удалось получить записи SRV {name}: {e}")
+        if records:
+            return records
+
+    return [(server_config.host, server_config.port, 0)]
+
+
+class DomainControllers:
+    '''Контроллеры одного домена с учетом доступности и задержки ответа'''
+
+    def __init__(self, server_config: ServerConfig, config: FailoverConfig):
+        self.server_config = server_config
+        self.config = config
+        self._states: Dict[str, DCState] = {}
+        self._discovered_at = 0.0
+        self._lock = threading.Lock()
+        self.rediscover()
+
+    @property
+    def domain(self) -> str:
+        return self.server_config.host
+
+    def rediscover(self) -> None:
+        '''Обновление списка контроллеров, состояние известных сохраняется'''
+        found = discover(self.server_config, self.config)
+        with self._lock:
+            states = {}
+            for host, port, priority in found:
+                state = self._states.get(host) or DCState(host=host, port=port)
+                state.port, state.priority = port, priority
+                states[host] = state
+            self._states = states
+            self._discovered_at = time.monotonic()
+        logger.info(f"Контроллеры домена {self.domain}: {', '.join(states)}")
+
+    def states(self) -> List[DCState]:
+        with self._lock:
+            return list(self._states.values())
+
+    def is_available(self, host: str) -> bool:
+        with self._lock:
+            state = self._states.get(host)
+            return state is None or not state.is_open(time.monotonic())
+
+    def ordered(self) -> List[DCState]:
+        '''
+        Доступные контроллеры в порядке попыток подключения.
+        Сначала группа с наименьшим приоритетом SRV, внутри нее порядок
+        случайный с весом, обратно пропорциональным задержке ответа.
+        Контроллеры с разомкнутой цепью не возвращаются; по истечении
+        OPEN_TIMEOUT контроллер снова выдается (полуоткрытое состояние),
+        и результат попытки замыкает или снова размыкает цепь.
+        '''
+        now = time.monotonic()
+        with self._lock:
+            available = [state for state in self._states.values() if not state.is_open(now)]
+        known = [state.latency for state in available if state.latency is not None]
+        default_latency = sum(known) / len(known) if known else 1.0
+
+        result = []
+        for priority in sorted({state.priority for state in available}):
+            group = [state for state in available if state.priority == priority]
+            weights = [1.0 / max(state.latency if state.latency is not None else default_latency, 0.001)
+                       for state in group]
+            while group:
+                index = random.choices(range(len(group)), weights=weights)[0]
+                result.append(group.pop(index))
+                weights.pop(index)
+        return result
+
+    def record_success(self, host: str, latency: Optional[float] = None) -> None:
+        '''
+        Успешная проверка или операция: счетчик ошибок сбрасывается, цепь
+        замыкается. Задержка (ответ Root DSE при проверке) учитывается в выборе
+        контроллера, для операций и подключений она не передается.
+        '''
+        with self._lock:
+            state = self._states.get(host)
+            if state is None:
+                return
+            if state.failures >= self.config.failure_threshold:
+                logger.info(f"Контроллер {host} домена {self.domain} снова доступен")
+            if latency is not None:
+                state.latency = latency if state.latency is None else (
+                    LATENCY_ALPHA * latency + (1 - LATENCY_ALPHA) * state.latency)
+            state.failures = 0
+            state.open_until = 0.0
+            state.last_error = ''
+
+    def record_failure(self, host: str, error: str) -> None:
+        with self._lock:
+            state = self._states.get(host)
+            if state is None:
+                return
+            state.failures += 1
+            state.last_error = error
+            if state.failures >= self.config.failure_threshold:
+                if not state.is_open(time.monotonic()):
+                    logger.warning(f"Контроллер {host} домена {self.domain} исключен на "
+                                   f"{self.config.open_timeout} с: {error}")
+                state.open_until = time.monotonic() + self.config.open_timeout
+
+    def probe_one(self, state: DCState) -> None:
+        '''Проверка контроллера: подключение и анонимное чтение Root DSE'''
+        server = Server(state.host, port=state.port, get_info=NONE, connect_timeout=self.config.probe_timeout)
+        connection = Connection(server, receive_timeout=self.config.probe_timeout)
+        started = time.perf_counter()
+        try:
+            connection.open()
+            connection.search('', '(objectClass=*)', BASE, attributes=['currentTime'])
+            if connection.result.get('result') != 0:
+                raise LDAPException(connection.result.get('description'))
+        except Exception as e:
+            self.record_failure(state.host, str(e))
+        else:
+            self.record_success(state.host, time.perf_counter() - started)
+        finally:
+            state.last_probe = time.time()
+            try:
+                connection.unbind()
+            except Exception:
+                pass
+
+    def probe(self, executor: Optional[ThreadPoolExecutor] = None) -> None:
+        '''Проверка всех контроллеров домена'''
+        if time.monotonic() - self._discovered_at > self.config.discovery_interval:
+            self.rediscover()
+        states = self.states()
+        if executor is None:
+            for state in states:
+                self.probe_one(state)
+        else:
+            list(executor.map(self.probe_one, states))
+
+    def status(self) -> List[dict]:
+        now = time.monotonic()
+        return [{
+            "host": state.host,
+            "port": state.port,
+            "priority": state.priority,
+            "available": not state.is_open(now),
+            "latency": round(state.latency, 4) if state.latency is not None else None,
+            "failures": state.failures,
+            "last_error": state.last_error or None
+        } for state in self.states()]
+
+
+_controllers: Dict[str, DomainControllers] = {}
+_controllers_lock = threading.Lock()
+
+
+def get_controllers(server_config: ServerConfig) -> DomainControllers:
+    '''Контроллеры домена по его конфигурации (ключ - ServerConfig.host)'''
+    controllers = _controllers.get(server_config.host)
+    if controllers is not None:
+        return controllers
+    with _controllers_lock:
+        controllers = _controllers.get(server_config.host)
+        if controllers is None:
+            controllers = DomainControllers(server_config, Settings.failover)
+            _controllers[server_config.host] = controllers
+    return controllers
+
+
+def _forget_changed(hosts: Set[str]) -> None:
+    '''Сброс состояния контроллеров доменов, измененных при перезагрузке конфигурации'''
+    with _controllers_lock:
+        for host in hosts:
+            _controllers.pop(host, None)
+
+
+Settings.add_reload_listener(_forget_changed)
+
+
+class ControllerProber:
+    '''Фоновая периодическая проверка контроллеров всех доменов'''
+
+    def __init__(self, config: FailoverConfig):
+        self.config = config
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def run_once(self) -> None:
+        with ThreadPoolExecutor(max_workers=8, thread_name_prefix="dc-probe") as executor:
+            for server_config in Settings.servers:
+                get_controllers(server_config).probe(executor)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Ошибка проверки контроллеров домена: {e}", exc_info=True)
+            self._stop.wait(self.config.probe_interval)
+
+    def start(self) -> None:
+        '''Запуск проверки; PROBE_INTERVAL = 0 отключает активную проверку'''
+        if self.config.probe_interval <= 0 or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="dc-prober", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.config.probe_timeout * 2)
+            self._thread = None
+
+
+dc_prober = ControllerProber(Settings.failover)
+
+
+def _collect_dc_metrics() -> dict:
+    values = {}
+    for domain, controllers in list(_controllers.items()):
+        for state in controllers.status():
+            values[(domain, state["host"], "available")] = int(state["available"])
+            if state["latency"] is not None:
+                values[(domain, state["host"], "latency_seconds")] = state["latency"]
+    return values
+
+
+metrics.registry.register(metrics.Gauge(
+    "ad_domain_controller", "Доступность (цепь замкнута) и сглаженная задержка ответа контроллеров домена",
+    ("domain", "dc", "value"), collect=_collect_dc_metrics))
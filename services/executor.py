@@ -0,0 +1,73 @@
+"""Выполнение синхронных LDAP операций вне цикла событий."""
+import asyncio
+import contextvars
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from configs.config import Settings, ExecutorConfig
+from services import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class LDAPExecutor:
+    '''Ограниченный пул потоков с лимитом одновременных операций на домен'''
+
+    def __init__(self, config: ExecutorConfig):
+        self.config = config
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._in_flight: Dict[str, int] = {}
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.config.max_workers,
+                                                thread_name_prefix="ldap")
+        return self._executor
+
+    def _semaphore(self, domain: str) -> asyncio.Semaphore:
+        semaphore = self._semaphores.get(domain)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.config.per_domain_limit)
+            self._semaphores[domain] = semaphore
+        return semaphore
+
+    def in_flight(self, domain: str) -> int:
+        '''Количество выполняющихся операций домена'''
+        return self._in_flight.get(domain, 0)
+
+    async def run(self, domain: str, func: Callable[..., Any], *args, **kwargs) -> Any:
+        '''Выполнение func в пуле потоков с учетом лимита домена'''
+        # Операции с неизвестными адресами (завершатся ошибкой) делят один лимит
+        domain = metrics.domain_label(domain)
+        async with self._semaphore(domain):
+            self._in_flight[domain] = self._in_flight.get(domain, 0) + 1
+            try:
+                loop = asyncio.get_running_loop()
+                # run_in_executor не переносит contextvars (метки метрик) в поток
+                context = contextvars.copy_context()
+                return await loop.run_in_executor(self._get_executor(),
+                                                  functools.partial(context.run, func, *args, **kwargs))
+            finally:
+                self._in_flight[domain] -= 1
+
+    def in_flight_all(self) -> Dict[str, int]:
+        '''Количество выполняющихся операций по доменам'''
+        return dict(self._in_flight)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        self._semaphores.clear()
+        self._in_flight.clear()
+
+
+ldap_executor = LDAPExecutor(Settings.executor)
+
+
+metrics.registry.register(metrics.Gauge(
+    "ad_executor_in_flight", "Выполняющиеся LDAP операции по доменам", ("domain",),
+    collect=lambda: {(domain, ): count for domain, count in ldap_executor.in_flight_all().items()}))
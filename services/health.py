@@ -0,0 +1,137 @@
+"""Состояние доменов для /health/ready и /health/deep: фоновая проверка и готовый снимок."""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from configs.config import Settings, ServerConfig, HealthConfig
+from services.connection_pool import get_pool
+from services.warmup import warmup
+
+logger = logging.getLogger(__name__)
+
+# Максимум доменов, проверяемых одновременно
+HEALTH_WORKERS = 8
+
+
+def _age(now: float, at: Optional[float]) -> Optional[float]:
+    return round(now - at, 3) if at else None
+
+
+class HealthMonitor:
+    '''
+    Раз в INTERVAL в фоновом потоке собирает состояние каждого домена:
+    доступность контроллеров (результаты dc_prober и размыкателя цепи),
+    bind соединений пула, последнюю успешную операцию и занятость пула.
+    Обработчики /health/ready и /health/deep отдают готовый снимок и к AD
+    не обращаются. Bind проверяется на соединении пула и только если за
+    интервал не было успешных операций, поэтому под нагрузкой проверка
+    запросов к AD не добавляет.
+    '''
+
+    def __init__(self, config: HealthConfig):
+        self.config = config
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._snapshot: Optional[dict] = None
+
+    def _check_domain(self, server_config: ServerConfig) -> dict:
+        try:
+            # Пул создается и дозаполняется, если подготовка при запуске не удалась
+            pool = get_pool(server_config.host)
+            pool.probe(self.config.interval)
+        except Exception as e:
+            logger.warning(f"Не удалось проверить домен {server_config.host}: {e}")
+            return {"name": server_config.name, "ready": False, "error": str(e)}
+        now = time.time()
+        controllers = pool.controllers.status()
+        reachable = sum(1 for state in controllers if state["available"])
+        stats = pool.stats()
+        health = pool.health()
+        bind, last_success = health["bind"], health["last_success"]
+        saturation = stats["in_use"] / stats["max_size"] if stats["max_size"] else 0.0
+        return {
+            "name": server_config.name,
+            "ready": reachable > 0 and bind["ok"] is True,
+            "controllers": controllers,
+            "reachable": reachable,
+            "bind": {"ok": bind["ok"], "age": _age(now, bind["at"]), "error": bind["error"]},
+            "last_success": {
+                "age": _age(now, last_success["at"]),
+                "latency": last_success["latency"]
+            } if last_success else None,
+            "pool": dict(stats,
+                         saturation=round(saturation, 3),
+                         saturated=saturation >= self.config.saturation_threshold or stats["waiting"] > 0)
+        }
+
+    def refresh(self) -> dict:
+        '''Проверка всех доменов и замена снимка; блокирует до завершения'''
+        servers = list(Settings.servers)
+        domains = {}
+        if servers:
+            with ThreadPoolExecutor(max_workers=min(HEALTH_WORKERS, len(servers)),
+                                    thread_name_prefix="health") as executor:
+                for server_config, state in zip(servers, executor.map(self._check_domain, servers)):
+                    domains[server_config.host] = state
+        self._snapshot = {"updated": time.time(), "domains": domains}
+        return self._snapshot
+
+    def _run(self) -> None:
+        # Первая проверка - после подготовки соединений при запуске
+        while not warmup.wait(1.0):
+            if self._stop.is_set():
+                return
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Ошибка проверки состояния доменов: {e}", exc_info=True)
+            self._stop.wait(self.config.interval)
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="health", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5.0)
+            self._thread = None
+
+    def status(self) -> dict:
+        '''
+        Последний снимок и итоговое состояние сервиса:
+        starting - соединения еще готовятся, stale - снимок старше MAX_AGE,
+        unhealthy - не выполнено условие READY_DOMAINS, degraded - часть
+        доменов недоступна или пул перегружен, healthy - все в порядке.
+        Сервис готов (ready) в состояниях healthy и degraded.
+        '''
+        snapshot = self._snapshot
+        if not warmup.ready or snapshot is None:
+            return {"status": "starting", "ready": False, "updated": None, "age": None, "domains": {}}
+        age = round(time.time() - snapshot["updated"], 3)
+        domains = snapshot["domains"]
+        states = [state["ready"] for state in domains.values()]
+        if age > self.config.max_age:
+            status = "stale"
+        elif not (any(states) if self.config.ready_domains == 'any' else all(states)):
+            status = "unhealthy"
+        elif not all(states) or any(state["pool"]["saturated"] for state in domains.values() if "pool" in state):
+            status = "degraded"
+        else:
+            status = "healthy"
+        return {
+            "status": status,
+            "ready": status in ("healthy", "degraded"),
+            "updated": snapshot["updated"],
+            "age": age,
+            "domains": domains
+        }
+
+
+health_monitor = HealthMonitor(Settings.health)
@@ -0,0 +1,195 @@
+"""Метрики сервиса в текстовом формате Prometheus."""
+import contextvars
+import threading
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from configs.config import Settings
+from configs.logging_config import dropped_records
+
+# API метод текущего запроса, используется как метка в метриках ADManager
+current_method: contextvars.ContextVar[str] = contextvars.ContextVar("current_method", default="unknown")
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000)
+BYTES_BUCKETS = (256, 1024, 10240, 102400, 1048576, 10485760, 104857600)
+
+LabelValues = Tuple[str, ...]
+
+# Метка domain для адресов, которых нет в конфигурации
+UNKNOWN_DOMAIN = "unknown"
+
+
+def domain_label(domain: str) -> str:
+    '''
+    Домен для меток и лимитов: адрес из запроса проверяется позже, поэтому
+    неизвестные адреса объединяются, иначе число меток не ограничено
+    '''
+    return domain if Settings.has_server(domain) else UNKNOWN_DOMAIN
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str]) -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Metric(ABC):
+    '''Базовый класс метрики с метками'''
+    type_name = ''
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(domain_label(str(labels.get(label, ''))) if label == 'domain' else str(labels.get(label, ''))
+                     for label in self.labels)
+
+    @abstractmethod
+    def samples(self) -> List[str]:
+        '''Строки значений в текстовом формате Prometheus'''
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}",
+                f"# TYPE {self.name} {self.type_name}"] + self.samples()
+
+
+class Counter(Metric):
+    '''Накопительное значение; collect - функция, возвращающая значения при выдаче метрик'''
+    type_name = 'counter'
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = (),
+                 collect: Optional[Callable[[], Dict[LabelValues, float]]] = None):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[LabelValues, float] = {}
+        self._collect = collect
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> List[str]:
+        if self._collect is not None:
+            values = list(self._collect().items())
+        else:
+            with self._lock:
+                values = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labels, key)} {value}" for key, value in values]
+
+
+class Gauge(Counter):
+    '''Значение, которое может уменьшаться'''
+    type_name = 'gauge'
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    type_name = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        # метки -> (счетчики по корзинам, сумма, количество)
+        self._values: Dict[LabelValues, Tuple[List[int], float, int]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total, count = self._values.get(key) or ([0] * len(self.buckets), 0.0, 0)
+            if index < len(counts):
+                counts[index] += 1
+            self._values[key] = (counts, total + value, count + 1)
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = [(key, list(counts), total, count) for key, (counts, total, count) in self._values.items()]
+        lines = []
+        for key, counts, total, count in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labels + ('le',), key + (repr(float(bound)),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labels + ('le',), key + ('+Inf',))
+            lines.append(f"{self.name}_bucket{labels} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+REQUEST_DURATION = registry.register(Histogram(
+    "ad_request_duration_seconds", "Длительность обработки запроса /execute", ("method", "domain")))
+PHASE_DURATION = registry.register(Histogram(
+    "ad_phase_duration_seconds", "Длительность фаз операции: connect, bind, search, add, convert, serialize",
+    ("phase", "method", "domain")))
+RESULT_ENTRIES = registry.register(Histogram(
+    "ad_result_entries", "Количество записей в результате", ("method", "domain"), SIZE_BUCKETS))
+RESPONSE_BYTES = registry.register(Histogram(
+    "ad_response_bytes", "Размер тела ответа", ("method",), BYTES_BUCKETS))
+LDAP_ERRORS = registry.register(Counter(
+    "ad_ldap_errors_total", "Ошибки LDAP по коду результата", ("method", "domain", "code")))
+REQUESTS_IN_FLIGHT = registry.register(Gauge(
+    "ad_requests_in_flight", "Выполняющиеся запросы /execute", ("method",)))
+registry.register(Counter(
+    "ad_log_records_dropped_total", "Записи журнала, отброшенные при переполнении очереди",
+    collect=lambda: {(): dropped_records()}))
+
+
+def phase(name: str, domain: str) -> contextmanager:
+    '''Замер фазы операции с меткой API метода текущего запроса'''
+    return PHASE_DURATION.time(phase=name, method=current_method.get(), domain=domain)
+
+
+def record_ldap_result(domain: str, result: Optional[dict]) -> None:
+    '''Учет неуспешного кода результата LDAP операции'''
+    if result and result.get('result', 0) != 0:
+        LDAP_ERRORS.inc(method=current_method.get(), domain=domain,
+                        code=str(result.get('description') or result.get('result')))
+
+
+def record_exception(domain: str, exc: Exception) -> None:
+    '''Учет ошибки подключения или bind, код - класс исключения ldap3'''
+    LDAP_ERRORS.inc(method=current_method.get(), domain=domain, code=type(exc).__name__)
@@ -0,0 +1,193 @@
+"""Кэш объектов Server и схемы/Root DSE контроллеров домена."""
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from ldap3 import Server, ServerPool, Connection, ALL, NONE, FIRST
+from ldap3.core.exceptions import LDAPException
+from ldap3.protocol.rfc4512 import DsaInfo, SchemaInfo
+from ldap3.utils.config import set_config_parameter
+
+from configs.config import Settings, ServerConfig, SchemaCacheConfig
+from services.domain_controllers import get_controllers, DCState
+
+logger = logging.getLogger(__name__)
+
+# ServerPool после неудачного прохода по списку ждет POOLING_LOOP_TIMEOUT (10 с);
+# список заранее отфильтрован размыкателем цепи, повторный проход не нужен
+set_config_parameter('POOLING_LOOP_TIMEOUT', 0)
+
+
+@dataclass
+class CachedServer:
+    """Рабочий Server домена и время загрузки его схемы"""
+    server: Server
+    loaded_at: float = 0.0
+    source: str = ''
+    # Server контроллеров домена с прикрепленными схемой и DSE: (хост, порт) -> Server
+    dc_servers: Dict[Tuple[str, int], Server] = field(default_factory=dict)
+
+
+class ServerInfoCache:
+    '''Общий для процесса кэш Server (get_info=NONE) с прикрепленной схемой и DSE'''
+
+    def __init__(self, config: SchemaCacheConfig):
+        self.config = config
+        self._servers: Dict[str, CachedServer] = {}
+        self._lock = threading.Lock()
+        self._host_locks: Dict[str, threading.Lock] = {}
+
+    def _snapshot_paths(self, host: str) -> Optional[tuple[Path, Path]]:
+        if not self.config.snapshot_dir:
+            return None
+        snapshot_dir = Path(self.config.snapshot_dir)
+        return snapshot_dir / f"{host}.info.json", snapshot_dir / f"{host}.schema.json"
+
+    def _entry(self, server_config: ServerConfig) -> CachedServer:
+        with self._lock:
+            cached = self._servers.get(server_config.host)
+            if cached is None:
+                server = Server(server_config.host, port=server_config.port, get_info=NONE)
+                cached = CachedServer(server=server)
+                self._servers[server_config.host] = cached
+                self._host_locks[server_config.host] = threading.Lock()
+            return cached
+
+    def _is_expired(self, cached: CachedServer) -> bool:
+        return not cached.loaded_at or time.monotonic() - cached.loaded_at > self.config.ttl
+
+    def _loaded_entry(self, server_config: ServerConfig) -> CachedServer:
+        cached = self._entry(server_config)
+        if self._is_expired(cached):
+            with self._host_locks[server_config.host]:
+                if self._is_expired(cached):
+                    self._load_from_server(server_config, cached)
+        return cached
+
+    def get_server(self, server_config: ServerConfig) -> Server:
+        '''Получить рабочий Server домена, при истечении TTL схема перечитывается'''
+        return self._loaded_entry(server_config).server
+
+    def _dc_server(self, cached: CachedServer, state: DCState) -> Server:
+        '''Server контроллера домена со схемой и DSE домена'''
+        key = (state.host, state.port)
+        server = cached.dc_servers.get(key)
+        if server is None:
+            server = Server(state.host, port=state.port, get_info=NONE,
+                            connect_timeout=Settings.failover.connect_timeout)
+            cached.dc_servers[key] = server
+        if server.schema is not cached.server.schema:
+            server.attach_dsa_info(cached.server.info)
+            server.attach_schema_info(cached.server.schema)
+        return server
+
+    def get_server_pool(self, server_config: ServerConfig) -> ServerPool:
+        '''
+        ServerPool доступных контроллеров домена в порядке, выбранном
+        DomainControllers (приоритет SRV и задержка ответа). Контроллеры с
+        разомкнутой цепью в пул не входят, поэтому на них не тратится
+        таймаут подключения.
+        '''
+        ordered = get_controllers(server_config).ordered()
+        if not ordered:
+            raise LDAPException(f"Нет доступных контроллеров домена {server_config.host}")
+        cached = self._loaded_entry(server_config)
+        servers = [self._dc_server(cached, state) for state in ordered]
+        return ServerPool(servers, FIRST, active=1, exhaust=False)
+
+    def _loader_candidates(self, server_config: ServerConfig) -> List[DCState]:
+        ordered = get_controllers(server_config).ordered()
+        return ordered or [DCState(host=server_config.host, port=server_config.port)]
+
+    def _load_from_server(self, server_config: ServerConfig, cached: CachedServer) -> bool:
+        '''Чтение схемы и Root DSE отдельным соединением с get_info=ALL с первого доступного контроллера'''
+        loader_pool = ServerPool([Server(state.host, port=state.port, get_info=ALL,
+                                         connect_timeout=Settings.failover.connect_timeout)
+                                  for state in self._loader_candidates(server_config)],
+                                 FIRST, active=1, exhaust=False)
+        try:
+            connection = Connection(loader_pool,
+                                    user=server_config.login,
+                                    password=server_config.password,
+                                    auto_bind=True)
+            loader = connection.server
+            connection.unbind()
+        except LDAPException as e:
+            # Оставляем прежнюю схему, повторная попытка после следующего TTL
+            cached.loaded_at = time.monotonic()
+            logger.warning(f"Не удалось загрузить схему {server_config.host}: {e}")
+            return False
+        cached.server.attach_dsa_info(loader.info)
+        cached.server.attach_schema_info(loader.schema)
+        cached.loaded_at = time.monotonic()
+        cached.source = 'server'
+        logger.info(f"Схема домена {server_config.host} загружена с контроллера {loader.host}")
+        self._save_snapshot(server_config.host, loader)
+        return True
+
+    def _save_snapshot(self, host: str, loader: Server) -> None:
+        paths = self._snapshot_paths(host)
+        if paths is None or loader.info is None or loader.schema is None:
+            return
+        info_path, schema_path = paths
+        try:
+            info_path.parent.mkdir(parents=True, exist_ok=True)
+            loader.info.to_file(str(info_path))
+            loader.schema.to_file(str(schema_path))
+        except OSError as e:
+            logger.warning(f"Не удалось сохранить снимок схемы {host}: {e}")
+
+    def load_snapshot(self, server_config: ServerConfig) -> bool:
+        '''Загрузка схемы из локального JSON снимка'''
+        paths = self._snapshot_paths(server_config.host)
+        if paths is None:
+            return False
+        info_path, schema_path = paths
+        if not info_path.exists() or not schema_path.exists():
+            return False
+        try:
+            info = DsaInfo.from_file(str(info_path))
+            schema = SchemaInfo.from_file(str(schema_path))
+        except Exception as e:
+            logger.warning(f"Не удалось прочитать снимок схемы {server_config.host}: {e}")
+            return False
+        cached = self._entry(server_config)
+        cached.server.attach_dsa_info(info)
+        cached.server.attach_schema_info(schema)
+        cached.loaded_at = time.monotonic()
+        cached.source = 'snapshot'
+        logger.info(f"Схема домена {server_config.host} загружена из снимка")
+        return True
+
+    def load_snapshots(self) -> None:
+        '''Загрузка снимков схемы всех доменов из конфигурации'''
+        for server_config in Settings.servers:
+            self.load_snapshot(server_config)
+
+    def refresh(self, host: Optional[str] = None) -> Dict[str, dict]:
+        '''Принудительное перечитывание схемы одного или всех доменов'''
+        servers = [Settings.get_server_by_host(host)] if host else Settings.servers
+        result = {}
+        for server_config in servers:
+            cached = self._entry(server_config)
+            with self._host_locks[server_config.host]:
+                loaded = self._load_from_server(server_config, cached)
+            result[server_config.host] = {"refreshed": loaded, **self.status(server_config.host)}
+        return result
+
+    def status(self, host: str) -> dict:
+        '''Состояние кэша схемы домена'''
+        cached = self._servers.get(host)
+        if cached is None:
+            return {"loaded": False}
+        return {
+            "loaded": cached.server.schema is not None,
+            "source": cached.source,
+            "age": round(time.monotonic() - cached.loaded_at, 1) if cached.loaded_at else None
+        }
+
+
+server_cache = ServerInfoCache(Settings.schema_cache)
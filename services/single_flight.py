@@ -0,0 +1,71 @@
+"""Объединение одновременных одинаковых операций чтения (single-flight)."""
+import asyncio
+import json
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+from pydantic import BaseModel
+
+from services import metrics
+from services.cache import normalize_dn
+
+logger = logging.getLogger(__name__)
+
+COALESCED = metrics.registry.register(metrics.Counter(
+    "ad_coalesced_requests_total",
+    "Запросы чтения по роли: leader - выполнил LDAP операцию, follower - получил результат leader",
+    ("method", "role")))
+
+
+# Параметры формата ответа: запросы, отличающиеся только ими, выполняют одну LDAP операцию
+PRESENTATION_FIELDS = {'format'}
+
+
+def request_key(method: str, params: BaseModel) -> Tuple[str, str]:
+    '''
+    Ключ запроса: метод и нормализованные параметры.
+    DN приводятся к виду для сравнения, как в ключах кэша чтения;
+    порядок полей и формат ответа не влияют на ключ.
+    '''
+    data = params.model_dump(mode='json', exclude=PRESENTATION_FIELDS)
+    for name, value in data.items():
+        if name.endswith('_dn') and isinstance(value, str):
+            data[name] = normalize_dn(value)
+    return method, json.dumps(data, sort_keys=True, ensure_ascii=False)
+
+
+class SingleFlight:
+    '''
+    Одновременные вызовы с одинаковым ключом ожидают одну задачу.
+    Первый вызов (leader) запускает операцию, остальные (follower) получают
+    тот же результат или исключение. Отмена ожидающего запроса (разрыв
+    соединения клиентом) не отменяет общую операцию.
+    '''
+
+    def __init__(self):
+        self._tasks: Dict[Hashable, asyncio.Task] = {}
+
+    def in_flight(self) -> int:
+        return len(self._tasks)
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        # Исключение забирается здесь: все ожидающие запросы могли быть отменены
+        if not task.cancelled():
+            task.exception()
+
+    async def run(self, key: Hashable, method: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._tasks.get(key)
+        if task is None:
+            COALESCED.inc(method=method, role='leader')
+            task = asyncio.ensure_future(func())
+            self._tasks[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            COALESCED.inc(method=method, role='follower')
+            logger.debug(f"Запрос {method} присоединен к выполняющейся операции")
+        return await asyncio.shield(task)
+
+
+single_flight = SingleFlight()
@@ -0,0 +1,89 @@
+"""Подготовка сервиса при запуске: соединения с контроллерами всех доменов."""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+from configs.config import Settings, ServerConfig
+from services.connection_pool import get_pool
+
+logger = logging.getLogger(__name__)
+
+# Максимум доменов, подключаемых одновременно
+WARMUP_WORKERS = 8
+
+
+class Warmup:
+    '''
+    Открытие пулов соединений всех доменов из конфигурации в фоновом потоке:
+    домены подключаются параллельно, каждый пул заполняется до MIN_SIZE
+    (при первом подключении загружается и схема домена). Сервис готов,
+    когда подготовка завершена; недоступный домен не задерживает готовность
+    дольше попытки подключения, его состояние возвращается в status().
+    '''
+
+    def __init__(self):
+        self._done = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._domains: Dict[str, dict] = {}
+        self._started_at: Optional[float] = None
+        self._duration: Optional[float] = None
+
+    @property
+    def ready(self) -> bool:
+        return self._done.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._done.wait(timeout)
+
+    def _warm_domain(self, server_config: ServerConfig) -> dict:
+        started = time.monotonic()
+        try:
+            pool = get_pool(server_config.host)
+        except Exception as e:
+            logger.warning(f"Не удалось подготовить соединения с доменом {server_config.host}: {e}")
+            return {"ready": False, "error": str(e)}
+        stats = pool.stats()
+        return {
+            "ready": stats["size"] >= Settings.pool.min_size,
+            "connections": stats["size"],
+            "duration": round(time.monotonic() - started, 3)
+        }
+
+    def run(self) -> None:
+        '''Подготовка всех доменов; блокирует до завершения'''
+        self._started_at = time.monotonic()
+        servers = list(Settings.servers)
+        if servers:
+            with ThreadPoolExecutor(max_workers=min(WARMUP_WORKERS, len(servers)),
+                                    thread_name_prefix="warmup") as executor:
+                for server_config, state in zip(servers, executor.map(self._warm_domain, servers)):
+                    self._domains[server_config.host] = state
+        self._duration = round(time.monotonic() - self._started_at, 3)
+        ready = sum(1 for state in self._domains.values() if state["ready"])
+        logger.info(f"Подготовка завершена за {self._duration} с: доменов с соединениями {ready} из {len(servers)}")
+        self._done.set()
+
+    def start(self) -> None:
+        if self._thread is not None or self.ready:
+            return
+        self._thread = threading.Thread(target=self.run, name="warmup", daemon=True)
+        self._thread.start()
+
+    def status(self) -> dict:
+        '''Состояние подготовки; duration - None, пока подготовка не начата'''
+        if self.ready:
+            duration = self._duration
+        elif self._started_at is not None:
+            duration = round(time.monotonic() - self._started_at, 3)
+        else:
+            duration = None
+        return {
+            "ready": self.ready,
+            "duration": duration,
+            "domains": dict(self._domains)
+        }
+
+
+warmup = Warmup()
@@ -0,0 +1,119 @@
+"""Статистика воркеров serve.py в общем каталоге: пулы соединений, executor и кэш."""
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+from configs import shared_config
+from services import metrics
+from services.cache import read_cache
+from services.connection_pool import pools_stats
+from services.executor import ldap_executor
+
+logger = logging.getLogger(__name__)
+
+# Интервал публикации; запись старше трех интервалов считается записью завершенного воркера
+PUBLISH_INTERVAL = 2.0
+
+
+class WorkerStats:
+    '''
+    Каждый воркер раз в PUBLISH_INTERVAL записывает свою статистику в
+    <ADIS_RUNTIME_DIR>/workers/<pid>.json (в Linux каталог находится в
+    /dev/shm). Любой воркер отдает статистику всех воркеров, поэтому
+    /metrics и /cache/stats не зависят от того, какой воркер принял запрос.
+    Без serve.py (один процесс) публикация отключена.
+    '''
+
+    def __init__(self, runtime_dir: str):
+        self.path = Path(runtime_dir) / "workers" if runtime_dir else None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.path is not None
+
+    def _file(self, pid: int) -> Path:
+        return self.path / f"{pid}.json"
+
+    def snapshot(self) -> dict:
+        return {
+            "pid": os.getpid(),
+            "updated": time.time(),
+            "pools": pools_stats(),
+            "in_flight": ldap_executor.in_flight_all(),
+            "cache": read_cache.stats()
+        }
+
+    def publish(self) -> None:
+        file = self._file(os.getpid())
+        tmp = file.with_suffix(".tmp")
+        try:
+            tmp.write_text(json.dumps(self.snapshot()), encoding="utf-8")
+            os.replace(tmp, file)
+        except OSError as e:
+            logger.warning(f"Не удалось сохранить статистику воркера {file}: {e}")
+
+    def collect(self) -> Dict[str, dict]:
+        '''Статистика живых воркеров по pid'''
+        if not self.enabled:
+            return {str(os.getpid()): self.snapshot()}
+        result = {}
+        expired = time.time() - PUBLISH_INTERVAL * 3
+        for file in self.path.glob("*.json"):
+            try:
+                data = json.loads(file.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                continue
+            if data.get("updated", 0) < expired:
+                continue
+            result[str(data["pid"])] = data
+        # Собственная статистика всегда актуальна
+        result[str(os.getpid())] = self.snapshot()
+        return result
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.publish()
+            self._stop.wait(PUBLISH_INTERVAL)
+
+    def start(self) -> None:
+        if not self.enabled or self._thread is not None:
+            return
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="worker-stats", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout=PUBLISH_INTERVAL)
+        self._thread = None
+        try:
+            self._file(os.getpid()).unlink()
+        except OSError:
+            pass
+
+
+worker_stats = WorkerStats(shared_config.runtime_dir())
+
+
+def _collect_worker_pool_metrics() -> dict:
+    values = {}
+    for pid, data in worker_stats.collect().items():
+        for host, stats in data["pools"].items():
+            for state in ('in_use', 'idle', 'max_size'):
+                values[(pid, host, state)] = stats[state]
+    return values
+
+
+if worker_stats.enabled:
+    metrics.registry.register(metrics.Gauge(
+        "ad_worker_pool_connections", "Соединения пулов всех воркеров по состоянию: in_use, idle, max_size",
+        ("worker", "domain", "state"), collect=_collect_worker_pool_metrics))
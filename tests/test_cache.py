@@ -0,0 +1,92 @@
+"""Тесты кэша чтения: ключи, TTL и сброс записей OU."""
+import pytest
+
+from configs.config import CacheConfig
+from services.cache import FileBackend, MemoryBackend, ReadCache, make_key, normalize_dn
+
+
+@pytest.fixture(params=["memory", "file"])
+def cache(request, tmp_path) -> ReadCache:
+    backend = MemoryBackend(100) if request.param == "memory" else FileBackend(tmp_path, 100)
+    return ReadCache(CacheConfig(enabled=True, ttl=30.0), backend)
+
+
+def _load(value):
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return True, value
+    return loader, calls
+
+
+def test_normalize_dn():
+    assert normalize_dn("CN=Group, OU=Groups ,DC=Corp,DC=Local") == "cn=group,ou=groups,dc=corp,dc=local"
+    assert normalize_dn(None) is None
+
+
+def test_make_key_is_case_insensitive():
+    assert make_key("groups", "DC1.corp.local", "OU=A, DC=x") == make_key("groups", "dc1.corp.local", "ou=a,dc=x")
+
+
+def test_read_through(cache):
+    loader, calls = _load([{"cn": "a"}])
+    key = make_key("groups", "dc1", "OU=A,DC=x")
+    assert cache.get_or_load(key, loader) == (True, [{"cn": "a"}])
+    assert cache.get_or_load(key, loader) == (True, [{"cn": "a"}])
+    assert len(calls) == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_errors_are_not_cached(cache):
+    key = make_key("groups", "dc1", "OU=A,DC=x")
+    assert cache.get_or_load(key, lambda: (False, "ошибка")) == (False, "ошибка")
+    loader, calls = _load([])
+    cache.get_or_load(key, loader)
+    assert len(calls) == 1
+
+
+def test_invalidate_ou_drops_all_kinds_of_ou_and_ancestors(cache):
+    keys = [make_key("groups", "dc1", "OU=A,DC=x"),
+            make_key("groups", "dc1", "DC=x"),
+            make_key("users:direct", "dc1", "OU=A,DC=x", "CN=g,OU=A,DC=x"),
+            make_key("groups", "dc1", "OU=B,DC=x"),
+            make_key("groups", "dc2", "OU=A,DC=x")]
+    for key in keys:
+        cache.get_or_load(key, _load([1])[0])
+    assert cache.invalidate_ou("DC1", "CN=new,OU=A,DC=x") == 3
+    assert cache.backend.size() == 2
+
+
+def test_disabled_cache_always_loads():
+    cache = ReadCache(CacheConfig(enabled=False), MemoryBackend(10))
+    loader, calls = _load([])
+    key = make_key("groups", "dc1", "OU=A,DC=x")
+    cache.get_or_load(key, loader)
+    cache.get_or_load(key, loader)
+    assert len(calls) == 2
+
+
+def test_memory_backend_evicts_least_recently_used():
+    backend = MemoryBackend(2)
+    first, second, third = (make_key("groups", "dc1", f"OU={name}") for name in "abc")
+    backend.set(first, 1, 30)
+    backend.set(second, 2, 30)
+    backend.get(first)
+    backend.set(third, 3, 30)
+    assert backend.get(second) is None
+    assert backend.get(first) == 1
+
+
+def test_expired_entry_is_missing(tmp_path):
+    for backend in (MemoryBackend(10), FileBackend(tmp_path, 10)):
+        key = make_key("groups", "dc1", "OU=A")
+        backend.set(key, [1], -1)
+        assert backend.get(key) is None
+
+
+def test_file_backend_skips_unserializable_value(tmp_path):
+    backend = FileBackend(tmp_path, 10)
+    backend.set(make_key("groups", "dc1", "OU=A"), {"value": object()}, 30)
+    assert backend.size() == 0
+    assert not list(tmp_path.glob("*.tmp"))
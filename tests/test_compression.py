@@ -0,0 +1,71 @@
+"""Тесты выбора кодирования по Accept-Encoding и потокового сжатия."""
+import gzip
+import zlib
+
+import pytest
+
+from api.compression import Codec, StreamCompressor, _accepted, available_codecs, negotiate
+
+LEVELS = {'gzip': 6, 'zstd': 3, 'br': 4}
+
+
+def _codecs(*names):
+    return [Codec(name, LEVELS[name]) for name in names]
+
+
+def test_accepted_parses_weights():
+    assert _accepted("gzip, br;q=0.5, zstd;q=0, *;q=0.1") == {"gzip": 1.0, "br": 0.5, "zstd": 0.0, "*": 0.1}
+
+
+def test_accepted_ignores_empty_and_invalid_weight():
+    assert _accepted(" , GZIP ; Q=0.8, br;q=abc") == {"gzip": 0.8, "br": 0.0}
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("gzip", "gzip"),
+    ("br, gzip", "br"),
+    ("gzip;q=1, br;q=0.5", "gzip"),
+    ("*", "br"),
+    ("gzip;q=0, *;q=0.5", "br"),
+    ("identity", None),
+    ("gzip;q=0", None),
+    ("", None),
+])
+def test_negotiate(header, expected):
+    codec = negotiate(header, _codecs("br", "gzip"))
+    assert (codec.name if codec else None) == expected
+
+
+def test_negotiate_equal_weights_follow_settings_order():
+    assert negotiate("gzip, br", _codecs("br", "gzip")).name == "br"
+    assert negotiate("gzip, br", _codecs("gzip", "br")).name == "gzip"
+
+
+def test_available_codecs_skips_unknown():
+    codecs = available_codecs(["lz4", "gzip"], LEVELS)
+    assert [codec.name for codec in codecs] == ["gzip"]
+    assert codecs[0].level == 6
+
+
+def test_gzip_stream_round_trip():
+    data = b'{"groups": [' + b','.join(b'{"cn": "group %d"}' % i for i in range(1000)) + b']}'
+    compressor = Codec("gzip", 6).compressor()
+    parts = [compressor.compress(data[:5000]), compressor.flush(),
+             compressor.compress(data[5000:]), compressor.finish()]
+    assert gzip.decompress(b''.join(parts)) == data
+
+
+def test_gzip_flush_is_decodable_prefix():
+    compressor = Codec("gzip", 6).compressor()
+    prefix = compressor.compress(b'{"data": ') + compressor.flush()
+    decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    assert decoder.decompress(prefix) == b'{"data": '
+
+
+def test_codec_compress():
+    assert gzip.decompress(Codec("gzip", 1).compress(b"abc" * 100)) == b"abc" * 100
+
+
+def test_stream_compressor_is_abstract():
+    with pytest.raises(TypeError):
+        StreamCompressor()
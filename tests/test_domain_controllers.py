@@ -0,0 +1,85 @@
+"""Тесты выбора контроллеров домена и размыкателя цепи."""
+import time
+
+import pytest
+
+from configs.config import FailoverConfig, ServerConfig
+from services.domain_controllers import DomainControllers, _parse_srv_records, parse_address
+
+
+def _controllers(dcs, **failover) -> DomainControllers:
+    server_config = ServerConfig(name="corp", host="corp.local", port=389, item_id="",
+                                 enable_passwork=False, login="", password="", dcs=dcs)
+    return DomainControllers(server_config, FailoverConfig(**failover))
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("dc1.corp.local", ("dc1.corp.local", 389)),
+    ("dc1.corp.local:636", ("dc1.corp.local", 636)),
+    (" dc1.corp.local:3268 ", ("dc1.corp.local", 3268)),
+    ("dc1.corp.local:ldap", ("dc1.corp.local:ldap", 389)),
+])
+def test_parse_address(value, expected):
+    assert parse_address(value, 389) == expected
+
+
+def test_parse_srv_records():
+    records = ["0 100 389 dc1.corp.local.", "10 100 0 dc2.corp.local", "bad record"]
+    assert _parse_srv_records(records, 389) == [("dc1.corp.local", 389, 0), ("dc2.corp.local", 389, 10)]
+
+
+def test_configured_dcs_are_used():
+    controllers = _controllers(["dc1", "dc2:636"])
+    assert [(state.host, state.port) for state in controllers.states()] == [("dc1", 389), ("dc2", 636)]
+
+
+def test_circuit_opens_at_threshold():
+    controllers = _controllers(["dc1", "dc2"], failure_threshold=3)
+    for _ in range(2):
+        controllers.record_failure("dc1", "timeout")
+    assert controllers.is_available("dc1")
+    controllers.record_failure("dc1", "timeout")
+    assert not controllers.is_available("dc1")
+    assert [state.host for state in controllers.ordered()] == ["dc2"]
+
+
+def test_success_resets_failures():
+    controllers = _controllers(["dc1"], failure_threshold=3)
+    controllers.record_failure("dc1", "timeout")
+    controllers.record_failure("dc1", "timeout")
+    controllers.record_success("dc1")
+    controllers.record_failure("dc1", "timeout")
+    assert controllers.is_available("dc1")
+    assert controllers.states()[0].failures == 1
+
+
+def test_success_without_latency_keeps_latency():
+    controllers = _controllers(["dc1"])
+    controllers.record_success("dc1", 0.01)
+    controllers.record_success("dc1")
+    assert controllers.states()[0].latency == pytest.approx(0.01)
+
+
+def test_half_open_after_timeout():
+    controllers = _controllers(["dc1"], failure_threshold=1, open_timeout=30.0)
+    controllers.record_failure("dc1", "timeout")
+    assert controllers.ordered() == []
+    controllers.states()[0].open_until = time.monotonic() - 1
+    assert [state.host for state in controllers.ordered()] == ["dc1"]
+    # Ошибка попытки в полуоткрытом состоянии снова размыкает цепь
+    controllers.record_failure("dc1", "timeout")
+    assert controllers.ordered() == []
+
+
+def test_ordered_prefers_lower_priority_group():
+    controllers = _controllers(["dc1", "dc2", "dc3"])
+    states = {state.host: state for state in controllers.states()}
+    states["dc1"].priority = 10
+    for _ in range(20):
+        assert controllers.ordered()[-1].host == "dc1"
+
+
+def test_unknown_host_is_available():
+    controllers = _controllers(["dc1"])
+    controllers.record_failure("other", "timeout")
+    assert controllers.is_available("other")
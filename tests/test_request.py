@@ -0,0 +1,85 @@
+"""Тесты cookie продолжения и watermark синхронизации."""
+import base64
+import json
+
+import pytest
+from pydantic import ValidationError
+
+from schemas.request import (
+    GetGroupsByOUParams,
+    SyncParams,
+    decode_continuation_cookie,
+    decode_watermark,
+    encode_continuation_cookie,
+    encode_watermark,
+)
+
+
+def _encode(payload) -> str:
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+
+@pytest.mark.parametrize("offset", [0, 1, 1000, 10 ** 9])
+def test_cookie_round_trip(offset):
+    assert decode_continuation_cookie(encode_continuation_cookie(offset)) == offset
+
+
+@pytest.mark.parametrize("cookie", [
+    "",
+    "не base64",
+    "!!!!",
+    _encode([1, 2]),
+    _encode({"position": 1}),
+    _encode({"offset": -1}),
+    _encode({"offset": "10"}),
+    _encode({"offset": 1.5}),
+])
+def test_cookie_invalid(cookie):
+    with pytest.raises(ValueError):
+        decode_continuation_cookie(cookie)
+
+
+def test_params_offset_from_cookie():
+    params = GetGroupsByOUParams(ou_dn="OU=Groups,DC=corp,DC=local", domain="dc1.corp.local",
+                                 cookie=encode_continuation_cookie(2000))
+    assert params.offset() == 2000
+    params = GetGroupsByOUParams(ou_dn="OU=Groups,DC=corp,DC=local", domain="dc1.corp.local")
+    assert params.offset() == 0
+
+
+def test_params_reject_invalid_cookie():
+    with pytest.raises(ValidationError):
+        GetGroupsByOUParams(ou_dn="OU=Groups,DC=corp,DC=local", domain="dc1.corp.local", cookie="xyz")
+
+
+def test_watermark_round_trip():
+    watermark = {"usn": {"6b0c7b6e-1d39-4f6b-a0a4-1c1b2c3d4e5f": 12345, "b0a1c2d3-0000-4000-8000-000000000001": 7},
+                 "ou": "ou=groups,dc=corp,dc=local"}
+    assert decode_watermark(encode_watermark(watermark)) == watermark
+
+
+def test_watermark_legacy_format_forces_full_sync():
+    legacy = _encode({"usn": 100, "dc": "CN=NTDS Settings,CN=DC1", "ou": "ou=groups,dc=corp,dc=local"})
+    assert decode_watermark(legacy) == {"usn": {}, "ou": "ou=groups,dc=corp,dc=local"}
+
+
+@pytest.mark.parametrize("watermark", [
+    "не base64",
+    _encode([1]),
+    _encode({"usn": {}}),
+    _encode({"usn": 100, "ou": "ou=x"}),
+    _encode({"usn": {"dc": "100"}, "ou": "ou=x"}),
+    _encode({"usn": [100], "ou": "ou=x"}),
+])
+def test_watermark_invalid(watermark):
+    with pytest.raises(ValueError):
+        decode_watermark(watermark)
+
+
+def test_sync_params_decoded_watermark():
+    watermark = {"usn": {"id": 5}, "ou": "ou=x"}
+    params = SyncParams(ou_dn="OU=x", domain="dc1.corp.local", watermark=encode_watermark(watermark))
+    assert params.decoded_watermark() == watermark
+    assert SyncParams(ou_dn="OU=x", domain="dc1.corp.local").decoded_watermark() is None
+    with pytest.raises(ValidationError):
+        SyncParams(ou_dn="OU=x", domain="dc1.corp.local", watermark="xyz")
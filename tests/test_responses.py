@@ -0,0 +1,56 @@
+"""Тесты сериализации ответов и формата columns."""
+import json
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+
+from api.responses import column_rows, columnar, dumps, envelope
+from schemas.response import BaseResponse
+
+
+def test_dumps_matches_base_response():
+    content = envelope({"groups": [{"cn": "Группа", "description": None}]})
+    assert json.loads(dumps(content)) == json.loads(BaseResponse(**content).model_dump_json())
+    assert "Группа".encode("utf-8") in dumps(content)
+
+
+def test_dumps_converts_non_json_types():
+    value = uuid.UUID("6b0c7b6e-1d39-4f6b-a0a4-1c1b2c3d4e5f")
+    moment = datetime(2024, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+    decoded = json.loads(dumps({"guid": value, "at": moment, "cert": b"\x00\x01"}))
+    assert decoded["guid"] == str(value)
+    assert datetime.fromisoformat(decoded["at"].replace("Z", "+00:00")) == moment
+    assert decoded["cert"] == "AAE="
+
+
+def test_dumps_rejects_unknown_type():
+    with pytest.raises(Exception):
+        dumps({"value": object()})
+
+
+def test_envelope():
+    assert envelope({"groups": []}) == {"data": {"groups": []}, "errorText": None}
+    assert envelope({}, "ошибка") == {"data": {}, "errorText": "ошибка"}
+
+
+def test_column_rows_all_attributes_present():
+    items = [{"cn": "a", "sAMAccountName": "A"}, {"cn": "b", "sAMAccountName": "B"}]
+    rows = column_rows(items, ["sAMAccountName", "cn"])
+    assert [list(row) for row in rows] == [["A", "a"], ["B", "b"]]
+
+
+def test_column_rows_missing_attribute_is_none():
+    items = [{"cn": "a", "description": "d"}, {"cn": "b"}]
+    assert column_rows(items, ["cn", "description"]) == [["a", "d"], ["b", None]]
+
+
+def test_column_rows_single_column():
+    assert column_rows([{"distinguishedName": "CN=a"}, {}], ["distinguishedName"]) == [["CN=a"], [None]]
+
+
+def test_columnar_serializes_like_lists():
+    items = [{"cn": "a", "sAMAccountName": "A"}]
+    assert json.loads(dumps(columnar(items, ["cn", "sAMAccountName"]))) == {
+        "columns": ["cn", "sAMAccountName"], "rows": [["a", "A"]]}
+    assert columnar([], ["cn"]) == {"columns": ["cn"], "rows": []}